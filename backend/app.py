@@ -1,30 +1,329 @@
-from flask import Flask, jsonify
+from flask import Flask, g, jsonify, request
 from flask_cors import CORS
+from collections import OrderedDict
+from datetime import datetime
+import hashlib
+import logging
+import threading
+import numpy as np
 import pandas as pd
 import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from kline_store import KLineStore  # noqa: E402
+from indicators import compute_indicators  # noqa: E402
+from screener import ScreenSource, parse_time  # noqa: E402
+from snapshot_store import SnapshotStore  # noqa: E402
+from registry import DatasetRegistry  # noqa: E402
+import instrumentation  # noqa: E402
+from responses import FORMATS, MIN_COMPRESS_SIZE, negotiate_encoding, compress, iter_compress, \
+    serialize, iter_serialize  # noqa: E402
 
 app = Flask(__name__)
-CORS(app)  # 启用CORS支持
+CORS(app, expose_headers=['X-Total-Count', 'ETag'])  # 启用CORS支持，并允许前端读取总行数和ETag
+
+# 数据目录：data/stock_{code}_*.csv 及 data/kline 列式存储
+data_dir = os.path.join(os.path.dirname(__file__), '../data')
+registry = DatasetRegistry(data_dir, store=KLineStore(os.path.join(data_dir, 'kline')))
+# 全市场筛选：data/snapshots 快照存储，没有快照时使用 s1 导出的 stock_data_*.csv
+screen_source = ScreenSource(SnapshotStore(os.path.join(data_dir, 'snapshots')),
+                             csv_dirs=(data_dir, os.path.join(os.path.dirname(__file__), '..')))
+
+# /api/data 默认返回的股票
+DEFAULT_CODE = '600519'
+
+# 单页最大行数，未指定 limit 时也按此截断；limit=all 时不分页（全量导出）
+MAX_PAGE_SIZE = 5000
+# 查询结果缓存条数
+CACHE_SIZE = 256
+# 超过该行数的结果（即超过一页的全量导出）分块流式输出，不进入缓存
+STREAM_ROWS = MAX_PAGE_SIZE
+
+response_cache = OrderedDict()
+# 多线程服务时保护 response_cache 的读写和 LRU 顺序调整
+cache_lock = threading.Lock()
+# 快照时间戳显示为本地时间
+LOCAL_TZ = datetime.now().astimezone().tzinfo
+
+
+@app.before_request
+def start_timer():
+    g.request_started = time.perf_counter()
+
+
+@app.after_request
+def record_timing(response):
+    """按路由汇总请求耗时和状态码；流式响应只计到开始输出为止"""
+    started = g.pop('request_started', None)
+    if started is not None:
+        instrumentation.observe(f'serve.{request.endpoint}', time.perf_counter() - started)
+    instrumentation.incr(f'serve.status.{response.status_code // 100}xx')
+    return response
+
+
+def int_arg(name, default):
+    """整数查询参数，缺省时返回 default，无法解析时抛出 ValueError"""
+    value = request.args.get(name)
+    if value is None or value == '':
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(f'{name} must be an integer') from None
+
+
+def date_arg(name):
+    """日期查询参数（'20240101'、'2024-01-01' 等），统一为日期列的 'YYYY-MM-DD' 格式"""
+    value = request.args.get(name)
+    if not value:
+        return None
+    try:
+        # 常见的 YYYYMMDD / YYYY-MM-DD 直接解析，pd.to_datetime 的格式推断每次约需数毫秒
+        digits = value.replace('-', '')
+        if len(digits) == 8 and digits.isdigit():
+            return datetime.strptime(digits, '%Y%m%d').strftime('%Y-%m-%d')
+        return pd.to_datetime(value).strftime('%Y-%m-%d')
+    except (ValueError, TypeError, OverflowError):
+        raise ValueError(f'{name} must be a date, e.g. 2024-01-01') from None
+
+
+def parse_query_args():
+    """解析分页、列投影和日期区间参数，参数非法时抛出 ValueError"""
+    # limit=all 不分页，结果超过 STREAM_ROWS 行时流式输出
+    limit = None if request.args.get('limit') == 'all' else int_arg('limit', MAX_PAGE_SIZE)
+    offset = int_arg('offset', 0)
+    if (limit is not None and limit < 0) or offset < 0:
+        raise ValueError('limit/offset must be non-negative')
+    fields = request.args.get('fields')
+    fmt = request.args.get('format', 'records')
+    if fmt not in FORMATS:
+        raise ValueError(f'format must be one of {FORMATS}')
+    return {
+        'format': fmt,
+        'limit': None if limit is None else min(limit, MAX_PAGE_SIZE),
+        'offset': offset,
+        'fields': tuple(f for f in fields.split(',') if f) if fields else None,
+        'start': date_arg('start'),
+        'end': date_arg('end'),
+    }
+
+
+def apply_query(frame, query):
+    """按日期区间、列投影和分页截取数据，返回 (当前页, 总行数)"""
+    if query['start'] or query['end']:
+        # 日期列按升序存储，用二分查找定位区间
+        dates = frame['日期']
+        lo = dates.searchsorted(query['start'], side='left') if query['start'] else 0
+        hi = dates.searchsorted(query['end'], side='right') if query['end'] else len(frame)
+        frame = frame.iloc[lo:hi]
+    if query['fields']:
+        frame = frame[list(query['fields'])]
+    total = len(frame)
+    return frame.iloc[page_slice(query)], total
+
+
+def page_slice(query):
+    """offset/limit 对应的切片，limit 为 None 时到末尾"""
+    stop = None if query['limit'] is None else query['offset'] + query['limit']
+    return slice(query['offset'], stop)
+
+
+def cached_response(key, build):
+    """
+    按查询参数缓存序列化后的响应体（键中包含数据集版本，文件更新后自动失效）
 
-# 获取CSV文件路径
-csv_path = os.path.join(os.path.dirname(__file__), '../data/stock_600519_20200101_20250326.csv')
+    支持 ETag/If-None-Match、gzip/br 压缩协商；结果过大时分块流式输出。
+    """
+    fmt = request.args.get('format', 'records')
+    # 弱 ETag：gzip/br 与未压缩的响应体字节不同但内容等价
+    etag = hashlib.sha1(repr(key).encode('utf-8')).hexdigest()
+    if request.if_none_match.contains_weak(etag):
+        response = app.response_class(status=304)
+        response.set_etag(etag, weak=True)
+        return response
 
-# 读取CSV数据
-df = pd.read_csv(csv_path)
+    encoding = negotiate_encoding(request.headers.get('Accept-Encoding'))
+    with cache_lock:
+        entry = response_cache.get(key)
+        if entry is not None:
+            response_cache.move_to_end(key)
+    if entry is None:
+        page, total = build()
+        if len(page) > STREAM_ROWS:
+            chunks = iter_compress(iter_serialize(page, fmt, app.json.dumps), encoding)
+            return make_response(chunks, total, etag, encoding)
+        entry = {'total': total, 'identity': serialize(page, fmt, app.json.dumps)}
+        with cache_lock:
+            response_cache[key] = entry
+            if len(response_cache) > CACHE_SIZE:
+                response_cache.popitem(last=False)
+
+    if len(entry['identity']) < MIN_COMPRESS_SIZE:
+        encoding = 'identity'
+    if encoding not in entry:
+        entry[encoding] = compress(entry['identity'], encoding)
+    return make_response(entry[encoding], entry['total'], etag, encoding)
+
+
+def make_response(body, total, etag, encoding):
+    response = app.response_class(body, mimetype='application/json')
+    response.headers['X-Total-Count'] = str(total)
+    response.headers['Vary'] = 'Accept-Encoding'
+    if encoding != 'identity':
+        response.headers['Content-Encoding'] = encoding
+    response.set_etag(etag, weak=True)
+    return response
+
+
+def query_dataset(code):
+    """按查询参数返回某只股票的数据"""
+    dataset = registry.get(code)
+    query = parse_query_args()
+    key = ('data', code, dataset.version) + tuple(sorted(query.items()))
+    return cached_response(key, lambda: apply_query(dataset.frame, query))
 
 @app.route('/api/data', methods=['GET'])
 def get_data():
-    # 返回所有数据
-    return jsonify(df.to_dict(orient='records'))
+    # 返回数据（支持 limit/offset 分页、limit=all 全量导出、fields 列投影、start/end 日期区间）
+    try:
+        return query_dataset(DEFAULT_CODE)
+    except (KeyError, ValueError) as e:
+        return jsonify({'error': f'Invalid query: {e}'}), 400
 
 @app.route('/api/data/<column>/<value>', methods=['GET'])
 def filter_data(column, value):
     # 根据列名和值过滤数据
+    dataset = registry.get(DEFAULT_CODE)
+    if column not in dataset.frame.columns:
+        return jsonify({'error': 'Invalid column name'}), 400
     try:
-        filtered = df[df[column].astype(str) == value]
-        return jsonify(filtered.to_dict(orient='records'))
-    except KeyError:
+        query = parse_query_args()
+        key = ('filter', DEFAULT_CODE, dataset.version, column, value) + tuple(sorted(query.items()))
+        return cached_response(key, lambda: apply_query(
+            dataset.frame.take(dataset.index.equal(column, value)), query))
+    except (KeyError, ValueError) as e:
+        return jsonify({'error': f'Invalid query: {e}'}), 400
+
+@app.route('/api/data/<column>', methods=['GET'])
+def range_data(column):
+    # 数值区间过滤，例如 /api/data/涨跌幅(%)?gt=5&le=10
+    dataset = registry.get(DEFAULT_CODE)
+    if column not in dataset.frame.columns:
         return jsonify({'error': 'Invalid column name'}), 400
+    bounds = {op: request.args.get(op) for op in ('gt', 'ge', 'lt', 'le')}
+    if not any(bounds.values()):
+        return jsonify({'error': 'One of gt/ge/lt/le is required'}), 400
+    try:
+        query = parse_query_args()
+        key = ('range', DEFAULT_CODE, dataset.version, column) + tuple(sorted(bounds.items())) \
+            + tuple(sorted(query.items()))
+        return cached_response(key, lambda: apply_query(
+            dataset.frame.take(dataset.index.between(column, **bounds)), query))
+    except (KeyError, ValueError, TypeError) as e:
+        return jsonify({'error': f'Invalid query: {e}'}), 400
+
+@app.route('/api/stocks', methods=['GET'])
+def list_stocks():
+    # 返回全部可查询的股票代码
+    return jsonify(registry.codes())
+
+@app.route('/api/stocks/<code>/kline', methods=['GET'])
+def get_kline(code):
+    # 返回任意股票的K线数据（查询参数同 /api/data）
+    if code not in registry.codes():
+        return jsonify({'error': 'Unknown stock code'}), 404
+    try:
+        return query_dataset(code)
+    except (KeyError, ValueError) as e:
+        return jsonify({'error': f'Invalid query: {e}'}), 400
+
+def kline_column(frame, *names):
+    """按候选列名取K线列，兼容 '收盘'/'收盘价' 等不同版本的表头"""
+    for name in names:
+        if name in frame:
+            return frame[name].to_numpy(dtype=float)
+    raise KeyError(names[0])
+
+def indicator_frame(frame):
+    """用单行面板计算单只股票的技术指标"""
+    close = kline_column(frame, '收盘价', '收盘')[None, :]
+    high = kline_column(frame, '最高价', '最高')[None, :]
+    low = kline_column(frame, '最低价', '最低')[None, :]
+    results, _ = compute_indicators(close, high, low)
+    result = pd.DataFrame({key: values[0].round(4) for key, values in results.items()})
+    result.insert(0, '日期', frame['日期'].to_numpy())
+    # 指标起始阶段的缺失值输出为 null
+    return result.astype(object).where(result.notna(), None)
+
+@app.route('/api/stocks/<code>/indicators', methods=['GET'])
+def get_indicators(code):
+    # 返回任意股票的技术指标（MA/EMA/MACD/RSI/布林带/ATR/波动率），查询参数同 /api/data
+    if code not in registry.codes():
+        return jsonify({'error': 'Unknown stock code'}), 404
+    try:
+        dataset = registry.get(code)
+        query = parse_query_args()
+        key = ('indicators', code, dataset.version) + tuple(sorted(query.items()))
+        return cached_response(key, lambda: apply_query(indicator_frame(dataset.frame), query))
+    except (KeyError, ValueError) as e:
+        return jsonify({'error': f'Invalid query: {e}'}), 400
+
+def screen_frame(universe, query, where, sort, ascending):
+    """筛选、排名并按 offset/limit 截取，返回 (当前页, 满足条件的股票数)"""
+    limit = None if query['limit'] is None else query['offset'] + query['limit']
+    index, total = universe.screen(where, sort, limit=limit, ascending=ascending)
+    return universe.frame(index[query['offset']:], query['fields']), total
+
+def first_match_frame(day_index, query, where):
+    """当日每只股票第一次满足条件的时刻，按时间先后排列"""
+    codes, times = day_index.first_matches(where)
+    order = np.argsort(times, kind='stable')
+    frame = pd.DataFrame({
+        '代码': [f'{code:06d}' for code in codes[order]],
+        '名称': [day_index.names.get(f'{code:06d}', '') for code in codes[order]],
+        '首次满足时间': pd.to_datetime(times[order], unit='ms', utc=True).tz_convert(LOCAL_TZ).strftime('%H:%M:%S'),
+    })
+    return frame.iloc[page_slice(query)], len(frame)
+
+@app.route('/api/screen', methods=['GET'])
+def screen():
+    # 全市场截面筛选与排名，例如 /api/screen?q=涨跌幅>5 and 成交额>1e8 and 振幅<10&sort=成交额&limit=20
+    # q 筛选条件、sort 排序表达式、order=asc/desc；day/at 指定快照交易日和时刻（HH:MM[:SS]）；
+    # mode=first 返回当日每只股票首次满足条件的时刻；limit/offset/fields/format 同 /api/data
+    where, sort = request.args.get('q'), request.args.get('sort')
+    ascending = request.args.get('order', 'desc') == 'asc'
+    mode = request.args.get('mode', 'snapshot')
+    try:
+        query = parse_query_args()
+        day = request.args.get('day')
+        day_index = screen_source.day_index(day)
+        ts = parse_time(day_index.day if day_index else day, request.args.get('at'))
+        version, day_index, universe = screen_source.resolve(day, ts)
+        key = ('screen', version, mode, where, sort, ascending) + tuple(sorted(query.items()))
+        if mode == 'first':
+            if day_index is None or not where:
+                return jsonify({'error': 'mode=first requires intraday snapshots and q'}), 400
+            return cached_response(key, lambda: first_match_frame(day_index, query, where))
+        return cached_response(key, lambda: screen_frame(universe(), query, where, sort, ascending))
+    except KeyError as e:
+        return jsonify({'error': f'No data: {e}'}), 404
+    except ValueError as e:
+        return jsonify({'error': f'Invalid query: {e}'}), 400
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description='股票数据后端服务')
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('--no-debug', action='store_true', help='关闭调试模式和自动重载')
+    args = parser.parse_args(argv)
+    # 周期汇总和事件由 metrics 日志输出，需要 INFO 级别
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    instrumentation.configure()
+    app.run(debug=not args.no_debug, host=args.host, port=args.port)
 
 if __name__ == '__main__':
-    app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
+    main()
@@ -0,0 +1,83 @@
+import numpy as np
+import pandas as pd
+
+# 加载时预建有序视图的列；注册表只加载K线数据集，文本列的哈希索引在第一次被查询时建立
+SORTED_COLUMNS = ('日期',)
+
+
+def coerce_value(series, value):
+    """将URL中的字符串参数转换为列的类型，无法转换时抛出 ValueError"""
+    if pd.api.types.is_numeric_dtype(series):
+        return float(value)
+    return value
+
+
+class SortedColumn:
+    """列的有序视图：二分查找完成等值和区间查询"""
+
+    def __init__(self, series):
+        values = series.to_numpy()
+        if series.is_monotonic_increasing:
+            self.order = None
+            self.values = values
+        else:
+            self.order = np.argsort(values, kind='stable')
+            self.values = values[self.order]
+        # 缺失值排在末尾，不参与区间查询
+        self.size = len(self.values) - int(series.isna().sum())
+
+    def range(self, low=None, high=None, low_inclusive=True, high_inclusive=True):
+        """返回落在区间内的行位置（升序）"""
+        values = self.values[:self.size]
+        lo = 0 if low is None else int(np.searchsorted(values, low, side='left' if low_inclusive else 'right'))
+        hi = self.size if high is None else int(np.searchsorted(values, high, side='right' if high_inclusive else 'left'))
+        if hi <= lo:
+            return np.empty(0, dtype=np.int64)
+        if self.order is None:
+            return np.arange(lo, hi)
+        return np.sort(self.order[lo:hi])
+
+
+class DatasetIndex:
+    """
+    数据集的查询索引
+
+    加载时为日期列建立有序视图（O(log n) 区间查询）；其余列在第一次被查询时按需建立索引
+    （文本列建哈希索引，O(1) 等值查询；数值列建有序视图），之后的查询不再整列扫描。
+    """
+
+    def __init__(self, frame):
+        self.frame = frame
+        self.hash = {}
+        self.sorted = {col: SortedColumn(frame[col]) for col in SORTED_COLUMNS if col in frame}
+
+    def sorted_column(self, column):
+        view = self.sorted.get(column)
+        if view is None:
+            view = self.sorted[column] = SortedColumn(self.frame[column])
+        return view
+
+    def equal(self, column, value):
+        """返回 column == value 的行位置，value 为URL中的字符串"""
+        series = self.frame[column]
+        try:
+            value = coerce_value(series, value)
+        except ValueError:
+            return np.empty(0, dtype=np.int64)
+        if column in self.sorted:
+            return self.sorted[column].range(value, value)
+        if column not in self.hash and not pd.api.types.is_numeric_dtype(series):
+            self.hash[column] = self.frame.groupby(column, sort=False).indices
+        if column in self.hash:
+            positions = self.hash[column].get(value)
+            return np.empty(0, dtype=np.int64) if positions is None else np.sort(positions)
+        return self.sorted_column(column).range(value, value)
+
+    def between(self, column, gt=None, ge=None, lt=None, le=None):
+        """返回满足区间条件的行位置，边界为URL中的字符串"""
+        series = self.frame[column]
+        low, low_inclusive = (ge, True) if ge is not None else (gt, False)
+        high, high_inclusive = (le, True) if le is not None else (lt, False)
+        low = None if low is None else coerce_value(series, low)
+        high = None if high is None else coerce_value(series, high)
+        return self.sorted_column(column).range(low, high, low_inclusive, high_inclusive)
@@ -0,0 +1,153 @@
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import pandas as pd
+
+from indexes import DatasetIndex
+
+# data/stock_{code}_{start}_{end}.csv
+CSV_PATTERN = re.compile(r'^stock_(\d{6})_(\d{8})_(\d{8})\.csv$')
+
+
+class Dataset:
+    """已加载到内存的单只股票数据及其查询索引"""
+
+    def __init__(self, code, source, frame, mtime):
+        self.code = code
+        self.source = source
+        self.frame = frame
+        self.mtime = mtime
+        self.nbytes = int(frame.memory_usage(deep=True).sum())
+        self.index = DatasetIndex(frame)
+
+    @property
+    def version(self):
+        """数据版本，用于响应缓存的键"""
+        return (self.source, self.mtime)
+
+
+class DatasetRegistry:
+    """
+    多股票数据集注册表
+
+    启动时只扫描文件名，不读取文件内容；每只股票保留日期范围最新的CSV
+    （列式K线存储中存在的股票优先使用存储）。数据在首次访问时加载，
+    按LRU在内存预算内淘汰；文件修改时间变化时在后台线程重新加载，
+    重新加载完成前继续返回旧数据，不阻塞请求。
+    """
+
+    def __init__(self, data_dir, store=None, max_bytes=512 * 1024 * 1024, check_interval=1.0):
+        self.data_dir = data_dir
+        self.store = store
+        self.max_bytes = max_bytes
+        self.check_interval = check_interval
+
+        self.lock = threading.RLock()
+        self.sources = {}            # code -> ('csv', 路径) / ('store', 路径)
+        self.loaded = OrderedDict()  # code -> Dataset，按最近访问排序
+        self.reloading = set()
+        self.last_scan = 0.0
+        self.last_checked = {}
+
+    def scan(self, force=False):
+        """扫描数据目录，更新每只股票的数据来源"""
+        now = time.monotonic()
+        if not force and now - self.last_scan < self.check_interval:
+            return
+        newest = {}
+        for name in os.listdir(self.data_dir):
+            match = CSV_PATTERN.match(name)
+            if not match:
+                continue
+            code, start, end = match.groups()
+            # 结束日期最新者优先，结束日期相同时取起始日期更早（范围更大）的
+            rank = (end, -int(start))
+            if code not in newest or rank > newest[code][0]:
+                newest[code] = (rank, ('csv', os.path.join(self.data_dir, name)))
+        sources = {code: source for code, (_, source) in newest.items()}
+        if self.store is not None:
+            for code in self.store.symbols():
+                sources[code] = ('store', os.path.join(self.store.root, code, 'date.bin'))
+        with self.lock:
+            self.sources = sources
+            self.last_scan = now
+
+    def codes(self):
+        """返回全部可用的股票代码"""
+        self.scan()
+        return sorted(self.sources)
+
+    def _read(self, code, source):
+        kind, path = source
+        if kind == 'store':
+            return self.store.read_frame(code)
+        return pd.read_csv(path)
+
+    def _load(self, code, source):
+        mtime = os.path.getmtime(source[1])
+        dataset = Dataset(code, source, self._read(code, source), mtime)
+        with self.lock:
+            self.loaded[code] = dataset
+            self.loaded.move_to_end(code)
+            self._evict()
+        return dataset
+
+    def _evict(self):
+        total = sum(ds.nbytes for ds in self.loaded.values())
+        while total > self.max_bytes and len(self.loaded) > 1:
+            _, dataset = self.loaded.popitem(last=False)
+            total -= dataset.nbytes
+
+    def _reload_in_background(self, code, source):
+        with self.lock:
+            if code in self.reloading:
+                return
+            self.reloading.add(code)
+
+        def run():
+            try:
+                self._load(code, source)
+            except Exception as e:
+                print(f"重新加载 {code} 失败: {str(e)}")
+            finally:
+                with self.lock:
+                    self.reloading.discard(code)
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def _is_stale(self, dataset, source):
+        if dataset.source != source:
+            return True
+        now = time.monotonic()
+        if now - self.last_checked.get(dataset.code, 0.0) < self.check_interval:
+            return False
+        self.last_checked[dataset.code] = now
+        try:
+            return os.path.getmtime(source[1]) != dataset.mtime
+        except FileNotFoundError:
+            return True
+
+    def get(self, code):
+        """
+        获取股票数据集；不存在时抛出 KeyError
+
+        首次访问同步加载；已加载的数据若文件有更新则后台重新加载，本次仍返回旧数据。
+        """
+        self.scan()
+        with self.lock:
+            source = self.sources.get(code)
+            dataset = self.loaded.get(code)
+            if dataset is not None:
+                self.loaded.move_to_end(code)
+        if source is None:
+            if dataset is not None:
+                return dataset
+            raise KeyError(code)
+        if dataset is None:
+            return self._load(code, source)
+        if self._is_stale(dataset, source):
+            self._reload_in_background(code, source)
+        return dataset
@@ -0,0 +1,90 @@
+import gzip
+import zlib
+
+try:
+    import brotli
+except ImportError:  # brotli 为可选依赖，未安装时只协商 gzip
+    brotli = None
+
+# 支持的响应格式：records 为逐行对象数组，columns 为列名只出现一次的列式对象
+FORMATS = ('records', 'columns')
+# 小于该字节数的响应不压缩
+MIN_COMPRESS_SIZE = 1024
+
+
+def negotiate_encoding(accept_encoding):
+    """根据 Accept-Encoding 选择压缩方式，优先 br，其次 gzip"""
+    accepted = set()
+    for item in (accept_encoding or '').split(','):
+        name, _, params = item.strip().partition(';')
+        if params.strip().replace(' ', '') in ('q=0', 'q=0.0'):
+            continue
+        accepted.add(name.strip().lower())
+    if brotli is not None and 'br' in accepted:
+        return 'br'
+    if 'gzip' in accepted:
+        return 'gzip'
+    return 'identity'
+
+
+def compress(body, encoding):
+    """压缩完整响应体"""
+    if encoding == 'br':
+        return brotli.compress(body, quality=5)
+    if encoding == 'gzip':
+        return gzip.compress(body, compresslevel=6)
+    return body
+
+
+def iter_compress(chunks, encoding):
+    """流式压缩，逐块输出"""
+    if encoding == 'identity':
+        yield from chunks
+        return
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=5)
+        for chunk in chunks:
+            out = compressor.process(chunk)
+            if out:
+                yield out
+        yield compressor.finish()
+        return
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31 输出gzip格式
+    for chunk in chunks:
+        out = compressor.compress(chunk)
+        if out:
+            yield out
+    yield compressor.flush()
+
+
+def serialize(frame, fmt, dumps):
+    """将 DataFrame 序列化为 JSON 字节串"""
+    if fmt == 'columns':
+        payload = {'columns': list(frame.columns), 'data': [frame[col].tolist() for col in frame.columns]}
+    else:
+        payload = frame.to_dict(orient='records')
+    return dumps(payload).encode('utf-8')
+
+
+def iter_serialize(frame, fmt, dumps, chunk_rows=5000):
+    """
+    分块序列化 DataFrame，输出与 serialize 相同的 JSON 文本
+
+    每次只为 chunk_rows 行构造 Python 对象，峰值内存与结果总行数无关。
+    """
+    if fmt == 'columns':
+        yield b'{"columns":' + dumps(list(frame.columns)).encode('utf-8') + b',"data":['
+        for i, col in enumerate(frame.columns):
+            yield b',[' if i else b'['
+            for start in range(0, len(frame), chunk_rows):
+                values = dumps(frame[col].iloc[start:start + chunk_rows].tolist())[1:-1]
+                if values:
+                    yield (b',' if start else b'') + values.encode('utf-8')
+            yield b']'
+        yield b']}'
+        return
+    yield b'['
+    for start in range(0, len(frame), chunk_rows):
+        records = dumps(frame.iloc[start:start + chunk_rows].to_dict(orient='records'))[1:-1]
+        yield (b',' if start else b'') + records.encode('utf-8')
+    yield b']'
@@ -0,0 +1,127 @@
+"""
+K线批量下载：本地模拟服务上的吞吐、429 退避、续传与失败报告
+
+启动本地模拟K线接口（--url 指向它），按 secid 返回合成K线，并注入故障：
+  每 --throttle-every 只股票的第一次请求返回 429（Retry-After: 0），应在重试后成功
+  UNKNOWN_CODE 返回 data=null（股票不存在），应记入失败报告
+  BROKEN_CODE 始终返回 503，重试耗尽后应记入失败报告
+先下载前一半股票，再对全部股票续传（应跳过前一半），最后再续传一次（只重试失败的股票）。
+
+用法：python benchmarks/bench_bulk_download.py [--codes 200] [--bars 1000] [--workers 8]
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import threading
+from collections import Counter
+from urllib.parse import urlparse, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from bulk_history_downloader import BulkHistoryDownloader  # noqa: E402
+from kline_store import KLineStore  # noqa: E402
+from synthetic import kline_strings  # noqa: E402
+
+UNKNOWN_CODE = '999998'
+BROKEN_CODE = '999999'
+
+
+def make_handler(klines, throttle_every):
+    requests_seen = Counter()
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, *args):
+            pass
+
+        def _send(self, status, body=b'', headers=()):
+            self.send_response(status)
+            for name, value in headers:
+                self.send_header(name, value)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            code = parse_qs(urlparse(self.path).query)['secid'][0].split('.')[1]
+            with lock:
+                requests_seen[code] += 1
+                first = requests_seen[code] == 1
+            if code == BROKEN_CODE:
+                return self._send(503)
+            if first and int(code) % throttle_every == 0:
+                return self._send(429, headers=[('Retry-After', '0')])
+            data = None if code == UNKNOWN_CODE else {'code': code, 'klines': klines}
+            self._send(200, json.dumps({'rc': 0, 'data': data}).encode('utf-8'),
+                       [('Content-Type', 'application/json')])
+
+    Handler.requests_seen = requests_seen
+    return Handler
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='K线批量下载模拟测试')
+    parser.add_argument('--codes', type=int, default=200)
+    parser.add_argument('--bars', type=int, default=1000)
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--rate', type=float, default=1000, help='每秒请求数上限')
+    parser.add_argument('--throttle-every', type=int, default=5)
+    args = parser.parse_args()
+
+    handler = make_handler(kline_strings(args.bars), args.throttle_every)
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f'http://127.0.0.1:{server.server_address[1]}/api/qt/stock/kline/get'
+
+    codes = [f'{600000 + i:06d}' for i in range(args.codes)] + [UNKNOWN_CODE, BROKEN_CODE]
+    half = args.codes // 2
+    root = tempfile.mkdtemp(prefix='bench_bulk_')
+    try:
+        def downloader():
+            return BulkHistoryDownloader(store=KLineStore(root), workers=args.workers, rate=args.rate,
+                                         max_retries=2, backoff=0.01, url=url, end_date='20250328')
+
+        first = downloader().run(codes[:half])
+        assert first['succeeded'] == half and first['failed'] == 0
+
+        bulk = downloader()
+        start = time.perf_counter()
+        second = bulk.run(codes)
+        elapsed = time.perf_counter() - start
+        # 续传：前一半已完成，不再请求
+        assert second['skipped'] == half
+        assert second['succeeded'] == len(codes) - half - 2 and second['failed'] == 2
+        assert all(handler.requests_seen[code] == 1 + (int(code) % args.throttle_every == 0)
+                   for code in codes[:args.codes])
+        # 429 在同一次下载中重试成功，不进入失败报告
+        throttled = sum(int(code) % args.throttle_every == 0 for code in codes[half:args.codes])
+        stats = bulk.client.stats()['kline']
+        assert stats['retries'] == throttled + 2, stats
+        with open(bulk.report_path, encoding='utf-8') as f:
+            report = json.load(f)
+        assert set(report) == {UNKNOWN_CODE, BROKEN_CODE}
+        assert report[UNKNOWN_CODE].startswith('LookupError') and '503' in report[BROKEN_CODE]
+        store = KLineStore(root)
+        assert all(store.row_count(code) == args.bars for code in codes[:args.codes])
+
+        # 再次续传只重试失败的股票
+        third = downloader().run(codes)
+        assert third['skipped'] == args.codes and third['failed'] == 2
+        assert handler.requests_seen[BROKEN_CODE] == 6
+    finally:
+        server.shutdown()
+        shutil.rmtree(root, ignore_errors=True)
+
+    pending = len(codes) - half
+    print(f"续传下载 {pending} 只股票（{throttled} 次 429，2 只失败）: {elapsed:.3f}s，"
+          f"{pending / elapsed:.0f} 只/秒，{second['bars'] / elapsed:,.0f} 根K线/秒")
+    print(f"接口统计: requests={stats['requests']} retries={stats['retries']} "
+          f"p50={stats['p50_ms']:.1f}ms p95={stats['p95_ms']:.1f}ms")
+    print("续传、429 退避重试、失败报告校验通过")
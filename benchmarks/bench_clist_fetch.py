@@ -0,0 +1,93 @@
+"""
+全市场行情列表拉取性能：单次大页请求 vs 分页并发请求 + 类型化解析
+
+启动本地模拟服务，按 pn/pz 分页返回合成的行情列表（单页最多 --cap 条，超出部分截断，
+与真实接口一致），对比：
+  单次请求 pz=10000（被截断，只拿到第一页）
+  fetch_stock_list 分页并发 + parse_quotes 类型化解析
+
+用法：python benchmarks/bench_clist_fetch.py [--rows 5500] [--cap 100] [--workers 8]
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+from urllib.parse import urlparse, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import requests
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from s1 import fetch_stock_list, parse_quotes  # noqa: E402
+
+
+def make_rows(n, seed=0):
+    rng = random.Random(seed)
+    rows = []
+    for i in range(n):
+        prev = round(rng.uniform(2, 200), 2)
+        price = round(prev * (1 + rng.uniform(-0.1, 0.1)), 2)
+        suspended = rng.random() < 0.01
+        rows.append({
+            'f12': f'{(600000 if i % 2 else 0) + i:06d}', 'f14': f'股票{i}',
+            'f2': '-' if suspended else price, 'f3': '-' if suspended else round((price / prev - 1) * 100, 2),
+            'f4': '-' if suspended else round(price - prev, 2), 'f5': rng.randint(0, 10 ** 7),
+            'f6': round(rng.uniform(0, 1e10), 2), 'f7': round(rng.uniform(0, 20), 2),
+            'f15': price, 'f16': price, 'f17': prev, 'f18': prev, 'f124': 1743000000 + i,
+        })
+    return sorted(rows, key=lambda row: row['f12'])
+
+
+def make_handler(rows, cap):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            query = parse_qs(urlparse(self.path).query)
+            page, size = int(query['pn'][0]), min(int(query['pz'][0]), cap)
+            diff = rows[(page - 1) * size:page * size]
+            body = json.dumps({'rc': 0, 'data': {'total': len(rows), 'diff': diff}}, ensure_ascii=False).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    return Handler
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='行情列表拉取性能')
+    parser.add_argument('--rows', type=int, default=5500)
+    parser.add_argument('--cap', type=int, default=100, help='模拟服务单页上限')
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    rows = make_rows(args.rows)
+    server = ThreadingHTTPServer(('127.0.0.1', 0), make_handler(rows, args.cap))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f'http://127.0.0.1:{server.server_address[1]}/api/qt/clist/get'
+
+    start = time.perf_counter()
+    single = requests.get(url, params={'pn': 1, 'pz': 10000}, timeout=10).json()['data']['diff']
+    single_time = time.perf_counter() - start
+
+    best = float('inf')
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        stock_list = fetch_stock_list(page_size=args.cap, workers=args.workers, url=url)
+        columns, names = parse_quotes(stock_list)
+        best = min(best, time.perf_counter() - start)
+    server.shutdown()
+
+    assert len(columns['code']) == args.rows and len(names) == args.rows
+    print(f"单次请求 pz=10000: {len(single):>6} 条 {single_time:.3f}s（被截断）")
+    print(f"分页并发+解析:      {len(columns['code']):>6} 条 {best:.3f}s "
+          f"（{-(-args.rows // args.cap)} 页，{args.workers} 并发）")
@@ -0,0 +1,122 @@
+"""
+股吧评论采集吞吐对比：JSON 接口路径 vs 列表页 HTML + lxml 整页解析路径
+
+启动本地模拟服务返回 JSONP 接口数据和列表页 HTML，分别用两条路径采集相同页数，
+对比页/秒、帖子/秒；并验证空响应体重试和接口失效后自动切换到 HTML 路径。
+
+用法：python benchmarks/bench_guba_fetch.py [--pages 50] [--posts 80]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from eastmoney_api_crawler import EastmoneyGubaCrawler, parse_post_list  # noqa: E402
+
+
+def make_posts(page, n):
+    base = 1533853127 - page * n
+    return [{
+        'post_id': base - i,
+        'post_title': f'帖子标题{page}-{i}',
+        'user_nickname': f'用户{i}',
+        'post_click_count': 1000 + i,
+        'post_comment_count': i % 50,
+        'post_publish_time': f'2025-03-28 {i % 24:02d}:{i % 60:02d}:00',
+    } for i in range(n)]
+
+
+def make_list_html(posts):
+    rows = ''.join(
+        f'<div class="articleh normal_post"><span class="l1 a1">{p["post_click_count"]}</span>'
+        f'<span class="l2 a2">{p["post_comment_count"]}</span>'
+        f'<span class="l3 a3"><a href="/news,600519,{p["post_id"]}.html" title="{p["post_title"]}">{p["post_title"]}</a></span>'
+        f'<span class="l4 a4"><a href="//i.eastmoney.com/1">{p["user_nickname"]}</a></span>'
+        f'<span class="l5 a5">{p["post_publish_time"][5:16]}</span></div>'
+        for p in posts)
+    return (f'<html><head><title>股吧</title></head><body><div id="articlelistnew">'
+            f'<div class="dheader"><span class="l1">阅读</span></div>{rows}</div></body></html>')
+
+
+def make_handler(posts_per_page, empty_first):
+    state = {'empty': empty_first}
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def _send(self, body, content_type):
+            self.send_response(200)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path.startswith('/api'):
+                with lock:
+                    empty = state['empty'] > 0
+                    state['empty'] -= 1
+                if empty:
+                    return self._send(b'', 'text/plain')
+                page = int(self.path.split('pn=')[1].split('&')[0])
+                payload = json.dumps({'re': make_posts(page, posts_per_page)}, ensure_ascii=False)
+                return self._send(f'jQuery112_({payload});'.encode('utf-8'), 'application/javascript')
+            page = int(self.path.rsplit('_', 1)[1].split('.')[0])
+            self._send(make_list_html(make_posts(page, posts_per_page)).encode('utf-8'), 'text/html')
+
+    return Handler
+
+
+def run(port, pages, force_html=False):
+    crawler = EastmoneyGubaCrawler(backoff=0.01, api_url=f'http://127.0.0.1:{port}/api',
+                                   list_url=f'http://127.0.0.1:{port}/list,{{stock_code}}_{{page}}.html')
+    crawler.api_available = not force_html
+    df = crawler.get_comments('600519', max_pages=pages)
+    return crawler, df
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='股吧评论采集吞吐对比')
+    parser.add_argument('--pages', type=int, default=50)
+    parser.add_argument('--posts', type=int, default=80)
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), make_handler(args.posts, empty_first=2))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    port = server.server_address[1]
+
+    # 前两次接口请求返回空响应体，应在同一页内重试成功
+    crawler, api_df = run(port, args.pages)
+    assert crawler.stats['html']['pages'] == 0 and len(api_df) == args.pages * args.posts
+    api = crawler.throughput()['api']
+
+    crawler, html_df = run(port, args.pages, force_html=True)
+    assert len(html_df) == len(api_df)
+    assert (html_df['帖子ID'].values == api_df['帖子ID'].values).all()
+    html = crawler.throughput()['html']
+
+    # 接口持续返回空响应体时自动切换到 HTML 路径
+    server.RequestHandlerClass = make_handler(args.posts, empty_first=10 ** 9)
+    crawler, fallback_df = run(port, 3)
+    assert not crawler.api_available and len(fallback_df) == 3 * args.posts
+    server.shutdown()
+
+    print(f"{'路径':<6} {'页数':>6} {'帖子数':>8} {'页/秒':>10} {'帖子/秒':>10}")
+    for name, stats in (('api', api), ('html', html)):
+        print(f"{name:<6} {stats['pages']:>6} {stats['posts']:>8} "
+              f"{stats['pages_per_second']:>10.1f} {stats['posts_per_second']:>10.0f}")
+
+    # 浏览器路径的解析开销：整页一次解析 vs 原来每行 5 次 find_element
+    page_html = make_list_html(make_posts(1, args.posts))
+    start = time.perf_counter()
+    for _ in range(100):
+        parse_post_list(page_html)
+    parse_ms = (time.perf_counter() - start) * 10
+    print(f"lxml 整页解析 {parse_ms:.2f} ms/页；替代每页 {args.posts * 5 + 1} 次 WebDriver 调用，"
+          f"现为 1 次 page_source")
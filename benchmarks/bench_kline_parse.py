@@ -0,0 +1,67 @@
+"""
+K线解析性能对比：parse_kline_item 逐行字典 + DataFrame vs parse_klines 批量列解析
+
+用法：python benchmarks/bench_kline_parse.py [--sizes 1000 10000 100000 1000000]
+"""
+import os
+import sys
+import time
+import argparse
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from kline_store import KLINE_FIELDS  # noqa: E402
+from stock_history_crawler import parse_kline_item, parse_klines  # noqa: E402
+
+
+def make_klines(n, seed=0):
+    """按接口返回格式生成 n 条合成K线字符串"""
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range('1990-01-01', periods=n).strftime('%Y-%m-%d')
+    close = np.round(rng.uniform(2, 2000, n), 2)
+    open_ = np.round(close * (1 + rng.normal(0, 0.01, n)), 2)
+    high = np.round(np.maximum(open_, close) + 0.5, 2)
+    low = np.round(np.minimum(open_, close) - 0.5, 2)
+    volume = rng.integers(1000, 1000000, n)
+    amount = np.round(volume * close * 100, 1)
+    pct = np.round(rng.normal(0, 2, n), 2)
+    return [
+        f"{d},{o},{c},{h},{lo},{v},{a},{p},{p},{p},{p}"
+        for d, o, c, h, lo, v, a, p in zip(dates, open_, close, high, low, volume, amount, pct)
+    ]
+
+
+def legacy_parse(klines):
+    """原有路径：逐行解析为字典后构造 DataFrame，再转为列数组"""
+    df = pd.DataFrame([parse_kline_item(item) for item in klines])
+    columns = {name: df[cn].to_numpy() for cn, name, _ in KLINE_FIELDS}
+    columns['date'] = df['日期'].str.replace('-', '', regex=False).astype('int32').to_numpy()
+    return columns
+
+
+def timed(func, *args, repeat=3):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='K线解析性能对比')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000, 1000000])
+    args = parser.parse_args()
+
+    print(f"{'K线条数':>10} {'逐行解析(s)':>12} {'批量解析(s)':>12} {'加速比':>8}")
+    for n in args.sizes:
+        klines = make_klines(n)
+        columns, errors = parse_klines(klines)
+        expected = legacy_parse(klines)
+        assert not errors and all(np.array_equal(columns[k], expected[k]) for k in expected)
+
+        legacy = timed(legacy_parse, klines)
+        batch = timed(parse_klines, klines)
+        print(f"{n:>10} {legacy:>12.4f} {batch:>12.4f} {legacy / batch:>7.1f}x")
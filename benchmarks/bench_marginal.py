@@ -0,0 +1,51 @@
+"""
+边缘分布性能对比：逐变量 gaussian_kde（marginal_distribution）vs 批量分箱FFT（marginal_distributions）
+
+用法：python benchmarks/bench_marginal.py [--sizes 100000 1000000] [--features 4]
+"""
+import os
+import sys
+import time
+import argparse
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from marginal import marginal_distribution, marginal_distributions  # noqa: E402
+
+
+def make_data(n, features, seed=0):
+    """生成相关的多元样本，其中一半变量取指数以模拟偏态分布"""
+    rng = np.random.default_rng(seed)
+    cov = np.full((features, features), 0.5) + 0.5 * np.eye(features)
+    data = rng.multivariate_normal(np.zeros(features), cov, size=n)
+    data[:, features // 2:] = np.exp(data[:, features // 2:])
+    return data
+
+
+def legacy(data):
+    return [marginal_distribution(data, j) for j in range(data.shape[1])]
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - start, result
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='边缘分布性能对比')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100000, 1000000])
+    parser.add_argument('--features', type=int, default=4)
+    args = parser.parse_args()
+    # marginal_distribution 在函数内按需导入 scipy，先在计时区外导入
+    import scipy.stats  # noqa: F401
+
+    print(f"{'样本数':>10} {'逐变量KDE(s)':>14} {'批量分箱(s)':>12} {'加速比':>8} {'最大相对误差':>12}")
+    for n in args.sizes:
+        data = make_data(n, args.features)
+        legacy_time, expected = timed(legacy, data)
+        batch_time, (_, pdfs) = timed(marginal_distributions, data)
+        error = max(np.abs(pdfs[j] - pdf).max() / pdf.max() for j, (_, pdf) in enumerate(expected))
+        assert error < 1e-3, f"误差 {error} 超出容差"
+        print(f"{n:>10} {legacy_time:>14.3f} {batch_time:>12.4f} {legacy_time / batch_time:>7.0f}x {error:>12.2e}")
@@ -0,0 +1,70 @@
+"""
+冷启动耗时：每个入口在全新解释器中的导入耗时及加载的重型依赖
+
+对每个入口用 python -X importtime 启动子进程，统计：
+  wall      子进程总耗时（取 --repeat 次中的最小值）
+  import    -X importtime 报告的顶层导入累计耗时
+  heavy     实际加载的重型依赖（pandas、scipy、selenium 等）
+  top       自身耗时最多的若干模块
+
+用法：python benchmarks/bench_startup.py [--repeat 5] [--top 5]
+"""
+import os
+import re
+import sys
+import time
+import argparse
+import subprocess
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+# 入口：(名称, 子进程执行的代码)；cli 子命令只解析参数，不实际运行
+ENTRIES = [
+    ('import s1', 'import s1'),
+    ('import stock_history_crawler', 'import stock_history_crawler'),
+    ('import bulk_history_downloader', 'import bulk_history_downloader'),
+    ('import guba_scheduler', 'import guba_scheduler'),
+    ('import eastmoney_guba_crawler', 'import eastmoney_guba_crawler'),
+    ('import marginal', 'import marginal'),
+    ('cli --help', 'import cli; cli.main(["--help"])'),
+    ('cli crawl history -h', 'import cli; cli.main(["crawl", "history", "-h"])'),
+    ('cli crawl snapshot -h', 'import cli; cli.main(["crawl", "snapshot", "-h"])'),
+    ('cli crawl guba -h', 'import cli; cli.main(["crawl", "guba", "-h"])'),
+    ('cli analyze screen -h', 'import cli; cli.main(["analyze", "screen", "-h"])'),
+]
+HEAVY = ['pandas', 'numpy', 'scipy', 'selenium', 'apscheduler', 'redis', 'flask', 'lxml',
+         'requests', 'bs4', 'matplotlib', 'smtplib']
+LINE = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)')
+
+
+def profile(code):
+    """运行一次，返回 (总耗时秒, {模块: (自身微秒, 累计微秒, 缩进)})"""
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], cwd=ROOT,
+                            capture_output=True, text=True)
+    wall = time.perf_counter() - start
+    modules = {}
+    for line in result.stderr.splitlines():
+        match = LINE.match(line)
+        if match:
+            modules[match.group(4)] = (int(match.group(1)), int(match.group(2)), len(match.group(3)))
+    return wall, modules
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='入口冷启动耗时')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--top', type=int, default=3, help='列出自身耗时最多的模块数')
+    args = parser.parse_args()
+
+    print(f"{'入口':<32} {'wall(ms)':>9} {'import(ms)':>11}  重型依赖 / 耗时最多的模块")
+    for name, code in ENTRIES:
+        runs = [profile(code) for _ in range(args.repeat)]
+        wall, modules = min(runs, key=lambda run: run[0])
+        # 顶层导入（缩进最小）的累计耗时之和即导入总耗时
+        indent = min((m[2] for m in modules.values()), default=0)
+        total = sum(cumulative for _, cumulative, level in modules.values() if level == indent) / 1000
+        heavy = [m for m in HEAVY if m in modules]
+        top = sorted(modules.items(), key=lambda item: -item[1][0])[:args.top]
+        print(f"{name:<32} {wall * 1000:>9.0f} {total:>11.0f}  {','.join(heavy) or '-'}")
+        print(f"{'':<55}{', '.join(f'{m} {us / 1000:.0f}ms' for m, (us, _, _) in top)}")
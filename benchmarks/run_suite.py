@@ -0,0 +1,306 @@
+"""
+采集、存储和服务路径的基准测试套件
+
+覆盖：
+  kline      parse_kline_item 逐行字典 + DataFrame 与 parse_klines 批量解析（10^3 ~ 10^6 根K线）
+  snapshot   s1.parse_quotes 行情列表类型化解析、s1.save_to_csv 导出
+  backend    CSV 加载；Flask 测试客户端并发请求 /api/data 与 /api/data/<column>/<value>
+             （冷查询、缓存命中两种情况，统计 p50/p95 延迟和吞吐）
+  screen     screener 复合条件筛选 + 前20名排名
+  marginal   marginal_distribution 逐变量 KDE 与 marginal_distributions 批量分箱的规模扩展
+
+输入全部由 benchmarks/synthetic.py 按 data/ 下真实CSV的表头生成。每个用例重复 --repeat 次取中位数，
+结果写入 benchmarks/results/latest.json，并与 benchmarks/baseline.json 比较：
+中位耗时超过基线 (1 + --tolerance) 倍且增加不少于 --min-delta 秒的用例记为回退，存在回退时以退出码 1 结束。
+基线与机器相关，换机器或确认性能变化后用 --save-baseline 重新生成。
+
+用法：
+  python benchmarks/run_suite.py                       # 默认规模，与基线比较
+  python benchmarks/run_suite.py --full                # 包含 10^6 根K线等大规模用例
+  python benchmarks/run_suite.py --only kline backend  # 只运行部分分组
+  python benchmarks/run_suite.py --save-baseline       # 以本次结果作为新基线
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import statistics
+import threading
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..'))
+sys.path.insert(0, os.path.join(HERE, '..', 'backend'))
+import synthetic  # noqa: E402
+
+BASELINE_PATH = os.path.join(HERE, 'baseline.json')
+RESULTS_DIR = os.path.join(HERE, 'results')
+
+KLINE_SIZES = [1000, 10000, 100000]
+KLINE_SIZES_FULL = KLINE_SIZES + [1000000]
+QUOTE_SIZES = [5500]
+QUOTE_SIZES_FULL = [5500, 50000]
+BACKEND_ROWS = [1300, 100000]
+MARGINAL_SIZES = [10000, 100000]
+MARGINAL_SIZES_FULL = [10000, 100000, 1000000]
+# 逐变量 gaussian_kde 的计算量与样本数平方成正比，超过该规模不再运行
+MARGINAL_LEGACY_MAX = 100000
+
+CASES = []
+
+
+def case(group):
+    """注册用例生成器：生成器逐个产出 (用例名, 被测函数, 处理条数)"""
+    def register(func):
+        CASES.append((group, func))
+        return func
+    return register
+
+
+def measure(func, repeat):
+    """
+    运行 repeat 次，返回每次耗时（秒）及最后一次的附加指标
+
+    被测函数返回 {指标名: float} 时（如并发负载的延迟分位数）作为附加指标记录，其余返回值忽略
+    """
+    seconds, result = [], None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        seconds.append(time.perf_counter() - start)
+    extra = {k: v for k, v in result.items() if isinstance(v, float)} if isinstance(result, dict) else {}
+    return seconds, extra
+
+
+@case('kline')
+def kline_cases(args):
+    from bench_kline_parse import legacy_parse
+    from stock_history_crawler import parse_klines
+
+    for n in (KLINE_SIZES_FULL if args.full else KLINE_SIZES):
+        klines = synthetic.kline_strings(n)
+        yield f'kline.parse_kline_item_frame[{n}]', \
+            lambda: legacy_parse(klines), n
+        yield f'kline.parse_klines[{n}]', lambda: parse_klines(klines), n
+
+
+@case('snapshot')
+def snapshot_cases(args):
+    from s1 import CLIST_SCHEMA, parse_quotes, save_to_csv
+
+    directory = tempfile.mkdtemp(prefix='bench_s1_')
+    try:
+        for n in (QUOTE_SIZES_FULL if args.full else QUOTE_SIZES):
+            items = synthetic.clist_items(n, CLIST_SCHEMA)
+            yield f'snapshot.parse_quotes[{n}]', lambda: parse_quotes(items), n
+
+            columns = [name for _, name, _ in CLIST_SCHEMA]
+            rows = [[item.get(key, '') for key, _, _ in CLIST_SCHEMA] for item in items]
+            path = os.path.join(directory, 'stock_data.csv')
+            yield f'snapshot.save_to_csv[{n}]', lambda: save_to_csv(path, columns, rows), n
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def load_backend(data_dir):
+    """导入 backend/app.py，并把数据集注册表替换为指向合成数据目录的注册表"""
+    import logging
+    import app as backend
+    from registry import DatasetRegistry
+
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    backend.registry = DatasetRegistry(data_dir)
+    backend.response_cache.clear()
+    return backend
+
+
+def concurrent_load(backend, paths, clients):
+    """clients 个线程各自用一个测试客户端请求 paths 中的一部分，返回延迟统计"""
+    latencies = [[] for _ in range(clients)]
+    errors = []
+
+    def run(worker):
+        client = backend.app.test_client()
+        for path in paths[worker::clients]:
+            start = time.perf_counter()
+            response = client.get(path, headers={'Accept-Encoding': 'gzip'})
+            latencies[worker].append(time.perf_counter() - start)
+            if response.status_code != 200:
+                errors.append((path, response.status_code))
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(clients)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    if errors:
+        raise RuntimeError(f"请求失败: {errors[:3]}")
+    ordered = np.sort(np.concatenate([np.asarray(l) for l in latencies]))
+    return {
+        'p50_ms': float(ordered[len(ordered) // 2] * 1000),
+        'p95_ms': float(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000),
+        'requests_per_second': len(paths) / elapsed,
+    }
+
+
+@case('backend')
+def backend_cases(args):
+    from registry import DatasetRegistry
+
+    for n in BACKEND_ROWS:
+        directory = tempfile.mkdtemp(prefix='bench_backend_')
+        try:
+            synthetic.write_kline_csv(directory, n, code='600519')
+            yield f'backend.csv_load[{n}]', lambda: DatasetRegistry(directory).get('600519'), n
+
+            backend = load_backend(directory)
+            frame = backend.registry.get('600519').frame
+            # 冷查询：每个请求的分页不同，缓存全部未命中
+            cold = [f'/api/data?limit=500&offset={i * 97 % max(1, n - 500)}&start={frame.iloc[i % (n // 2), 0]}'
+                    for i in range(args.requests)]
+            values = frame['涨跌幅(%)'].drop_duplicates().head(args.requests).tolist() \
+                if '涨跌幅(%)' in frame else frame.iloc[:args.requests, 0].tolist()
+            column = '涨跌幅(%)' if '涨跌幅(%)' in frame else frame.columns[0]
+            filters = [f'/api/data/{column}/{values[i % len(values)]}?limit=500' for i in range(args.requests)]
+
+            def run(paths, reset):
+                if reset:
+                    backend.response_cache.clear()
+                return concurrent_load(backend, paths, args.clients)
+
+            yield f'backend.api_data_cold[{n}]', lambda: run(cold, True), len(cold)
+            yield f'backend.api_data_cached[{n}]', lambda: run(cold[:1] * len(cold), False), len(cold)
+            yield f'backend.filter_data_cold[{n}]', lambda: run(filters, True), len(filters)
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
+
+@case('screen')
+def screen_cases(args):
+    from s1 import CLIST_SCHEMA, parse_quotes
+    from screener import Universe
+
+    for n in (QUOTE_SIZES_FULL if args.full else QUOTE_SIZES):
+        columns, names = parse_quotes(synthetic.clist_items(n, CLIST_SCHEMA))
+        columns['name'] = np.array([names[f'{code:06d}'] for code in columns['code']], dtype=object)
+        universe = Universe(columns)
+        yield f'screen.compound_top20[{n}]', lambda: universe.screen(
+            '涨跌幅 > 5 and 成交额 > 1e8 and 振幅 < 10', sort='成交额', limit=20), n
+
+
+@case('marginal')
+def marginal_cases(args):
+    from marginal import marginal_distribution, marginal_distributions
+    # marginal_distribution 在函数内按需导入 scipy，先在计时区外导入，避免首次运行计入导入耗时
+    import scipy.stats  # noqa: F401
+
+    for n in (MARGINAL_SIZES_FULL if args.full else MARGINAL_SIZES):
+        data = synthetic.correlated_samples(n, 4)
+        if n <= MARGINAL_LEGACY_MAX:
+            yield f'marginal.marginal_distribution[{n}]', \
+                lambda: [marginal_distribution(data, j) for j in range(data.shape[1])], n
+        yield f'marginal.marginal_distributions[{n}]', lambda: marginal_distributions(data), n
+
+
+def run_suite(args):
+    results = {}
+    for group, generate in CASES:
+        if args.only and group not in args.only:
+            continue
+        for name, func, items in generate(args):
+            seconds, extra = measure(func, args.repeat)
+            median = statistics.median(seconds)
+            results[name] = dict({'median_s': median, 'min_s': min(seconds),
+                                  'items_per_second': items / median if median else None}, **extra)
+            print(f"{name:<45} {median:>10.4f}s {items / median if median else 0:>14,.0f}/s"
+                  + ''.join(f"  {k}={v:.1f}" for k, v in extra.items()))
+    return results
+
+
+def environment():
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'processor': platform.processor() or platform.machine(),
+        'cpus': os.cpu_count(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+    }
+
+
+def compare(results, baseline, tolerance, min_delta=0.005):
+    """
+    返回 [(用例名, 基线中位耗时, 本次中位耗时, 比值)]，只包含超出容差的用例
+
+    耗时增加不足 min_delta 秒的用例视为计时噪声，不计为回退
+    """
+    regressions = []
+    for name, result in results.items():
+        reference = baseline.get('results', {}).get(name)
+        if not reference:
+            continue
+        ratio = result['median_s'] / reference['median_s']
+        if ratio > 1 + tolerance and result['median_s'] - reference['median_s'] >= min_delta:
+            regressions.append((name, reference['median_s'], result['median_s'], ratio))
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='基准测试套件')
+    parser.add_argument('--only', nargs='+', choices=sorted({group for group, _ in CASES}),
+                        help='只运行指定分组')
+    parser.add_argument('--full', action='store_true', help='包含 10^6 规模的用例')
+    parser.add_argument('--repeat', type=int, default=5, help='每个用例的重复次数')
+    parser.add_argument('--requests', type=int, default=200, help='每个并发负载用例的请求数')
+    parser.add_argument('--clients', type=int, default=8, help='并发客户端数')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='允许的耗时增幅')
+    parser.add_argument('--min-delta', type=float, default=0.005, help='计为回退的最小耗时增加（秒）')
+    parser.add_argument('--baseline', default=BASELINE_PATH, help='基线文件')
+    parser.add_argument('--save-baseline', action='store_true', help='以本次结果覆盖基线')
+    args = parser.parse_args()
+
+    results = run_suite(args)
+    report = {'created': datetime.now().isoformat(timespec='seconds'), 'environment': environment(),
+              'repeat': args.repeat, 'results': results}
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    with open(os.path.join(RESULTS_DIR, 'latest.json'), 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    if args.save_baseline:
+        if os.path.exists(args.baseline):
+            with open(args.baseline, encoding='utf-8') as f:
+                previous = json.load(f)
+            # 只覆盖本次运行的用例，保留其余用例的基线
+            report['results'] = dict(previous.get('results', {}), **results)
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"基线已保存到 {args.baseline}")
+        sys.exit(0)
+
+    if not os.path.exists(args.baseline):
+        print(f"未找到基线 {args.baseline}，使用 --save-baseline 生成")
+        sys.exit(0)
+    with open(args.baseline, encoding='utf-8') as f:
+        baseline = json.load(f)
+    if baseline.get('environment') != report['environment']:
+        print("注意：基线来自不同的运行环境，比较结果仅供参考")
+    missing = sorted(set(results) - set(baseline.get('results', {})))
+    if missing:
+        print(f"基线中没有的用例: {', '.join(missing)}")
+    regressions = compare(results, baseline, args.tolerance, args.min_delta)
+    if not regressions:
+        print(f"与基线相比无回退（容差 {args.tolerance:.0%}）")
+        sys.exit(0)
+    print(f"{'性能回退':<45} {'基线(s)':>10} {'本次(s)':>10} {'比值':>7}")
+    for name, before, after, ratio in regressions:
+        print(f"{name:<45} {before:>10.4f} {after:>10.4f} {ratio:>6.2f}x")
+    sys.exit(1)
@@ -0,0 +1,126 @@
+"""
+基准测试用的合成数据
+
+列名、列顺序和数值范围取自仓库中的真实文件：
+  data/stock_{code}_*.csv     K线（日期 + 10个数值列，与接口 klines 字段顺序一致）
+  stock_data_*.csv            全市场行情列表（s1 导出格式）
+真实文件不存在时退回内置的表头。数值在真实样本的 [最小值, 最大值] 内均匀生成，
+按样本的小数位数取整，因此等值过滤（/api/data/<column>/<value>）能命中多行。
+"""
+import os
+import re
+import glob
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+DATA_DIR = os.path.join(ROOT, 'data')
+KLINE_CSV = re.compile(r'^stock_(\d{6})_(\d{8})_(\d{8})\.csv$')
+
+KLINE_HEADER = ['日期', '开盘价', '收盘价', '最高价', '最低价', '成交量(手)', '成交额(元)',
+                '振幅(%)', '涨跌幅(%)', '涨跌额', '换手率(%)']
+
+
+def _decimals(series):
+    text = series.astype(str)
+    fraction = text.str.partition('.')[2].str.rstrip('0')
+    return int(fraction.str.len().max() or 0)
+
+
+def kline_sample():
+    """最新的K线CSV样本（与 backend 注册表的选取规则一致：结束日期最新者优先）"""
+    candidates = []
+    for path in glob.glob(os.path.join(DATA_DIR, 'stock_*.csv')):
+        match = KLINE_CSV.match(os.path.basename(path))
+        if match:
+            candidates.append(((match.group(3), -int(match.group(2))), path))
+    if not candidates:
+        return None
+    return pd.read_csv(max(candidates)[1])
+
+
+def quote_sample():
+    """最新的行情列表导出样本"""
+    paths = sorted(glob.glob(os.path.join(ROOT, 'stock_data_*.csv')), key=os.path.getmtime)
+    return pd.read_csv(paths[-1], dtype={'代码': str}) if paths else None
+
+
+def _numeric_like(sample, column, n, rng, default=(0.0, 100.0)):
+    values = pd.to_numeric(sample[column].astype(str).str.rstrip('%'), errors='coerce') \
+        if sample is not None and column in sample else pd.Series(dtype=float)
+    values = values.dropna()
+    low, high = (values.min(), values.max()) if len(values) else default
+    decimals = _decimals(values) if len(values) else 2
+    generated = np.round(rng.uniform(low, high, n), decimals)
+    return generated.astype(np.int64) if decimals == 0 else generated
+
+
+def kline_frame(n, seed=0):
+    """n 根日K线的 DataFrame，表头与 data/ 下最新的K线CSV相同"""
+    rng = np.random.default_rng(seed)
+    sample = kline_sample()
+    header = list(sample.columns) if sample is not None else KLINE_HEADER
+    frame = pd.DataFrame({header[0]: pd.bdate_range('1990-01-01', periods=n).strftime('%Y-%m-%d')})
+    for column in header[1:]:
+        frame[column] = _numeric_like(sample, column, n, rng)
+    # 最高/最低价与开收盘价保持一致
+    open_, close, high, low = header[1:5]
+    frame[high] = np.maximum(frame[high], np.maximum(frame[open_], frame[close]))
+    frame[low] = np.minimum(frame[low], np.minimum(frame[open_], frame[close]))
+    return frame
+
+
+def kline_strings(n, seed=0):
+    """按接口返回格式（逗号分隔的11个字段）生成 n 条K线字符串"""
+    frame = kline_frame(n, seed)
+    lines = frame.iloc[:, 0].astype(str)
+    for column in frame.columns[1:]:
+        lines = lines + ',' + frame[column].astype(str)
+    return lines.tolist()
+
+
+def write_kline_csv(directory, n, code='600519', seed=0):
+    """写入 stock_{code}_{start}_{end}.csv 供 backend 注册表加载，返回路径"""
+    frame = kline_frame(n, seed)
+    start, end = frame.iloc[0, 0].replace('-', ''), frame.iloc[-1, 0].replace('-', '')
+    path = os.path.join(directory, f'stock_{code}_{start}_{end}.csv')
+    frame.to_csv(path, index=False, encoding='utf-8-sig')
+    return path
+
+
+def clist_items(n, schema, seed=0):
+    """
+    生成 n 条行情列表接口的 diff 记录
+
+    参数：
+    schema - s1.CLIST_SCHEMA，(接口字段, 中文列名, 快照列名)
+    """
+    rng = np.random.default_rng(seed)
+    sample = quote_sample()
+    columns = {}
+    for key, name, _ in schema:
+        if name == '代码':
+            columns[key] = [f'{(600000 if i % 2 else 0) + i:06d}' for i in range(n)]
+        elif name == '名称':
+            columns[key] = [f'股票{i}' for i in range(n)]
+        elif name == '更新时间':
+            columns[key] = (1743000000 + np.arange(n)).tolist()
+        else:
+            columns[key] = _numeric_like(sample, name, n, rng).tolist()
+    # 约1%停牌，行情字段为 '-'
+    suspended = rng.random(n) < 0.01
+    for key, name, col in schema:
+        if col not in (None, 'code', 'updated'):
+            columns[key] = ['-' if s else v for s, v in zip(suspended, columns[key])]
+    keys = list(columns)
+    return [dict(zip(keys, row)) for row in zip(*columns.values())]
+
+
+def correlated_samples(n, features, seed=0):
+    """相关的多元样本，其中一半变量取指数以模拟偏态分布"""
+    rng = np.random.default_rng(seed)
+    cov = np.full((features, features), 0.5) + 0.5 * np.eye(features)
+    data = rng.multivariate_normal(np.zeros(features), cov, size=n)
+    data[:, features // 2:] = np.exp(data[:, features // 2:])
+    return data
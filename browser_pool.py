@@ -0,0 +1,216 @@
+import queue
+import logging
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+# 页面加载时屏蔽的资源：图片、字体、音视频及常见广告/统计域名
+BLOCKED_URLS = [
+    '*.png', '*.jpg', '*.jpeg', '*.gif', '*.webp', '*.svg', '*.ico',
+    '*.woff', '*.woff2', '*.ttf', '*.otf', '*.mp4', '*.mp3',
+    '*googlesyndication.com*', '*doubleclick.net*', '*hm.baidu.com*', '*cnzz.com*',
+    '*emad.eastmoney.com*', '*bdstatic.com*',
+]
+
+
+def _chrome(options):
+    from selenium import webdriver
+
+    return webdriver.Chrome(options=options)
+
+
+class PooledDriver:
+    """池中的浏览器实例及其借出次数"""
+
+    def __init__(self, driver):
+        self.driver = driver
+        self.leases = 0
+
+
+class BrowserPool:
+    """
+    可复用的无头浏览器池
+
+    保持 size 个常驻的 Chrome 实例，按需借出；归还时清理多余标签页、Cookie 和
+    本地存储，使下一次使用拿到干净的状态。单个实例借出次数达到 max_leases
+    或会话失效、浏览器崩溃时自动销毁重建；找不到元素、等待超时等页面级错误不影响实例复用。
+    默认屏蔽图片、字体和广告请求以缩短页面加载时间。
+    selenium 在第一次启动浏览器或处理异常时才导入。
+    """
+
+    def __init__(self, size=2, headless=True, max_leases=200, block_resources=True,
+                 arguments=None, driver_factory=None, page_load_timeout=30):
+        self.size = size
+        self.headless = headless
+        self.max_leases = max_leases
+        self.block_resources = block_resources
+        self.arguments = list(arguments or [])
+        self.driver_factory = driver_factory or _chrome
+        self.page_load_timeout = page_load_timeout
+
+        self._idle = queue.LifoQueue()  # 后进先出，优先复用最近使用的热实例
+        self._created = 0
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def _options(self):
+        from selenium import webdriver
+
+        options = webdriver.ChromeOptions()
+        if self.headless:
+            options.add_argument('--headless')
+        for argument in self.arguments:
+            options.add_argument(argument)
+        # DOM 解析完成即返回，不等待图片等资源
+        options.page_load_strategy = 'eager'
+        if self.block_resources:
+            options.add_experimental_option('prefs', {
+                'profile.managed_default_content_settings.images': 2,
+                'profile.managed_default_content_settings.fonts': 2,
+            })
+        return options
+
+    def _create(self):
+        from selenium.common.exceptions import WebDriverException
+
+        driver = self.driver_factory(self._options())
+        driver.set_page_load_timeout(self.page_load_timeout)
+        if self.block_resources:
+            try:
+                driver.execute_cdp_cmd('Network.enable', {})
+                driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': BLOCKED_URLS})
+            except (WebDriverException, AttributeError) as e:
+                logging.warning(f"资源屏蔽设置失败: {str(e)}")
+        return PooledDriver(driver)
+
+    def _destroy(self, pooled):
+        try:
+            pooled.driver.quit()
+        except Exception as e:
+            logging.warning(f"浏览器关闭异常: {str(e)}")
+        with self._lock:
+            self._created -= 1
+
+    def _reset(self, pooled):
+        """清理标签页、Cookie 和存储，恢复到空白页"""
+        driver = pooled.driver
+        handles = driver.window_handles
+        for handle in handles[1:]:
+            driver.switch_to.window(handle)
+            driver.close()
+        driver.switch_to.window(handles[0])
+        driver.delete_all_cookies()
+        driver.execute_script('try { localStorage.clear(); sessionStorage.clear(); } catch (e) {}')
+        driver.get('about:blank')
+
+    def warm(self):
+        """预先启动全部浏览器实例"""
+        started = []
+        while True:
+            with self._lock:
+                if self._created >= self.size:
+                    break
+                self._created += 1
+            try:
+                started.append(self._create())
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                # 已启动的实例一并关闭，避免泄漏浏览器进程
+                for pooled in started:
+                    self._destroy(pooled)
+                raise
+        for pooled in started:
+            self._idle.put(pooled)
+        return self
+
+    def _acquire(self):
+        if self._closed:
+            raise RuntimeError('浏览器池已关闭')
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            can_create = self._created < self.size
+            if can_create:
+                self._created += 1
+        if can_create:
+            try:
+                return self._create()
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+        return self._idle.get()
+
+    def _alive(self, pooled):
+        """探测浏览器会话是否仍可用"""
+        from selenium.common.exceptions import WebDriverException
+
+        try:
+            pooled.driver.title
+            return True
+        except WebDriverException:
+            return False
+
+    def _release(self, pooled, broken=False):
+        from selenium.common.exceptions import WebDriverException
+
+        pooled.leases += 1
+        if not broken and not self._closed and pooled.leases < self.max_leases:
+            try:
+                self._reset(pooled)
+                self._idle.put(pooled)
+                return
+            except WebDriverException as e:
+                logging.warning(f"浏览器状态清理失败，重建实例: {str(e)}")
+        self._destroy(pooled)
+
+    @contextmanager
+    def lease(self):
+        """借出一个浏览器：with pool.lease() as driver: ..."""
+        from selenium.common.exceptions import InvalidSessionIdException, WebDriverException
+
+        pooled = self._acquire()
+        broken = False
+        try:
+            yield pooled.driver
+        except WebDriverException as e:
+            # 只有会话失效或浏览器崩溃时才销毁；NoSuchElement、Timeout 等页面级错误保留实例
+            broken = isinstance(e, InvalidSessionIdException) or not self._alive(pooled)
+            raise
+        finally:
+            self._release(pooled, broken)
+
+    def map(self, func, items):
+        """
+        并行处理多个任务，每个任务独占一个浏览器
+
+        func(driver, item) 的返回值按 items 顺序返回；单个任务出错时返回异常对象。
+        """
+        def run(item):
+            try:
+                with self.lease() as driver:
+                    return func(driver, item)
+            except Exception as e:
+                logging.error(f"任务 {item} 失败: {str(e)}")
+                return e
+
+        with ThreadPoolExecutor(max_workers=self.size) as executor:
+            return list(executor.map(run, items))
+
+    def close(self):
+        """关闭全部浏览器"""
+        self._closed = True
+        while True:
+            try:
+                self._destroy(self._idle.get_nowait())
+            except queue.Empty:
+                break
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
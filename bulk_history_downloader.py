@@ -0,0 +1,201 @@
+import os
+import json
+import time
+import logging
+import argparse
+import threading
+from datetime import datetime
+from urllib.parse import urlparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from http_client import HttpClient
+from instrumentation import configure
+from kline_store import KLineStore
+from stock_history_crawler import KLINE_URL, fetch_klines, sync_symbol
+
+
+class TokenBucket:
+    """线程安全的令牌桶限速器"""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)                      # 每秒补充的令牌数
+        self.capacity = float(capacity or max(rate, 1))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """获取一个令牌，令牌不足时阻塞等待"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class HostRateLimiter:
+    """按主机名分别维护令牌桶"""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+    def acquire(self, url):
+        host = urlparse(url).netloc
+        with self.lock:
+            bucket = self.buckets.get(host)
+            if bucket is None:
+                bucket = self.buckets[host] = TokenBucket(self.rate, self.capacity)
+        bucket.acquire()
+
+
+class BulkHistoryDownloader:
+    """
+    全市场K线批量下载器
+
+    使用共享的 keep-alive 连接池并发请求K线接口，按主机令牌桶限速，
+    失败时指数退避加随机抖动重试；进度写入 progress 文件，中断后可续传，
+    最终输出逐只股票的失败报告。
+    """
+
+    def __init__(self, store=None, workers=16, rate=20, burst=None, max_retries=4,
+                 backoff=0.5, timeout=10, url=KLINE_URL, start_date='20200101',
+                 end_date=None, progress_path=None, report_path=None):
+        self.store = store or KLineStore()
+        self.workers = workers
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.url = url
+        self.start_date = start_date
+        self.end_date = end_date or datetime.now().strftime("%Y%m%d")
+        self.progress_path = progress_path or os.path.join(self.store.root, '_progress.json')
+        self.report_path = report_path or os.path.join(self.store.root, '_failures.json')
+        self.limiter = HostRateLimiter(rate, burst)
+
+        # 连接池大小与并发数一致，避免连接被反复新建；限速和退避重试由客户端在每次请求前后处理
+        self.client = HttpClient(pool_size=workers, timeout=timeout, max_retries=max_retries,
+                                 backoff=backoff, limiter=self.limiter)
+
+        self._lock = threading.Lock()
+        self._done = set()
+        self._failures = {}
+
+    def _fetch(self, stock_code, start_date, end_date):
+        """带限速和重试的K线请求，供 sync_symbol 调用"""
+        return fetch_klines(stock_code, start_date, end_date, client=self.client, url=self.url)
+
+    def _load_progress(self):
+        if not os.path.exists(self.progress_path):
+            return set()
+        with open(self.progress_path, encoding='utf-8') as f:
+            progress = json.load(f)
+        # 只有同一结束日期的进度才可续传
+        if progress.get('end_date') != self.end_date:
+            return set()
+        return set(progress.get('done', []))
+
+    def _save_progress(self):
+        os.makedirs(os.path.dirname(self.progress_path) or '.', exist_ok=True)
+        tmp_path = self.progress_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'end_date': self.end_date, 'done': sorted(self._done)}, f)
+        os.replace(tmp_path, self.progress_path)
+
+    def _save_report(self):
+        os.makedirs(os.path.dirname(self.report_path) or '.', exist_ok=True)
+        with open(self.report_path, 'w', encoding='utf-8') as f:
+            json.dump(self._failures, f, ensure_ascii=False, indent=2)
+
+    def _download_one(self, stock_code):
+        added = sync_symbol(stock_code, self.store, self.start_date, self.end_date, fetch=self._fetch)
+        if added is None:
+            raise LookupError(f"股票代码 {stock_code} 不存在或无数据")
+        return added
+
+    def run(self, stock_codes, resume=True, save_every=50):
+        """
+        并发下载一批股票的K线
+
+        参数：
+        stock_codes - 股票代码列表
+        resume      - 是否跳过进度文件中已完成的股票
+        save_every  - 每完成多少只股票保存一次进度
+
+        返回：汇总信息 {'total', 'skipped', 'succeeded', 'failed', 'bars', 'seconds'}
+        """
+        started = time.perf_counter()
+        self._done = self._load_progress() if resume else set()
+        self._failures = {}
+        pending = [code for code in dict.fromkeys(stock_codes) if code not in self._done]
+        skipped = len(set(stock_codes)) - len(pending)
+        logging.info(f"共 {len(pending)} 只股票待下载，跳过已完成 {skipped} 只")
+
+        bars = 0
+        completed = 0
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = {executor.submit(self._download_one, code): code for code in pending}
+            for future in as_completed(futures):
+                code = futures[future]
+                with self._lock:
+                    try:
+                        bars += future.result()
+                        self._done.add(code)
+                    except Exception as e:
+                        self._failures[code] = f"{type(e).__name__}: {e}"
+                        logging.debug(f"{code} 下载失败: {self._failures[code]}")
+                    completed += 1
+                    if completed % save_every == 0:
+                        self._save_progress()
+                        logging.info(f"进度 {completed}/{len(pending)}，失败 {len(self._failures)}")
+
+        self._save_progress()
+        self._save_report()
+        summary = {
+            'total': len(pending) + skipped,
+            'skipped': skipped,
+            'succeeded': len(pending) - len(self._failures),
+            'failed': len(self._failures),
+            'bars': bars,
+            'seconds': round(time.perf_counter() - started, 3),
+        }
+        logging.info(f"下载完成: {summary}，失败明细见 {self.report_path}")
+        self.client.log_stats()
+        return summary
+
+
+def load_universe():
+    """通过 s1.get_stock_data 获取全部A股代码"""
+    from s1 import get_stock_data
+
+    _, rows = get_stock_data()
+    return [row[0] for row in rows if row and row[0]]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='全市场K线批量下载工具')
+    parser.add_argument('codes', nargs='*', help='股票代码，默认下载全部A股')
+    parser.add_argument('-w', '--workers', type=int, default=16, help='并发数')
+    parser.add_argument('-r', '--rate', type=float, default=20, help='每秒请求数上限')
+    parser.add_argument('-s', '--start', type=str, default='20200101', help='起始日期（YYYYMMDD）')
+    parser.add_argument('--url', type=str, default=KLINE_URL, help='K线接口地址（可指向本地测试服务）')
+    parser.add_argument('--no-resume', action='store_true', help='忽略已有进度重新下载')
+    args = parser.parse_args(argv)
+    # 抓取、解析、写盘各阶段的耗时汇总周期性写入日志
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    configure()
+
+    downloader = BulkHistoryDownloader(workers=args.workers, rate=args.rate,
+                                       start_date=args.start, url=args.url)
+    downloader.run(args.codes or load_universe(), resume=not args.no_resume)
+
+
+if __name__ == '__main__':
+    main()
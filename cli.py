@@ -0,0 +1,75 @@
+"""
+统一命令行入口
+
+  python cli.py crawl history [代码 ...]        K线批量下载/增量同步（bulk_history_downloader）
+  python cli.py crawl snapshot [--capture]      行情列表导出或高频快照采集（s1）
+  python cli.py crawl guba [--mode browser]     股吧多进程采集调度（guba_scheduler）
+  python cli.py serve [--port 5000]             后端服务（backend/app.py）
+  python cli.py analyze indicators              全市场技术指标计算（indicators）
+  python cli.py analyze screen '涨跌幅 > 5'      全市场截面筛选（screener）
+
+子命令之后的参数原样交给对应模块的 main(argv)，例如 python cli.py crawl snapshot -h。
+本文件只导入标准库；pandas、scipy、selenium、flask 等依赖只在运行用到它们的子命令时
+随目标模块导入。加 --import-time 时在标准错误输出目标模块的导入耗时。
+"""
+import os
+import sys
+import time
+import argparse
+import importlib
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# 子命令：{命令: {子命令: (模块, 模块所在目录, 说明)}}，serve 没有子命令
+COMMANDS = {
+    'crawl': {
+        'history': ('bulk_history_downloader', ROOT, 'K线批量下载/增量同步'),
+        'snapshot': ('s1', ROOT, '行情列表导出或高频快照采集'),
+        'guba': ('guba_scheduler', ROOT, '股吧多进程采集调度'),
+    },
+    'serve': ('app', os.path.join(ROOT, 'backend'), '后端服务'),
+    'analyze': {
+        'indicators': ('indicators', ROOT, '全市场技术指标计算'),
+        'screen': ('screener', ROOT, '全市场截面筛选'),
+    },
+}
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='cli.py', description='股票数据采集、服务与分析')
+    parser.add_argument('--import-time', action='store_true', help='输出目标模块的导入耗时')
+    commands = parser.add_subparsers(dest='command', required=True)
+    for command, targets in COMMANDS.items():
+        if isinstance(targets, tuple):
+            # 目标模块自带参数解析，-h 也交给它处理
+            commands.add_parser(command, help=targets[2], add_help=False).set_defaults(target=targets)
+            continue
+        group = commands.add_parser(command, help='/'.join(targets))
+        subcommands = group.add_subparsers(dest='subcommand', required=True)
+        for name, target in targets.items():
+            subcommands.add_parser(name, help=target[2], add_help=False).set_defaults(target=target)
+    return parser
+
+
+def load(module, path, report=False):
+    """导入子命令对应的模块"""
+    if path not in sys.path:
+        sys.path.insert(0, path)
+    start = time.perf_counter()
+    loaded = importlib.import_module(module)
+    if report:
+        print(f"导入 {module} 耗时 {(time.perf_counter() - start) * 1000:.0f}ms，"
+              f"已加载模块 {len(sys.modules)} 个", file=sys.stderr)
+    return loaded
+
+
+def main(argv=None):
+    args, rest = build_parser().parse_known_args(argv)
+    module, path, _ = args.target
+    # 目标模块的用法提示和参数错误信息显示完整的子命令，如 "cli.py analyze screen"
+    sys.argv[0] = ' '.join(['cli.py', args.command] + ([args.subcommand] if 'subcommand' in args else []))
+    return load(module, path, args.import_time).main(rest)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,20 +1,118 @@
-import requests
-import pandas as pd
-import time
+import re
 import json
-import random
+import time
+import logging
 from datetime import datetime
 
+import requests
+from lxml import html as lxml_html
+
+from http_client import EmptyResponse, HttpClient
+from instrumentation import configure, event, timed
+
+API_URL = "http://guba.eastmoney.com/interface/GetData.aspx"
+LIST_URL = "https://guba.eastmoney.com/list,{stock_code}_{page}.html"
+# 接口返回空响应体后暂停使用的秒数，之后重新探测接口
+API_RETRY_INTERVAL = 300
+
+# JSONP 回调包装：jQuery112_xxx({...}); 或 cb({...})
+JSONP_PATTERN = re.compile(r'^\s*[\w$.]+\s*\((.*)\)\s*;?\s*$', re.S)
+# 帖子链接中的帖子ID：/news,600519,1533853127.html
+POST_ID_PATTERN = re.compile(r'news,\w+,(\d+)\.html')
+
+# 列表页帖子行的字段：列样式名 -> 字段名
+LIST_COLUMNS = {'l1': '阅读量', 'l2': '评论数', 'l3': '标题', 'l4': '作者', 'l5': '发布时间'}
+
+
+@timed('parse.guba_api')
+def parse_jsonp(text):
+    """
+    解析 JSON 或 JSONP 响应
+
+    响应体为空时抛出 EmptyResponse，既不是 JSON 也不是 JSONP 时抛出 ValueError
+    """
+    body = (text or '').strip()
+    if not body:
+        raise EmptyResponse('响应体为空')
+    if body[0] not in '{[':
+        match = JSONP_PATTERN.match(body)
+        if match is None:
+            raise ValueError(f'响应内容非JSON格式: {body[:100]}')
+        body = match.group(1)
+    return json.loads(body)
+
+
+@timed('parse.guba_list')
+def parse_post_list(page_html):
+    """
+    一次性解析股吧列表页 HTML 中的全部帖子
+
+    参数：
+    page_html - 列表页源码（requests 响应文本或浏览器的 page_source）
+
+    返回：帖子字典列表，字段为 帖子ID、发布时间、标题、阅读量、评论数、作者
+    """
+    if not page_html or not page_html.strip():
+        return []
+    root = lxml_html.fromstring(page_html)
+    posts = []
+    for row in root.find_class('articleh'):
+        post = dict.fromkeys(LIST_COLUMNS.values(), '')
+        link = None
+        # 每行只遍历一次子节点，按样式名归类
+        for cell in row:
+            for cls in (cell.get('class') or '').split():
+                field = LIST_COLUMNS.get(cls)
+                if field is not None:
+                    post[field] = cell.text_content().strip()
+                    if cls == 'l3':
+                        anchor = cell.find('.//a')
+                        link = anchor.get('href') if anchor is not None else None
+                    break
+        match = POST_ID_PATTERN.search(link) if link else None
+        if not post['标题'] or match is None:
+            # 表头、置顶广告等没有帖子链接的行
+            continue
+        post['帖子ID'] = match.group(1)
+        posts.append(post)
+    return posts
+
+
+def _format_publish_time(item):
+    value = item.get('publish_time', item.get('post_publish_time'))
+    if isinstance(value, (int, float)):
+        return time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(value))
+    return value or ''
+
+
 class EastmoneyGubaCrawler:
-    """东方财富股吧评论爬虫"""
-    
-    def __init__(self):
+    """
+    东方财富股吧评论爬虫
+
+    优先请求 JSON 接口；接口返回空响应体或非 JSON 内容时，按页重试，
+    仍失败则改为请求列表页 HTML，用 lxml 一次性解析整页帖子。
+    接口停用 api_retry_interval 秒后重新探测，调度器长期复用同一实例时不会永久停留在 HTML 路径。
+    两条路径的页数、帖子数和耗时分别统计，可通过 throughput() 查看。
+    """
+
+    def __init__(self, max_retries=3, backoff=0.5, timeout=10, client=None,
+                 api_url=API_URL, list_url=LIST_URL, limiter=None, api_retry_interval=API_RETRY_INTERVAL):
         self.headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
             'Referer': 'https://guba.eastmoney.com/'
         }
-        self.base_url = "https://guba.eastmoney.com/list,{stock_code}_{page}.html"
-        
+        self.api_url = api_url
+        self.base_url = list_url
+
+        # 共享 HTTP 客户端：连接池、退避重试、按接口统计；limiter 需提供 acquire(url)，每次请求（含重试）前调用
+        self.client = client or HttpClient(headers=self.headers, pool_size=4, timeout=timeout,
+                                           max_retries=max_retries, backoff=backoff, limiter=limiter)
+
+        # 接口连续返回空响应时暂停使用，冷却期内后续页直接走HTML解析
+        self.api_retry_interval = api_retry_interval
+        self._api_down_since = None
+        self.stats = {path: {'pages': 0, 'posts': 0, 'seconds': 0.0} for path in ('api', 'html')}
+
         # API参数配置
         self.api_params = {
             'cb': 'jQuery11240904396623880852_',
@@ -27,50 +125,149 @@ class EastmoneyGubaCrawler:
             'fields': 'f12,f14,f62,f128,f136,f124,f120,f121',
             '_': int(time.time() * 1000)
         }
-    
+
+    @property
+    def api_available(self):
+        """接口当前是否可用：停用超过 api_retry_interval 秒后重新视为可用，由下一页请求探测"""
+        if self._api_down_since is None:
+            return True
+        if time.monotonic() - self._api_down_since >= self.api_retry_interval:
+            self._api_down_since = None
+            event('guba.api_reprobe', f"接口已停用{self.api_retry_interval}秒，重新尝试接口")
+            return True
+        return False
+
+    @api_available.setter
+    def api_available(self, available):
+        self._api_down_since = None if available else time.monotonic()
+
+    def _get_text(self, url, params=None, endpoint=None):
+        """GET 请求返回响应文本；空响应体与连接错误、429/5xx 一样按退避重试，最终抛出 EmptyResponse"""
+        return self.client.get(url, params=params, endpoint=endpoint, retry_empty=True).text
+
+    def _record(self, path, posts, started):
+        stats = self.stats[path]
+        stats['pages'] += 1
+        stats['posts'] += len(posts)
+        stats['seconds'] += time.perf_counter() - started
+
+    def fetch_api_page(self, stock_code, page, start_time=None, end_time=None):
+        """通过 JSON 接口获取一页评论"""
+        started = time.perf_counter()
+        # 构造动态参数
+        params = self.api_params.copy()
+        params.update({
+            'secid': f'1.{stock_code}',
+            'pn': page,
+            '_': int(time.time() * 1000)
+        })
+
+        # 添加时间过滤
+        if start_time:
+            params['beg'] = int(datetime.strptime(start_time, '%Y-%m-%d').timestamp())
+        if end_time:
+            params['end'] = int(datetime.strptime(end_time, '%Y-%m-%d').timestamp())
+
+        data = parse_jsonp(self._get_text(self.api_url, params, endpoint='guba_api'))
+        if not isinstance(data, dict):
+            raise ValueError('接口返回结构异常')
+
+        # 提取评论数据
+        comments = []
+        for item in data.get('re') or []:
+            comments.append({
+                '股票代码': stock_code,
+                '帖子ID': str(item.get('post_id') or ''),
+                '发布时间': _format_publish_time(item),
+                '标题': item.get('post_title', ''),
+                '阅读量': item.get('post_click_count', ''),
+                '评论数': item.get('post_comment_count', ''),
+                '作者': item.get('user_nickname', '')
+            })
+        self._record('api', comments, started)
+        return comments
+
+    def fetch_html_page(self, stock_code, page):
+        """请求列表页 HTML 并一次性解析（接口不可用时的兜底路径）"""
+        started = time.perf_counter()
+        page_html = self._get_text(self.base_url.format(stock_code=stock_code, page=page), endpoint='guba_list')
+        comments = [dict(post, 股票代码=stock_code) for post in parse_post_list(page_html)]
+        self._record('html', comments, started)
+        return comments
+
+    def fetch_page(self, stock_code, page, start_time=None, end_time=None):
+        """
+        获取一页评论：优先接口，失败时解析列表页 HTML
+
+        接口返回空响应体后在冷却期内不再尝试接口；列表页也失败时抛出异常
+        """
+        if self.api_available:
+            try:
+                return self.fetch_api_page(stock_code, page, start_time, end_time)
+            except EmptyResponse as e:
+                event('guba.api_empty', f"第{page}页接口无响应内容，改用列表页解析: {str(e)}")
+                self.api_available = False
+            except (ValueError, requests.exceptions.RequestException) as e:
+                event('guba.api_fallback', f"第{page}页接口请求失败，改用列表页解析: {str(e)}")
+        return self.fetch_html_page(stock_code, page)
+
     def get_comments(self, stock_code='600519', start_time=None, end_time=None, max_pages=5):
         """
         获取股票评论数据
         :param stock_code: 股票代码（6位数字）
-        :param start_time: 起始时间（格式：YYYY-MM-DD）
+        :param start_time: 起始时间（格式：YYYY-MM-DD），仅接口路径支持
         :param end_time: 结束时间
         :param max_pages: 最大爬取页数
         :return: DataFrame格式的评论数据
         """
         comments = []
-        
+
         for page in range(1, max_pages+1):
             try:
-                # 构造动态参数
-                params = self.api_params.copy()
-                params.update({
-                    'secid': f'1.{stock_code}',
-                    'pn': page,
-                    '_': int(time.time() * 1000)
-                })
-                
-                # 添加时间过滤
-                if start_time:
-                    params['beg'] = datetime.strptime(start_time, '%Y-%m-%d').timestamp()
-                if end_time:
-                    params['end'] = datetime.strptime(end_time, '%Y-%m-%d').timestamp()
-                
-                # 发送API请求
-                api_url = "http://guba.eastmoney.com/interface/GetData.aspx"
-                response = requests.get(
-                    url=api_url,
-                    params=params,
-                    headers=self.headers,
-                    timeout=10
-                )
-                response.raise_for_status()
-                
-                # 解析JSON数据
-                json_str = response.text[response.text.find('{'):-1]
-                data = json.loads(json_str)
-                
-                # 提取评论数据
-                for item in data.get('re', []):
-                    comment = {
-                        '股票代码': stock_code,
-                        '发布时间': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(item['publish_time'])),
+                page_comments = self.fetch_page(stock_code, page, start_time, end_time)
+            except (ValueError, requests.exceptions.RequestException) as e:
+                event('guba.page_failed', f"{stock_code} 第{page}页获取失败: {str(e)}", logging.ERROR)
+                continue
+
+            if not page_comments:
+                event('guba.empty_page', f"{stock_code} 第{page}页无有效数据")
+                break
+            comments.extend(page_comments)
+            logging.debug(f"第{page}页采集完成，累计{len(comments)}条数据")
+
+        import pandas as pd
+
+        return pd.DataFrame(comments)
+
+    def throughput(self):
+        """两条采集路径的吞吐：页/秒、帖子/秒"""
+        result = {}
+        for path, stats in self.stats.items():
+            seconds = stats['seconds'] or float('nan')
+            result[path] = dict(stats, pages_per_second=stats['pages'] / seconds,
+                                posts_per_second=stats['posts'] / seconds)
+        return result
+
+    def save_data(self, df, filename=None):
+        """保存数据到CSV"""
+        if df.empty:
+            return None
+        filename = filename or f"guba_comments_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+        df.to_csv(filename, index=False, encoding='utf_8_sig')
+        logging.info(f"数据已保存至 {filename}")
+        return filename
+
+
+if __name__ == '__main__':
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=[logging.FileHandler('guba_crawler.log'), logging.StreamHandler()]
+    )
+    configure()
+    crawler = EastmoneyGubaCrawler()
+    df = crawler.get_comments('600519', max_pages=3)
+    crawler.save_data(df)
+    for path, stats in crawler.throughput().items():
+        logging.info(f"{path}: {stats['pages']}页 {stats['posts']}条 "
+                     f"{stats['pages_per_second']:.2f}页/秒 {stats['posts_per_second']:.1f}条/秒")
@@ -2,56 +2,126 @@ from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-from webdriver_manager.chrome import ChromeDriverManager
+from selenium.common.exceptions import NoSuchElementException, TimeoutException
+from browser_pool import BrowserPool
+from page_waits import PageTimer, Politeness, content_changed, page_signature, wait_for_change
 import pandas as pd
 import time
+from io import StringIO
 
-def get_eastmoney_stock_history(stock_code='600519', start_date='2020-01-01', end_date='2025-03-26'):
-    # 设置Chrome选项
-    options = webdriver.ChromeOptions()
-    options.add_argument('--headless')  # 无头模式
+# 历史行情表格的数据行，用于判断查询/翻页后表格是否已重新渲染
+TABLE_ROWS = '.history-table tbody tr'
+
+def create_driver(options):
+    """自动管理ChromeDriver并启动浏览器"""
+    from webdriver_manager.chrome import ChromeDriverManager
+
+    return webdriver.Chrome(service=webdriver.ChromeService(ChromeDriverManager().install()), options=options)
+
+def wait_for_table(driver, before, timeout=15):
+    """
+    等待查询或翻页后表格刷新，返回表格内容是否变化
+
+    查询结果与当前视图相同时表格不会变化，此时不中断采集，退回到等待数据行出现；
+    数据行在 10 秒内仍未出现时抛出 TimeoutException
+    """
+    try:
+        wait_for_change(driver, TABLE_ROWS, before, timeout)
+        return True
+    except TimeoutException:
+        WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.CSS_SELECTOR, TABLE_ROWS)))
+        return content_changed(TABLE_ROWS, before)(driver)
+
+def get_eastmoney_stock_history(stock_code='600519', start_date='2020-01-01', end_date='2025-03-26',
+                                driver=None, output='stock_history_eastmoney.csv', min_interval=0.5):
+    """
+    通过浏览器抓取股票历史行情表格
     
-    # 自动管理ChromeDriver
-    driver = webdriver.Chrome(service=webdriver.ChromeService(ChromeDriverManager().install()), options=options)
+    driver 为浏览器池借出的实例时直接复用，不关闭；为 None 时单独启动并在结束后关闭。
+    查询和翻页后等待表格内容实际变化，不再固定等待；相邻两次翻页至少间隔 min_interval 秒。
+    """
+    own_driver = driver is None
+    if own_driver:
+        # 设置Chrome选项
+        options = webdriver.ChromeOptions()
+        options.add_argument('--headless')  # 无头模式
+        driver = create_driver(options)
     
+    timer = PageTimer(f'{stock_code} ')
+    politeness = Politeness(min_interval)
     try:
-        # 访问股票历史行情页面
-        driver.get(f'http://quote.eastmoney.com/concept/{stock_code}.html#kline')
+        timer.start(1)
+        with timer.stage('navigation'):
+            # 访问股票历史行情页面
+            driver.get(f'http://quote.eastmoney.com/concept/{stock_code}.html#kline')
         
-        # 等待页面加载完成
-        WebDriverWait(driver, 30).until(
-            EC.presence_of_element_located((By.CSS_SELECTOR, '.kline-container')))
-        
-        # 执行JavaScript设置日期并点击查询
-        driver.execute_script(f"""
-            document.querySelector('input[placeholder="开始日期"]').value = '{start_date}';
-            document.querySelector('input[placeholder="结束日期"]').value = '{end_date}';
-            document.querySelector('.toolbar-search-button').click();
-        """)
-        time.sleep(3)
+        with timer.stage('render'):
+            # 等待页面加载完成
+            WebDriverWait(driver, 30).until(
+                EC.presence_of_element_located((By.CSS_SELECTOR, '.kline-container')))
+            
+            # 执行JavaScript设置日期并点击查询，等待表格按新条件重新渲染
+            before = page_signature(driver, TABLE_ROWS)
+            driver.execute_script(f"""
+                document.querySelector('input[placeholder="开始日期"]').value = '{start_date}';
+                document.querySelector('input[placeholder="结束日期"]').value = '{end_date}';
+                document.querySelector('.toolbar-search-button').click();
+            """)
+            wait_for_table(driver, before)
         
         all_data = []
+        page = 1
         while True:
             # 获取表格数据
-            table = driver.find_element(By.CLASS_NAME, 'history-table')
-            df = pd.read_html(table.get_attribute('outerHTML'))[0]
-            all_data.append(df)
+            with timer.stage('parse'):
+                table = driver.find_element(By.CLASS_NAME, 'history-table')
+                df = pd.read_html(StringIO(table.get_attribute('outerHTML')))[0]
+                all_data.append(df)
             
-            # 尝试翻页
+            # 尝试翻页：先确认有下一页，最后一页不做礼貌等待
             try:
-                next_btn = driver.find_element(By.CSS_SELECTOR, '.next-btn:not(.disabled)')
-                next_btn.click()
-                time.sleep(2)
-            except:
+                with timer.stage('navigation'):
+                    next_btn = driver.find_element(By.CSS_SELECTOR, '.next-btn:not(.disabled)')
+            except NoSuchElementException:
+                # 没有可用的下一页按钮，已到最后一页
+                timer.finish()
+                break
+            try:
+                with timer.stage('politeness'):
+                    politeness.wait()
+                with timer.stage('navigation'):
+                    before = page_signature(driver, TABLE_ROWS)
+                    next_btn.click()
+                timer.finish()
+                page += 1
+                timer.start(page)
+                with timer.stage('render'):
+                    changed = wait_for_table(driver, before)
+            except TimeoutException:
+                changed = False
+            if not changed:
+                print(f'第{page}页表格未刷新，停止翻页')
+                timer.finish()
                 break
                 
         # 合并数据并保存
         final_df = pd.concat(all_data)
-        final_df.to_csv(f'stock_history_eastmoney.csv', index=False)
-        print(f'成功保存{len(final_df)}条数据')
+        final_df.to_csv(output, index=False)
+        print(f'成功保存{len(final_df)}条数据，各阶段耗时: {timer.summary()}')
+        return final_df
         
     finally:
-        driver.quit()
+        if own_driver:
+            driver.quit()
+
+def crawl_stock_histories(stock_codes, start_date='2020-01-01', end_date='2025-03-26', workers=4):
+    """使用浏览器池并行抓取多只股票，每只股票保存为 stock_history_eastmoney_{code}.csv"""
+    with BrowserPool(size=workers, driver_factory=create_driver) as pool:
+        return dict(zip(stock_codes, pool.map(
+            lambda driver, code: get_eastmoney_stock_history(
+                code, start_date, end_date, driver=driver,
+                output=f'stock_history_eastmoney_{code}.csv'),
+            stock_codes)))
 
 if __name__ == '__main__':
     get_eastmoney_stock_history()
\ No newline at end of file
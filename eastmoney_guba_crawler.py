@@ -1,46 +1,51 @@
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-import pandas as pd
-import time
 import logging
 import random
-from apscheduler.schedulers.blocking import BlockingScheduler
-from apscheduler.triggers.interval import IntervalTrigger
-import redis
 import os
-import smtplib
-from email.mime.text import MIMEText
-# 日志配置
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[logging.FileHandler('guba_browser.log'), logging.StreamHandler()]
-)
-
+from functools import partial
+import instrumentation
+from browser_pool import BrowserPool
+from eastmoney_api_crawler import LIST_URL, parse_post_list
+from guba_dedup import IncrementalCollector, open_seen_store
+from page_waits import PageTimer, Politeness, page_signature, wait_for_change
 class BrowserCrawler:
     """基于浏览器自动化的股吧评论采集器"""
     
-    def __init__(self, headless=True):
-        # 初始化浏览器配置
-        self.options = webdriver.ChromeOptions()
-        if headless:
-            self.options.add_argument('--headless')
-        self.options.add_argument('--disable-blink-features=AutomationControlled')
-        self.options.add_argument(f'--user-agent={self._random_user_agent()}')
-        self.driver = webdriver.Chrome(options=self.options)
-        self.driver.implicitly_wait(10)
-        
-        # Redis连接配置
-        self.redis = redis.Redis(
-            host='localhost',
-            port=6379,
-            db=0,
-            decode_responses=True
+    def __init__(self, headless=True, pool=None, min_interval=2.0, seen=None, sink=None):
+        # 浏览器池：常驻实例跨多次采集复用，不再每次启动新的Chrome；实例在第一次借出时才启动
+        self.pool = pool or BrowserPool(
+            size=1,
+            headless=headless,
+            arguments=[
+                '--disable-blink-features=AutomationControlled',
+                f'--user-agent={self._random_user_agent()}',
+            ],
         )
-        self.last_id_key = 'guba:last_post_id'
         
+        # 按股票的采集游标和已见帖子集合：优先 Redis，不可用时使用本地 SQLite；第一次采集时才连接
+        self._seen = seen
+        self._collector = None
+        # 翻页礼貌间隔：等待列表渲染的时间计入间隔，只补足不足部分
+        self.politeness = Politeness(min_interval)
+        # 按股票、日期分区的追加存储（依赖 pandas，未传入时才导入）
+        if sink is None:
+            from guba_sink import GubaSink
+            sink = GubaSink()
+        self.sink = sink
+        # 最近一次 get_comments 中断的原因，完整采集时为 None
+        self.last_error = None
+        
+    @property
+    def seen(self):
+        if self._seen is None:
+            self._seen = open_seen_store()
+        return self._seen
+
+    @property
+    def collector(self):
+        if self._collector is None:
+            self._collector = IncrementalCollector(None, self.seen)
+        return self._collector
+
     def _random_user_agent(self):
         """生成随机用户代理"""
         agents = [
@@ -50,103 +55,149 @@ class BrowserCrawler:
         ]
         return random.choice(agents)
 
-    def _human_like_behavior(self):
-        """模拟人类操作行为"""
-        self.driver.execute_script("window.scrollBy(0, 500)")
-        time.sleep(random.uniform(1.5, 3.0))
+    def _human_like_behavior(self, driver):
+        """模拟人类操作行为（滚动页面，访问间隔由 politeness 控制）"""
+        driver.execute_script("window.scrollBy(0, arguments[0])", random.randint(300, 700))
         
     def get_comments(self, stock_code='600519', max_pages=3):
-        """获取股吧评论数据（带增量采集功能）"""
+        """
+        增量获取股吧评论数据
+
+        只返回此前未采集过的帖子；遇到已采集的帖子（游标以下或在去重集合中）即停止翻页。
+        采集中途失败时返回已取得的部分，原因记在 last_error。去重集合和游标不在此处记录，
+        帖子持久化后调用 commit（save_data 会自动调用）
+        """
+        import pandas as pd
+
         comments = []
-        last_id = self.redis.get(self.last_id_key) or '1533853127'  # 从Redis获取最后采集ID
-        base_url = f'https://guba.eastmoney.com/news,{stock_code},{last_id}.html'
+        self.last_error = None
+        cursor = self.seen.cursor(stock_code)
+        base_url = LIST_URL.format(stock_code=stock_code, page=1)
         
         # 代理设置（根据实际情况配置）
         # self.options.add_argument('--proxy-server=http://user:pass@ip:port')
         try:
-            self.driver.get(base_url)
-            WebDriverWait(self.driver, 15).until(
+            with self.pool.lease() as driver:
+                self._crawl_pages(driver, stock_code, base_url, max_pages, comments, cursor)
+        except Exception as e:
+            self.last_error = str(e)
+            instrumentation.event('guba.browser_failed', f"{stock_code} 采集过程中断，保留已采集的{len(comments)}条: {str(e)}",
+                                  logging.ERROR)
+            self._send_alert_email(str(e))
+        
+        return pd.DataFrame(comments)
+
+    def commit(self, stock_code, df):
+        """帖子持久化后记入去重集合并推进该股票的采集游标"""
+        self.collector.commit(stock_code, df)
+
+    def _crawl_pages(self, driver, stock_code, base_url, max_pages, comments, cursor=None):
+        """
+        在借出的浏览器中逐页采集评论
+
+        翻页后等待帖子列表实际刷新（旧节点失效或首条内容变化）再解析，
+        不再固定 sleep；每页的导航、渲染、解析和礼貌等待耗时写入日志。
+        """
+        from selenium.webdriver.common.by import By
+        from selenium.webdriver.support import expected_conditions as EC
+        from selenium.webdriver.support.ui import WebDriverWait
+
+        driver.implicitly_wait(0)
+        timer = PageTimer(f'{stock_code} ')
+        timer.start(1)
+        collected = set()
+        with timer.stage('navigation'):
+            driver.get(base_url)
+        with timer.stage('render'):
+            WebDriverWait(driver, 15).until(
                 EC.presence_of_element_located((By.CSS_SELECTOR, '.articleh'))
             )
 
-            for page in range(1, max_pages+1):
-                # 解析当前页数据
-                items = self.driver.find_elements(By.CSS_SELECTOR, '.articleh')
-                for item in items:
-                    try:
-                        comment = {
-                            '发布时间': item.find_element(By.CSS_SELECTOR, '.l5').text,
-                            '标题': item.find_element(By.CSS_SELECTOR, '.l3 a').text,
-                            '阅读量': item.find_element(By.CSS_SELECTOR, '.l1').text,
-                            '评论数': item.find_element(By.CSS_SELECTOR, '.l2').text,
-                            '作者': item.find_element(By.CSS_SELECTOR, '.l4').text
-                        }
-                        comments.append(comment)
-                    except Exception as e:
-                        logging.warning(f"解析异常: {str(e)}")
-
-                logging.info(f"第{page}页采集完成，获得{len(comments)}条数据")
-                
-                # 翻页操作（修复括号和缩进）
-                if page < max_pages:
-                    next_btn = WebDriverWait(self.driver, 10).until(
+        for page in range(1, max_pages+1):
+            # 一次取回整页源码用 lxml 解析，不再对每个字段单独发起 WebDriver 调用
+            with timer.stage('parse'):
+                posts = parse_post_list(driver.page_source)
+                new_posts, stop = self.collector.filter_page(stock_code, posts, cursor, collected)
+                comments.extend(dict(post, 股票代码=stock_code) for post in new_posts)
+
+            logging.debug(f"{stock_code} 第{page}页采集完成，新增{len(new_posts)}条，累计{len(comments)}条")
+            
+            # 翻页操作：点击后等待列表内容变化；已经遇到采集过的帖子时不再翻页
+            if page < max_pages and not stop:
+                self._human_like_behavior(driver)
+                with timer.stage('politeness'):
+                    self.politeness.wait()
+                with timer.stage('navigation'):
+                    next_btn = WebDriverWait(driver, 10).until(
                         EC.element_to_be_clickable((By.CSS_SELECTOR, '.pagenext'))
                     )
-                    self.driver.execute_script("arguments[0].click();", next_btn)
-                    time.sleep(random.uniform(3, 5))
-                    self._human_like_behavior()
-
-        except Exception as e:
-            logging.error(f"采集过程中断: {str(e)}")
-            self._send_alert_email(str(e))
-        finally:
-            self.driver.quit()
-            # 更新最后采集ID
-            if comments:
-                latest_id = comments[-1].get('帖子ID', last_id)
-                self.redis.set(self.last_id_key, latest_id)
-        
-        return pd.DataFrame(comments)
+                    before = page_signature(driver, '.articleh')
+                    driver.execute_script("arguments[0].click();", next_btn)
+                timer.finish()
+                timer.start(page + 1)
+                with timer.stage('render'):
+                    wait_for_change(driver, '.articleh', before)
+            else:
+                timer.finish()
+                break
+        logging.info(f"{stock_code} 各阶段累计耗时: {timer.summary()}")
 
     def _send_alert_email(self, error_msg):
-        """发送异常告警邮件"""
-        msg = MIMEText(f"爬虫异常告警：\n{error_msg}\n\n请及时处理！")
-        msg['Subject'] = '股吧爬虫异常告警'
-        msg['From'] = 'crawler@example.com'
-        msg['To'] = 'admin@example.com'
-        
-        try:
-            with smtplib.SMTP('smtp.example.com', 587) as server:
-                server.starttls()
-                server.login('user', 'pass')
-                server.send_message(msg)
-            logging.info("告警邮件已发送")
-        except Exception as e:
-            logging.error(f"邮件发送失败: {str(e)}")
+        """发送异常告警邮件：同类异常按首行去重并限频，见 instrumentation.AlertManager"""
+        key = 'guba_browser:' + (error_msg.splitlines() or [''])[0][:80]
+        instrumentation.alert(key, f"爬虫异常告警：\n{error_msg}\n\n请及时处理！", subject='股吧爬虫异常告警')
 
     def save_data(self, df):
-        """保存数据到CSV（按股票代码分目录存储）"""
-        if not df.empty:
-            stock_code = df.iloc[0].get('股票代码', 'unknown')
-            os.makedirs(f'data/{stock_code}', exist_ok=True)
-            timestamp = time.strftime("%Y%m%d_%H%M%S")
-            filename = f'data/{stock_code}/guba_{stock_code}_{timestamp}.csv'
-            df.to_csv(filename, index=False, encoding='utf_8_sig')
-            logging.info(f"数据已保存至 {filename}")
-            return True
-        return False
+        """
+        追加到按股票、日期分区的存储；缓冲区满或超时后写盘，调用 sink.flush() 可立即写入。
+        帖子写入文件后才记入去重集合、推进游标
+        """
+        if df.empty:
+            return False
+        for stock_code, part in df.groupby('股票代码', sort=False):
+            self.sink.append(stock_code, part, on_flushed=partial(self.commit, stock_code, part))
+        return True
 
-if __name__ == '__main__':
-    # 创建定时任务调度器
-    scheduler = BlockingScheduler()
-    scheduler.add_job(
-        func=lambda: BrowserCrawler().get_comments(max_pages=3),
+def main():
+    from apscheduler.schedulers.blocking import BlockingScheduler
+    from apscheduler.triggers.interval import IntervalTrigger
+    from guba_scheduler import GubaScheduler, load_watchlist
+    from guba_sink import GubaSink
+
+    # 日志配置
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=[logging.FileHandler('guba_browser.log'), logging.StreamHandler()]
+    )
+    instrumentation.configure()
+
+    # 关注列表：环境变量 GUBA_WATCHLIST 为逗号分隔的代码或代码文件，未设置时取最新行情快照中的全部股票；
+    # 按股票分片到多个常驻浏览器进程，每15分钟一个采集周期
+    # 新帖子在主进程中统一写入分区存储，每个周期结束后落盘（落盘后才记入去重集合），每天凌晨合并已结束月份
+    sink = GubaSink()
+    scheduler = GubaScheduler(
+        load_watchlist(os.environ.get('GUBA_WATCHLIST')),
+        workers=int(os.environ.get('GUBA_WORKERS', 2)),
+        mode='browser',
+        on_posts=sink.append,
+    )
+    job_scheduler = BlockingScheduler()
+    job_scheduler.add_job(
+        func=lambda: (scheduler.run_cycle(), sink.flush()),
         trigger=IntervalTrigger(minutes=15),
         max_instances=1
     )
+    job_scheduler.add_job(func=sink.compact, trigger='cron', hour=2)
 
     try:
         logging.info("爬虫定时任务已启动，每15分钟执行一次")
-        scheduler.start()
+        job_scheduler.start()
     except (KeyboardInterrupt, SystemExit):
-        logging.info("爬虫定时任务已正常停止")
\ No newline at end of file
+        logging.info("爬虫定时任务已正常停止")
+    finally:
+        scheduler.stop()
+        sink.flush()
+
+if __name__ == '__main__':
+    main()
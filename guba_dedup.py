@@ -0,0 +1,266 @@
+import os
+import time
+import hashlib
+import logging
+import sqlite3
+import threading
+
+try:
+    import redis
+except ImportError:  # redis 为可选依赖，未安装或连接失败时使用本地 SQLite
+    redis = None
+
+# 每只股票保留的已见帖子数，超出后淘汰最早记录的
+MAX_SEEN_PER_STOCK = 20000
+# 一页中已见帖子占比达到该值即停止翻页（置顶帖每次都会出现，不能见到一条就停）
+STOP_RATIO = 0.5
+
+
+def _text(value):
+    # 经过 DataFrame 往返后缺失字段为 NaN，与原始字典中的空字符串视为相同
+    return '' if value is None or (isinstance(value, float) and value != value) else str(value).strip()
+
+
+def post_key(post):
+    """帖子去重键：有帖子ID时直接使用，否则为标题、作者、发布时间的内容哈希"""
+    post_id = _text(post.get('帖子ID'))
+    # 'None'、'nan' 是早期把空值转成字符串留下的，按没有帖子ID处理
+    if post_id and post_id not in ('None', 'nan'):
+        return post_id
+    content = '\x1f'.join(_text(post.get(field)) for field in ('标题', '作者', '发布时间'))
+    return 'h:' + hashlib.sha1(content.encode('utf-8')).hexdigest()
+
+
+def _post_id_number(post):
+    post_id = _text(post.get('帖子ID'))
+    return int(post_id) if post_id.isdigit() else None
+
+
+class RedisSeenStore:
+    """
+    基于 Redis 的按股票去重集合和采集游标
+
+    已见帖子存于有序集合 {prefix}:seen:{code}（分值为记录时间，便于淘汰旧记录），
+    每只股票的最新帖子ID存于哈希 {prefix}:cursor。
+    """
+
+    def __init__(self, client, prefix='guba', max_seen=MAX_SEEN_PER_STOCK):
+        self.client = client
+        self.prefix = prefix
+        self.max_seen = max_seen
+
+    def _seen_key(self, stock_code):
+        return f'{self.prefix}:seen:{stock_code}'
+
+    def cursor(self, stock_code):
+        value = self.client.hget(f'{self.prefix}:cursor', stock_code)
+        return int(value) if value else None
+
+    def set_cursor(self, stock_code, post_id):
+        self.client.hset(f'{self.prefix}:cursor', stock_code, int(post_id))
+
+    def new_keys(self, stock_code, keys):
+        """返回 keys 中此前未记录过的键（只读，不记录）"""
+        if not keys:
+            return []
+        key = self._seen_key(stock_code)
+        pipe = self.client.pipeline()
+        for k in keys:
+            pipe.zscore(key, k)
+        return [k for k, score in zip(keys, pipe.execute()) if score is None]
+
+    def add_new(self, stock_code, keys):
+        """记录 keys 并返回其中此前未见过的键"""
+        if not keys:
+            return []
+        key = self._seen_key(stock_code)
+        now = time.time()
+        pipe = self.client.pipeline()
+        for k in keys:
+            pipe.zadd(key, {k: now}, nx=True)
+        added = pipe.execute()
+        pipe = self.client.pipeline()
+        pipe.zremrangebyrank(key, 0, -self.max_seen - 1)
+        pipe.execute()
+        return [k for k, is_new in zip(keys, added) if is_new]
+
+
+class SQLiteSeenStore:
+    """本地 SQLite 实现的去重集合和采集游标，Redis 不可用时使用"""
+
+    def __init__(self, path='data/guba_seen.db', max_seen=MAX_SEEN_PER_STOCK):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.path = path
+        self.max_seen = max_seen
+        self.lock = threading.Lock()
+        # 多个采集进程可共用同一个库文件，写锁冲突时等待而不是立即报错
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute('CREATE TABLE IF NOT EXISTS seen ('
+                          'code TEXT, key TEXT, seen_at REAL, PRIMARY KEY (code, key)) WITHOUT ROWID')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS seen_by_time ON seen (code, seen_at)')
+        self.conn.execute('CREATE TABLE IF NOT EXISTS cursors (code TEXT PRIMARY KEY, post_id INTEGER)')
+        self.conn.commit()
+
+    def cursor(self, stock_code):
+        with self.lock:
+            row = self.conn.execute('SELECT post_id FROM cursors WHERE code = ?', (stock_code,)).fetchone()
+        return row[0] if row else None
+
+    def set_cursor(self, stock_code, post_id):
+        with self.lock, self.conn:
+            self.conn.execute('INSERT OR REPLACE INTO cursors VALUES (?, ?)', (stock_code, int(post_id)))
+
+    def new_keys(self, stock_code, keys):
+        """返回 keys 中此前未记录过的键（只读，不记录）"""
+        if not keys:
+            return []
+        known = set()
+        with self.lock:
+            # 分批查询，避免超过 SQLite 的参数个数上限
+            for i in range(0, len(keys), 500):
+                chunk = keys[i:i + 500]
+                rows = self.conn.execute(
+                    f"SELECT key FROM seen WHERE code = ? AND key IN ({','.join('?' * len(chunk))})",
+                    [stock_code] + list(chunk)).fetchall()
+                known.update(row[0] for row in rows)
+        return [k for k in keys if k not in known]
+
+    def add_new(self, stock_code, keys):
+        """记录 keys 并返回其中此前未见过的键"""
+        if not keys:
+            return []
+        now = time.time()
+        new = []
+        with self.lock, self.conn:
+            for k in keys:
+                cur = self.conn.execute('INSERT OR IGNORE INTO seen VALUES (?, ?, ?)', (stock_code, k, now))
+                if cur.rowcount:
+                    new.append(k)
+            if new:
+                self.conn.execute(
+                    'DELETE FROM seen WHERE code = ? AND seen_at < ('
+                    'SELECT seen_at FROM seen WHERE code = ? ORDER BY seen_at DESC LIMIT 1 OFFSET ?)',
+                    (stock_code, stock_code, self.max_seen - 1))
+        return new
+
+    def close(self):
+        self.conn.close()
+
+
+def open_seen_store(host='localhost', port=6379, db=0, sqlite_path='data/guba_seen.db'):
+    """优先连接 Redis，不可用时退回本地 SQLite"""
+    if redis is not None:
+        client = redis.Redis(host=host, port=port, db=db, decode_responses=True)
+        try:
+            client.ping()
+            return RedisSeenStore(client)
+        except redis.exceptions.RedisError as e:
+            logging.warning(f"Redis不可用，使用本地去重库 {sqlite_path}: {str(e)}")
+    return SQLiteSeenStore(sqlite_path)
+
+
+class IncrementalCollector:
+    """
+    按股票增量采集股吧帖子
+
+    逐页请求，每页帖子先按股票游标（已采集的最大帖子ID）和去重集合过滤；
+    一页中已见帖子的占比达到 stop_ratio，或整页帖子ID都不大于游标时停止翻页。
+    稳态下每只股票通常只请求第一页。
+
+    采集过程只读取去重集合和游标，不做记录：调用方把 collect 返回的帖子持久化之后，
+    再调用 commit 记入去重集合并推进游标。持久化前进程中断时，下次采集会重新取回这些帖子。
+
+    参数：
+    fetch_page - fetch_page(stock_code, page) -> 帖子字典列表
+    seen       - RedisSeenStore 或 SQLiteSeenStore
+    """
+
+    def __init__(self, fetch_page, seen, max_pages=5, stop_ratio=STOP_RATIO):
+        self.fetch_page = fetch_page
+        self.seen = seen
+        self.max_pages = max_pages
+        self.stop_ratio = stop_ratio
+
+        self.last_error = None
+
+    def filter_page(self, stock_code, posts, cursor=None, collected=None):
+        """
+        返回 (新帖子列表, 是否停止翻页)，不修改去重集合
+
+        参数：
+        collected - 本次采集已取得的帖子键集合，翻页时帖子下移造成的重复也会被过滤；
+                    新帖子的键会加入该集合
+        """
+        if not posts:
+            return [], True
+        collected = set() if collected is None else collected
+        keys = [post_key(post) for post in posts]
+        new_keys = set(self.seen.new_keys(stock_code, [k for k in keys if k not in collected]))
+        new_posts = []
+        for post, key in zip(posts, keys):
+            if key in new_keys and key not in collected:
+                collected.add(key)
+                new_posts.append(post)
+        ids = [_post_id_number(post) for post in posts]
+        below_cursor = cursor is not None and all(i is not None and i <= cursor for i in ids)
+        seen_ratio = 1 - len(new_posts) / len(posts)
+        return new_posts, below_cursor or seen_ratio >= self.stop_ratio
+
+    def advance_cursor(self, stock_code, posts, cursor=None):
+        """把股票游标推进到 posts 中最大的帖子ID"""
+        ids = [i for i in map(_post_id_number, posts) if i is not None]
+        if ids and (cursor is None or max(ids) > cursor):
+            self.seen.set_cursor(stock_code, max(ids))
+
+    def commit(self, stock_code, posts):
+        """帖子已持久化后调用：记入去重集合并推进游标；posts 为帖子字典列表或 DataFrame"""
+        import pandas as pd
+
+        if isinstance(posts, pd.DataFrame):
+            posts = posts.to_dict(orient='records')
+        if not posts:
+            return
+        self.seen.add_new(stock_code, [post_key(post) for post in posts])
+        self.advance_cursor(stock_code, posts, self.seen.cursor(stock_code))
+
+    def collect(self, stock_code):
+        """
+        采集一只股票的新帖子，返回 DataFrame（不记录去重集合和游标，见 commit）
+
+        某一页请求失败时停止翻页，返回此前各页已取得的帖子，错误信息记在 last_error
+        """
+        self.last_error = None
+        cursor = self.seen.cursor(stock_code)
+        collected = []
+        keys = set()
+        pages = 0
+        for page in range(1, self.max_pages + 1):
+            try:
+                posts = self.fetch_page(stock_code, page)
+            except Exception as e:
+                self.last_error = f"第{page}页请求失败: {str(e)}"
+                logging.error(f"{stock_code} {self.last_error}，保留已采集的{len(collected)}条")
+                break
+            pages += 1
+            new_posts, stop = self.filter_page(stock_code, posts, cursor, keys)
+            collected.extend(new_posts)
+            if stop:
+                break
+
+        import pandas as pd
+
+        logging.info(f"{stock_code}: 请求{pages}页，新增{len(collected)}条")
+        return pd.DataFrame(collected)
+
+    def collect_many(self, stock_codes):
+        """
+        依次采集多只股票，返回 {股票代码: DataFrame}
+
+        单只股票中途失败时保留已取得的帖子；调用方持久化后对每只股票调用 commit
+        """
+        results = {}
+        for stock_code in stock_codes:
+            results[stock_code] = self.collect(stock_code)
+        return results
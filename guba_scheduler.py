@@ -0,0 +1,394 @@
+import os
+import glob
+import time
+import zlib
+import queue
+import logging
+import argparse
+import multiprocessing
+from functools import partial
+from urllib.parse import urlparse
+
+import pandas as pd
+
+from eastmoney_api_crawler import API_URL, LIST_URL
+from instrumentation import configure, event
+
+# 默认每个主机的全局请求速率（次/秒，所有工作进程合计）
+HOST_RATE = 5.0
+# 活跃度按周期指数平滑的系数
+ACTIVITY_ALPHA = 0.5
+
+
+class SharedTokenBucket:
+    """
+    跨进程共享的令牌桶
+
+    令牌数和更新时间存放在共享内存中，由进程锁保护，
+    以参数形式传给子进程后所有进程共用同一个速率上限。
+    """
+
+    def __init__(self, rate, capacity=None, ctx=multiprocessing):
+        self.rate = float(rate)
+        self.capacity = float(capacity or max(rate, 1))
+        self._state = ctx.RawArray('d', [self.capacity, time.monotonic()])
+        self._lock = ctx.Lock()
+
+    def acquire(self):
+        """获取一个令牌，令牌不足时阻塞等待"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                tokens = min(self.capacity, self._state[0] + (now - self._state[1]) * self.rate)
+                self._state[1] = now
+                if tokens >= 1:
+                    self._state[0] = tokens - 1
+                    return
+                self._state[0] = tokens
+                wait = (1 - tokens) / self.rate
+            time.sleep(wait)
+
+
+class SharedHostLimiter:
+    """
+    按主机名的跨进程限速器，接口与 HostRateLimiter 相同（acquire(url)）
+
+    共享内存无法在子进程中动态新增，因此主机列表在创建时确定；
+    未列出的主机共用一个默认令牌桶。
+    """
+
+    def __init__(self, hosts, rate=HOST_RATE, capacity=None, ctx=multiprocessing):
+        self.buckets = {host: SharedTokenBucket(rate, capacity, ctx) for host in hosts}
+        self.default = SharedTokenBucket(rate, capacity, ctx)
+
+    def acquire(self, url):
+        self.buckets.get(urlparse(url).netloc, self.default).acquire()
+
+
+def shard_of(stock_code, shards):
+    """股票所属分片：按代码哈希固定分配，同一股票始终由同一进程采集"""
+    return zlib.crc32(str(stock_code).encode('utf-8')) % shards
+
+
+def load_turnover(path=None):
+    """
+    读取 s1 行情快照中的成交额，返回 {代码: 成交额}
+
+    path 为 None 时使用当前目录下最新的 stock_data_*.csv；没有快照时返回空字典
+    """
+    if path is None:
+        snapshots = glob.glob('stock_data_*.csv')
+        if not snapshots:
+            return {}
+        path = max(snapshots, key=os.path.getmtime)
+    df = pd.read_csv(path, dtype={'代码': str}, encoding='utf-8-sig')
+    turnover = pd.to_numeric(df['成交额'], errors='coerce').fillna(0)
+    return dict(zip(df['代码'], turnover))
+
+
+def _worker(shard, tasks, results, limiter, mode, max_pages, sqlite_path, crawler_options):
+    """
+    工作进程：持有独立的 HTTP 会话（或浏览器），逐个采集分配到本分片的股票
+
+    只读取去重集合和游标；采集中途失败时把已取得的帖子连同错误一起返回，
+    由主进程在 on_posts 持久化之后记入去重集合
+    """
+    from guba_dedup import IncrementalCollector, open_seen_store
+
+    # 每个工作进程各自汇总本进程的抓取、解析耗时
+    configure()
+    seen = open_seen_store(sqlite_path=sqlite_path)
+    if mode == 'browser':
+        from eastmoney_guba_crawler import BrowserCrawler
+
+        crawler = BrowserCrawler(seen=seen, **crawler_options)
+
+        def collect(stock_code):
+            # 浏览器模式按股票限速，同一股票内的翻页间隔由 politeness 控制
+            limiter.acquire(LIST_URL.format(stock_code=stock_code, page=1))
+            return crawler.get_comments(stock_code, max_pages=max_pages)
+        source = crawler
+    else:
+        from eastmoney_api_crawler import EastmoneyGubaCrawler
+
+        crawler = EastmoneyGubaCrawler(limiter=limiter, **crawler_options)
+        source = IncrementalCollector(crawler.fetch_page, seen, max_pages=max_pages)
+        collect = source.collect
+
+    try:
+        while True:
+            task = tasks.get()
+            if task is None:
+                break
+            stock_code, enqueued_at = task
+            started = time.time()
+            result = {'code': stock_code, 'shard': shard, 'enqueued_at': enqueued_at,
+                      'started': started, 'records': [], 'error': None}
+            try:
+                df = collect(stock_code)
+                result['records'] = df.to_dict(orient='records')
+                result['error'] = source.last_error
+            except Exception as e:
+                result['error'] = str(e)
+            result['finished'] = time.time()
+            results.put(result)
+    finally:
+        if mode == 'browser':
+            crawler.pool.close()
+
+
+class GubaScheduler:
+    """
+    多股票股吧采集调度器
+
+    关注列表按代码哈希分片到 workers 个常驻工作进程，每个进程使用自己的会话；
+    所有进程共享按主机的全局限速。每个周期按活跃度排序入队：上一周期的新增帖子数
+    （指数平滑）优先，其次是 s1 快照中的成交额。上一周期未完成的股票不重复入队；
+    工作进程退出时在下一次检查（每个周期开始、等待结果空闲时）重启，其未完成的股票重新入队。
+    运行中定期报告队列深度、最久排队时间，周期结束时报告各股票距上次成功采集的滞后。
+    工作进程不记录去重集合和游标；主进程在帖子持久化后（on_posts 调用 on_persisted 时）才记入，
+    未持久化或 on_posts 抛出异常时不记入，这些帖子下个周期会被重新采集。
+
+    参数：
+    watchlist  - 关注的股票代码列表
+    on_posts   - on_posts(stock_code, DataFrame, on_persisted)，在主进程中持久化每只股票的新帖子
+                 （含采集失败前已取得的部分），写入完成后调用 on_persisted()，如 GubaSink.append；
+                 为 None 时直接记入去重集合
+    mode       - 'http'（默认）或 'browser'
+    crawler_options - 传给工作进程中采集器构造函数的额外参数
+    """
+
+    def __init__(self, watchlist, workers=4, rate=HOST_RATE, burst=None, cycle_seconds=900,
+                 max_pages=5, turnover=None, on_posts=None, mode='http',
+                 sqlite_path='data/guba_seen.db', report_interval=30, crawler_options=None):
+        self.watchlist = list(dict.fromkeys(str(code) for code in watchlist))
+        self.workers = workers
+        self.cycle_seconds = cycle_seconds
+        self.max_pages = max_pages
+        self.turnover = turnover if turnover is not None else load_turnover()
+        self.on_posts = on_posts
+        self.mode = mode
+        self.sqlite_path = sqlite_path
+        self._seen = None
+        self.report_interval = report_interval
+        self.crawler_options = crawler_options or {}
+
+        self._ctx = multiprocessing.get_context('spawn')
+        hosts = {urlparse(url).netloc for url in (API_URL, LIST_URL)}
+        self.limiter = SharedHostLimiter(hosts, rate, burst, ctx=self._ctx)
+        self._tasks = []
+        self._results = None
+        self._processes = []
+
+        self.activity = {}       # 股票 -> 平滑后的每周期新增帖子数
+        self.last_success = {}   # 股票 -> 最近一次采集成功的时间
+        self.pending = {}        # 股票 -> 入队时间
+        self.shard_depth = [0] * workers
+
+    def _spawn(self, shard):
+        tasks = self._ctx.Queue()
+        process = self._ctx.Process(
+            target=_worker, name=f'guba-worker-{shard}', daemon=True,
+            args=(shard, tasks, self._results, self.limiter, self.mode, self.max_pages,
+                  self.sqlite_path, self.crawler_options))
+        process.start()
+        return tasks, process
+
+    def start(self):
+        """启动工作进程；已启动时重启其中已退出的进程"""
+        if self._processes:
+            self._revive()
+            return self
+        self._results = self._ctx.Queue()
+        for shard in range(self.workers):
+            tasks, process = self._spawn(shard)
+            self._tasks.append(tasks)
+            self._processes.append(process)
+        return self
+
+    def _revive(self):
+        """
+        重启已退出（崩溃或被杀）的工作进程，返回重启的个数
+
+        该分片队列中尚未完成的股票移出 pending，之后由 _enqueue 重新入队到新进程
+        """
+        revived = 0
+        for shard, process in enumerate(self._processes):
+            if process.is_alive():
+                continue
+            lost = [code for code in self.pending if shard_of(code, self.workers) == shard]
+            event('guba.worker_died', f"{process.name} 已退出（exitcode={process.exitcode}），"
+                                      f"重新启动并重新入队{len(lost)}只股票", logging.ERROR)
+            for code in lost:
+                del self.pending[code]
+            self.shard_depth[shard] = 0
+            # 旧队列中的任务随进程一起丢弃，不等待其后台线程写完
+            self._tasks[shard].cancel_join_thread()
+            self._tasks[shard].close()
+            self._tasks[shard], self._processes[shard] = self._spawn(shard)
+            revived += 1
+        return revived
+
+    def stop(self, timeout=30):
+        """通知工作进程退出并等待结束"""
+        for tasks in self._tasks:
+            tasks.put(None)
+        for process in self._processes:
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+        self._tasks, self._processes = [], []
+        self.pending.clear()
+        self.shard_depth = [0] * self.workers
+
+    def priority(self, stock_code):
+        """排序键：活跃度高、成交额大的股票先采集"""
+        return (-self.activity.get(stock_code, 0.0), -self.turnover.get(stock_code, 0.0))
+
+    def _enqueue(self):
+        now = time.time()
+        queued = 0
+        for stock_code in sorted(self.watchlist, key=self.priority):
+            if stock_code in self.pending:
+                continue
+            shard = shard_of(stock_code, self.workers)
+            self._tasks[shard].put((stock_code, now))
+            self.pending[stock_code] = now
+            self.shard_depth[shard] += 1
+            queued += 1
+        return queued
+
+    def commit(self, stock_code, df):
+        """帖子持久化后记入去重集合并推进游标（主进程使用自己的连接）"""
+        from guba_dedup import IncrementalCollector, open_seen_store
+
+        if self._seen is None:
+            self._seen = open_seen_store(sqlite_path=self.sqlite_path)
+        IncrementalCollector(None, self._seen).commit(stock_code, df)
+
+    def _handle(self, result):
+        stock_code = result['code']
+        # 已退出进程的迟到结果对应的股票可能已被移出 pending，不再重复扣减队列深度
+        if self.pending.pop(stock_code, None) is not None:
+            self.shard_depth[result['shard']] -= 1
+        new = len(result['records'])
+        if result['error'] is not None:
+            event('guba.fetch_failed', f"{stock_code} 采集失败（已取得{new}条）: {result['error']}", logging.ERROR)
+        else:
+            self.last_success[stock_code] = result['finished']
+            self.activity[stock_code] = ACTIVITY_ALPHA * new + (1 - ACTIVITY_ALPHA) * self.activity.get(stock_code, 0.0)
+        if not new:
+            return 0
+        df = pd.DataFrame(result['records'])
+        on_persisted = partial(self.commit, stock_code, df)
+        try:
+            if self.on_posts is None:
+                on_persisted()
+            else:
+                self.on_posts(stock_code, df, on_persisted)
+        except Exception as e:
+            event('guba.persist_failed', f"{stock_code} 新帖子保存失败，下个周期重新采集: {str(e)}", logging.ERROR)
+            return 0
+        return new
+
+    def report(self):
+        """当前队列深度与滞后情况"""
+        now = time.time()
+        oldest = min(self.pending.values(), default=now)
+        lags = [now - self.last_success.get(code, 0.0) for code in self.watchlist]
+        return {
+            'queue_depth': len(self.pending),
+            'shard_depth': list(self.shard_depth),
+            'oldest_wait': now - oldest,
+            'max_lag': max(lags, default=0.0),
+            'stale': sum(lag > self.cycle_seconds for lag in lags),
+        }
+
+    def run_cycle(self):
+        """执行一个采集周期：入队全部股票，等待完成或到达周期时长，返回周期统计"""
+        self.start()
+        started = time.time()
+        deadline = started + self.cycle_seconds
+        queued = self._enqueue()
+        done = failed = new_posts = 0
+        next_report = started + self.report_interval
+        while self.pending and time.time() < deadline:
+            try:
+                result = self._results.get(timeout=min(1.0, max(deadline - time.time(), 0.01)))
+            except queue.Empty:
+                result = None
+                # 周期内有工作进程退出时立即重启，并把它未完成的股票重新入队
+                if self._revive():
+                    queued += self._enqueue()
+            if result is not None:
+                done += 1
+                failed += result['error'] is not None
+                new_posts += self._handle(result)
+            if time.time() >= next_report:
+                status = self.report()
+                logging.info(f"队列深度 {status['queue_depth']}（各分片 {status['shard_depth']}），"
+                             f"最久排队 {status['oldest_wait']:.0f}s，已完成 {done}/{queued}")
+                next_report += self.report_interval
+
+        elapsed = time.time() - started
+        status = self.report()
+        if self.pending:
+            logging.warning(f"周期内未完成 {len(self.pending)} 只股票，顺延到下一周期")
+        logging.info(f"周期完成：{len(self.watchlist)}只股票，采集{done}只（失败{failed}），新增{new_posts}条，"
+                     f"耗时{elapsed:.1f}s，最大滞后{status['max_lag']:.0f}s，超期{status['stale']}只")
+        return dict(status, queued=queued, done=done, failed=failed, new_posts=new_posts, elapsed=elapsed)
+
+    def run_forever(self):
+        """按周期持续运行；周期超时时立即开始下一周期"""
+        try:
+            while True:
+                started = time.time()
+                self.run_cycle()
+                time.sleep(max(0.0, self.cycle_seconds - (time.time() - started)))
+        finally:
+            self.stop()
+
+
+def load_watchlist(value=None):
+    """关注列表：逗号分隔的代码、每行一个代码的文件，或为空时取最新快照中的全部代码"""
+    if value and os.path.exists(value):
+        with open(value, encoding='utf-8') as f:
+            return [line.strip() for line in f if line.strip()]
+    if value:
+        return [code.strip() for code in value.split(',') if code.strip()]
+    return list(load_turnover())
+
+
+def main(argv=None):
+    from guba_sink import GubaSink
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(processName)s - %(levelname)s - %(message)s',
+        handlers=[logging.FileHandler('guba_scheduler.log'), logging.StreamHandler()]
+    )
+    configure()
+    parser = argparse.ArgumentParser(description='股吧多股票并行采集调度')
+    parser.add_argument('--watchlist', help='逗号分隔的股票代码或代码列表文件，默认取最新行情快照中的全部股票')
+    parser.add_argument('--workers', type=int, default=4, help='工作进程数')
+    parser.add_argument('--rate', type=float, default=HOST_RATE, help='每个主机的全局请求速率（次/秒）')
+    parser.add_argument('--cycle', type=int, default=900, help='周期时长（秒）')
+    parser.add_argument('--max-pages', type=int, default=5, help='每只股票每周期最多请求页数')
+    parser.add_argument('--mode', choices=['http', 'browser'], default='http')
+    parser.add_argument('--output', default='data/guba', help='帖子分区存储目录')
+    args = parser.parse_args(argv)
+
+    sink = GubaSink(args.output)
+    scheduler = GubaScheduler(load_watchlist(args.watchlist), workers=args.workers, rate=args.rate,
+                              cycle_seconds=args.cycle, max_pages=args.max_pages, mode=args.mode,
+                              on_posts=sink.append)
+    try:
+        scheduler.run_forever()
+    except KeyboardInterrupt:
+        logging.info("调度已停止")
+    finally:
+        sink.flush()
+
+
+if __name__ == '__main__':
+    main()
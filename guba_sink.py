@@ -0,0 +1,246 @@
+import os
+import re
+import glob
+import logging
+import threading
+from datetime import datetime
+
+import pandas as pd
+
+from instrumentation import incr, timed
+
+try:
+    import pyarrow  # noqa: F401
+    COMPACT_EXT = '.parquet'
+except ImportError:  # pyarrow 为可选依赖，未安装时压缩文件使用 gzip 压缩的 CSV
+    COMPACT_EXT = '.csv.gz'
+
+# 存储列及顺序
+COLUMNS = ['股票代码', '帖子ID', '发布时间', '标题', '作者', '阅读量', '评论数', '采集时间']
+COUNT_COLUMNS = ['阅读量', '评论数']
+# 帖子ID为空时的去重字段，与 guba_dedup.post_key 一致
+KEY_COLUMNS = ['标题', '发布时间', '作者']
+
+# 当日分区文件 {code}/{YYYY-MM-DD}.csv，月度压缩文件 {code}/{YYYY-MM}.parquet 或 .csv.gz
+DAY_FILE = re.compile(r'^(\d{4}-\d{2})-\d{2}\.csv$')
+MONTH_FILE = re.compile(r'^(\d{4}-\d{2})\.(parquet|csv\.gz)$')
+
+
+def parse_counts(values):
+    """阅读量/评论数转为整数，支持 '1.2万' 写法，无法解析时为缺失值"""
+    text = pd.Series(values, dtype=object).astype(str).str.strip()
+    scale = text.str.endswith('万').map({True: 10000, False: 1})
+    number = pd.to_numeric(text.str.rstrip('万'), errors='coerce')
+    return (number * scale).round().astype('Int64')
+
+
+def normalize_publish_time(values, now):
+    """
+    统一发布时间为 YYYY-MM-DD HH:MM:SS
+
+    列表页只显示 'MM-DD HH:MM'，按采集时间补全年份，晚于采集时间的视为上一年
+    """
+    text = pd.Series(values, dtype=object).astype(str).str.strip()
+    short = text.str.match(r'^\d{2}-\d{2}\s')
+    full = pd.to_datetime(text.where(~short), errors='coerce', format='mixed')
+    guessed = pd.to_datetime(str(now.year) + '-' + text.where(short), errors='coerce', format='%Y-%m-%d %H:%M')
+    future = guessed > pd.Timestamp(now) + pd.Timedelta(days=1)
+    guessed[future] = guessed[future] - pd.DateOffset(years=1)
+    return full.fillna(guessed)
+
+
+def _text_column(frame, col):
+    return frame[col].fillna('').astype(str).str.strip() if col in frame else pd.Series('', index=frame.index)
+
+
+def drop_duplicate_posts(frame):
+    """
+    按帖子去重，同一帖子保留最后一条（阅读量、评论数最新）
+
+    帖子ID为空（包括早期写入的 'None'、'nan'）时以 标题+发布时间+作者 作为去重键，
+    避免这些帖子被当作同一条合并掉
+    """
+    ids = _text_column(frame, '帖子ID')
+    composite = 'h:' + _text_column(frame, KEY_COLUMNS[0])
+    for col in KEY_COLUMNS[1:]:
+        composite = composite + '\x1f' + _text_column(frame, col)
+    keys = ids.where(~ids.isin(['', 'None', 'nan']), composite)
+    return frame[~keys.duplicated(keep='last')]
+
+
+class GubaSink:
+    """
+    股吧帖子的分区追加存储
+
+    新帖子先在内存中缓冲，达到 buffer_rows 行或距上次写入超过 flush_interval 秒时，
+    按 (股票, 发布日期) 追加到 {root}/{code}/{YYYY-MM-DD}.csv。compact 把已结束月份的
+    日文件合并去重为一个压缩的月度文件（安装 pyarrow 时为 parquet，否则为 csv.gz）。
+    query 只读取与股票和时间范围相交的分区。
+
+    append 可附带 on_flushed 回调，在这批帖子实际写入文件后才调用（用于记入去重集合、推进游标），
+    缓冲期间进程中断时这些帖子不会被视为已采集。写入失败时缓冲区保留，下次 flush 重试。
+    """
+
+    def __init__(self, root='data/guba', buffer_rows=5000, flush_interval=60):
+        self.root = root
+        self.buffer_rows = buffer_rows
+        self.flush_interval = flush_interval
+        self._buffer = []
+        self._rows = 0
+        self._last_flush = datetime.now()
+        self._lock = threading.Lock()
+
+    def _normalize(self, stock_code, df, now):
+        frame = pd.DataFrame(index=df.index)
+        for col in COLUMNS:
+            frame[col] = df[col] if col in df else ''
+        frame['股票代码'] = str(stock_code)
+        frame['帖子ID'] = frame['帖子ID'].fillna('').astype(str)
+        published = normalize_publish_time(frame['发布时间'], now)
+        # 发布时间无法解析的帖子按采集日期分区
+        frame['发布时间'] = published.fillna(pd.Timestamp(now)).dt.strftime('%Y-%m-%d %H:%M:%S')
+        for col in COUNT_COLUMNS:
+            frame[col] = parse_counts(frame[col])
+        frame['采集时间'] = now.strftime('%Y-%m-%d %H:%M:%S')
+        return frame
+
+    def append(self, stock_code, df, on_flushed=None):
+        """
+        缓冲一只股票的新帖子，满足条件时写入磁盘
+
+        参数：
+        on_flushed - 无参回调，这批帖子写入文件后调用
+        """
+        if df is None or df.empty:
+            if on_flushed is not None:
+                on_flushed()
+            return
+        now = datetime.now()
+        frame = self._normalize(stock_code, df, now)
+        with self._lock:
+            self._buffer.append((frame, on_flushed))
+            self._rows += len(frame)
+            due = (self._rows >= self.buffer_rows
+                   or (now - self._last_flush).total_seconds() >= self.flush_interval)
+        if due:
+            self.flush()
+
+    @timed('save.guba')
+    def flush(self):
+        """把缓冲区按 (股票, 日期) 分组追加到日分区文件，写入后调用各批次的 on_flushed，返回写入行数"""
+        with self._lock:
+            buffer, self._buffer, self._rows = self._buffer, [], 0
+            self._last_flush = datetime.now()
+            if not buffer:
+                return 0
+            frame = pd.concat([part for part, _ in buffer], ignore_index=True)
+            dates = frame['发布时间'].str[:10]
+            try:
+                for (stock_code, date), part in frame.groupby([frame['股票代码'], dates], sort=False):
+                    directory = os.path.join(self.root, stock_code)
+                    os.makedirs(directory, exist_ok=True)
+                    path = os.path.join(directory, f'{date}.csv')
+                    part.to_csv(path, mode='a', header=not os.path.exists(path), index=False, encoding='utf-8')
+            except Exception:
+                # 放回缓冲区，下次重试；已写入的部分会重复，读取和合并时按帖子去重
+                self._buffer = buffer + self._buffer
+                self._rows += len(frame)
+                raise
+        incr('save.guba.rows', len(frame))
+        logging.debug(f"写入 {len(frame)} 条帖子")
+        for _, on_flushed in buffer:
+            if on_flushed is None:
+                continue
+            try:
+                on_flushed()
+            except Exception as e:
+                logging.error(f"帖子已写入，但写入后回调失败（下次采集可能重复取回）: {str(e)}")
+        return len(frame)
+
+    def _read(self, path, columns=None):
+        if path.endswith('.parquet'):
+            return pd.read_parquet(path, columns=columns)
+        df = pd.read_csv(path, usecols=columns, dtype={'股票代码': str, '帖子ID': str}, encoding='utf-8')
+        for col in COUNT_COLUMNS:
+            if col in df:
+                df[col] = df[col].astype('Int64')
+        return df
+
+    def _write_month(self, frame, path):
+        tmp_path = path + '.tmp'
+        if path.endswith('.parquet'):
+            frame.to_parquet(tmp_path, index=False, compression='zstd')
+        else:
+            frame.to_csv(tmp_path, index=False, encoding='utf-8', compression='gzip')
+        os.replace(tmp_path, path)
+
+    def compact(self, before=None):
+        """
+        合并已结束月份的日分区文件
+
+        参数：
+        before - 只合并早于该月份（'YYYY-MM'）的数据，默认为当前月份
+
+        返回：合并的月度文件数
+        """
+        self.flush()
+        before = before or datetime.now().strftime('%Y-%m')
+        compacted = 0
+        for directory in sorted(glob.glob(os.path.join(self.root, '*'))):
+            months = {}
+            for name in os.listdir(directory):
+                match = DAY_FILE.match(name)
+                if match and match.group(1) < before:
+                    months.setdefault(match.group(1), []).append(os.path.join(directory, name))
+            for month, day_files in sorted(months.items()):
+                path = os.path.join(directory, month + COMPACT_EXT)
+                existing = [p for p in glob.glob(os.path.join(directory, month + '.*')) if MONTH_FILE.match(os.path.basename(p))]
+                frame = pd.concat([self._read(p) for p in existing + sorted(day_files)], ignore_index=True)
+                # 同一帖子保留最后一次采集的记录（阅读量、评论数最新）
+                frame = (drop_duplicate_posts(frame)
+                         .sort_values('发布时间', kind='stable').reset_index(drop=True))
+                self._write_month(frame, path)
+                for p in existing + day_files:
+                    if p != path:
+                        os.remove(p)
+                compacted += 1
+        logging.info(f"合并 {compacted} 个月度分区")
+        return compacted
+
+    def partitions(self, stock_code, start=None, end=None):
+        """与时间范围（'YYYY-MM-DD'，含两端）相交的分区文件"""
+        directory = os.path.join(self.root, str(stock_code))
+        if not os.path.isdir(directory):
+            return []
+        start_day, end_day = (start or '0000-00-00')[:10], (end or '9999-99-99')[:10]
+        paths = []
+        for name in sorted(os.listdir(directory)):
+            day, month = DAY_FILE.match(name), MONTH_FILE.match(name)
+            if day and start_day <= name[:10] <= end_day:
+                paths.append(os.path.join(directory, name))
+            elif month and start_day[:7] <= month.group(1) <= end_day[:7]:
+                paths.append(os.path.join(directory, name))
+        return paths
+
+    def query(self, stock_code, start=None, end=None, columns=None):
+        """
+        读取一只股票在时间范围内的帖子
+
+        参数：
+        start/end - 'YYYY-MM-DD' 或 'YYYY-MM-DD HH:MM:SS'，含两端
+        columns   - 需要的列，默认全部
+
+        返回：按发布时间排序、按帖子去重的 DataFrame（见 drop_duplicate_posts）
+        """
+        self.flush()
+        read_columns = None if columns is None else list(dict.fromkeys(list(columns) + ['帖子ID'] + KEY_COLUMNS))
+        frames = [self._read(p, read_columns) for p in self.partitions(stock_code, start, end)]
+        if not frames:
+            return pd.DataFrame(columns=columns or COLUMNS)
+        frame = drop_duplicate_posts(pd.concat(frames, ignore_index=True))
+        if start:
+            frame = frame[frame['发布时间'] >= start]
+        if end:
+            frame = frame[frame['发布时间'] <= (end if len(end) > 10 else end + ' 23:59:59')]
+        frame = frame.sort_values('发布时间', kind='stable').reset_index(drop=True)
+        return frame[columns] if columns is not None else frame
@@ -0,0 +1,286 @@
+import os
+import json
+import time
+import random
+import hashlib
+import logging
+import threading
+from urllib.parse import urlencode, urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+import instrumentation
+
+try:
+    import brotli  # noqa: F401  urllib3 安装 brotli 后可解码 br 响应
+    ACCEPT_ENCODING = 'br, gzip, deflate'
+except ImportError:  # brotli 为可选依赖，未安装时只协商 gzip/deflate
+    ACCEPT_ENCODING = 'gzip, deflate'
+
+DEFAULT_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+    'Accept-Encoding': ACCEPT_ENCODING,
+    'Connection': 'keep-alive',
+}
+# 需要重试的状态码：限流和服务端错误
+RETRY_STATUS = {429, 500, 502, 503, 504}
+# 每个接口保留的最近耗时样本数，用于计算分位数
+LATENCY_SAMPLES = 1000
+
+
+class EmptyResponse(ValueError):
+    """接口返回 200 但响应体为空（被限流或参数失效时常见）"""
+
+
+class EndpointStats:
+    """单个接口的请求计数、字节数、错误数和耗时样本"""
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.retries = 0
+        self.cache_hits = 0
+        self.bytes = 0
+        self.latency = 0.0
+        self.samples = []
+
+    def observe(self, seconds, size):
+        self.requests += 1
+        self.bytes += size
+        self.latency += seconds
+        self.samples.append(seconds)
+        if len(self.samples) > LATENCY_SAMPLES:
+            del self.samples[:len(self.samples) - LATENCY_SAMPLES]
+
+    def summary(self):
+        ordered = sorted(self.samples)
+
+        def quantile(q):
+            return ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000 if ordered else 0.0
+
+        return {
+            'requests': self.requests,
+            'errors': self.errors,
+            'error_rate': self.errors / self.requests if self.requests else 0.0,
+            'retries': self.retries,
+            'cache_hits': self.cache_hits,
+            'bytes': self.bytes,
+            'avg_ms': self.latency / self.requests * 1000 if self.requests else 0.0,
+            'p50_ms': quantile(0.5),
+            'p95_ms': quantile(0.95),
+        }
+
+
+class ResponseCache:
+    """
+    磁盘响应缓存：{root}/{key[:2]}/{key}.json 保存状态码和响应头，.bin 保存响应体
+
+    key 为请求方法、URL 和排序后参数的哈希（忽略防缓存的时间戳参数 '_'）；超过 ttl 秒的缓存
+    视为失效（ttl 为 None 时永不过期），用于离线回放和测试。
+    """
+
+    def __init__(self, root, ttl=None):
+        self.root = root
+        self.ttl = ttl
+
+    @staticmethod
+    def key(method, url, params=None):
+        query = urlencode(sorted((k, v) for k, v in (params or {}).items() if k != '_'), doseq=True)
+        return hashlib.sha1(f'{method} {url}?{query}'.encode('utf-8')).hexdigest()
+
+    def _paths(self, key):
+        directory = os.path.join(self.root, key[:2])
+        return os.path.join(directory, key + '.json'), os.path.join(directory, key + '.bin')
+
+    def get(self, key):
+        meta_path, body_path = self._paths(key)
+        try:
+            if self.ttl is not None and time.time() - os.path.getmtime(meta_path) > self.ttl:
+                return None
+            with open(meta_path, encoding='utf-8') as f:
+                meta = json.load(f)
+            with open(body_path, 'rb') as f:
+                content = f.read()
+        except OSError:
+            return None
+        response = requests.Response()
+        response.status_code = meta['status']
+        response.headers = CaseInsensitiveDict(meta['headers'])
+        response.url = meta['url']
+        response.encoding = meta.get('encoding')
+        response._content = content
+        response.from_cache = True
+        return response
+
+    def put(self, key, response):
+        meta_path, body_path = self._paths(key)
+        os.makedirs(os.path.dirname(meta_path), exist_ok=True)
+        # 响应体已解压，去掉与压缩相关的头
+        headers = {k: v for k, v in response.headers.items()
+                   if k.lower() not in ('content-encoding', 'content-length', 'transfer-encoding')}
+        with open(body_path + '.tmp', 'wb') as f:
+            f.write(response.content)
+        with open(meta_path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump({'url': response.url, 'status': response.status_code, 'headers': headers,
+                       'encoding': response.encoding}, f, ensure_ascii=False)
+        os.replace(body_path + '.tmp', body_path)
+        os.replace(meta_path + '.tmp', meta_path)
+
+
+class HttpClient:
+    """
+    爬虫共用的 HTTP 客户端
+
+    一个长连接池会话；默认请求头声明 gzip/deflate（安装 brotli 时含 br）压缩；
+    连接错误、超时、429/5xx（以及可选的空响应体）按指数退避加随机抖动重试，
+    429 优先遵循 Retry-After；可选的磁盘响应缓存；按接口统计请求数、字节数、
+    错误率和耗时分位数。
+
+    参数：
+    limiter   - 可选的限速器，需提供 acquire(url)，每次实际发出请求（含重试）前调用
+    cache_dir - 响应缓存目录，None 表示不缓存；cache_ttl 为缓存有效期（秒）
+    """
+
+    def __init__(self, headers=None, pool_size=16, timeout=10, max_retries=3, backoff=0.5,
+                 max_backoff=30.0, limiter=None, cache_dir=None, cache_ttl=None, session=None):
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.limiter = limiter
+        self.cache = ResponseCache(cache_dir, cache_ttl) if cache_dir else None
+
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+        session.headers.update(DEFAULT_HEADERS)
+        session.headers.update(headers or {})
+        self.session = session
+
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def _endpoint_stats(self, endpoint):
+        with self._lock:
+            stats = self._stats.get(endpoint)
+            if stats is None:
+                stats = self._stats[endpoint] = EndpointStats()
+            return stats
+
+    def _delay(self, attempt, response=None):
+        if response is not None and response.status_code == 429:
+            retry_after = response.headers.get('Retry-After', '')
+            if retry_after.isdigit():
+                return min(self.max_backoff, float(retry_after))
+        return min(self.max_backoff, self.backoff * (2 ** attempt)) * random.uniform(0.5, 1.5)
+
+    def request(self, method, url, params=None, endpoint=None, timeout=None, cache=True,
+                retry_empty=False, **kwargs):
+        """
+        发送请求，返回 requests.Response
+
+        参数：
+        endpoint    - 统计使用的接口名，默认为主机名加路径
+        cache       - 为 False 时本次请求不读写缓存（只缓存 GET）
+        retry_empty - 为 True 时 200 但响应体为空也重试，最终抛出 EmptyResponse
+        其余参数透传给 requests
+
+        不可重试的 4xx 直接抛出 HTTPError；重试耗尽后抛出最后一次的异常
+        """
+        parsed = urlparse(url)
+        endpoint = endpoint or parsed.netloc + parsed.path
+        stats = self._endpoint_stats(endpoint)
+        use_cache = self.cache is not None and cache and method.upper() == 'GET'
+        if use_cache:
+            key = ResponseCache.key(method.upper(), url, params)
+            cached = self.cache.get(key)
+            if cached is not None:
+                with self._lock:
+                    stats.cache_hits += 1
+                instrumentation.incr(f'fetch.{endpoint}.cache_hits')
+                return cached
+
+        for attempt in range(self.max_retries + 1):
+            if self.limiter is not None:
+                self.limiter.acquire(url)
+            response = None
+            started = time.perf_counter()
+            try:
+                response = self.session.request(method, url, params=params,
+                                                timeout=timeout or self.timeout, **kwargs)
+                elapsed = time.perf_counter() - started
+                with self._lock:
+                    stats.observe(elapsed, len(response.content))
+                instrumentation.observe(f'fetch.{endpoint}', elapsed)
+                if response.status_code in RETRY_STATUS:
+                    response.raise_for_status()
+                if response.status_code >= 400:
+                    with self._lock:
+                        stats.errors += 1
+                    instrumentation.incr(f'fetch.{endpoint}.errors')
+                    response.raise_for_status()
+                if retry_empty and not response.content.strip():
+                    raise EmptyResponse(f'{url} 返回空响应体')
+                if use_cache:
+                    self.cache.put(key, response)
+                return response
+            except requests.exceptions.HTTPError as e:
+                if response is None or response.status_code not in RETRY_STATUS:
+                    raise
+                error = e
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                with self._lock:
+                    stats.observe(time.perf_counter() - started, 0)
+                error = e
+            except EmptyResponse as e:
+                error = e
+            with self._lock:
+                stats.errors += 1
+            instrumentation.incr(f'fetch.{endpoint}.errors')
+            if attempt < self.max_retries:
+                with self._lock:
+                    stats.retries += 1
+                instrumentation.incr(f'fetch.{endpoint}.retries')
+                logging.debug(f"{endpoint} 请求失败，第{attempt + 1}次重试: {str(error)}")
+                time.sleep(self._delay(attempt, response))
+        raise error
+
+    def get(self, url, params=None, **kwargs):
+        return self.request('GET', url, params=params, **kwargs)
+
+    def stats(self):
+        """{接口名: 统计摘要}"""
+        with self._lock:
+            return {endpoint: stats.summary() for endpoint, stats in self._stats.items()}
+
+    def log_stats(self):
+        for endpoint, s in self.stats().items():
+            logging.info(f"{endpoint} requests={s['requests']} errors={s['errors']} "
+                         f"error_rate={s['error_rate']:.2%} retries={s['retries']} cache_hits={s['cache_hits']} "
+                         f"bytes={s['bytes']} avg={s['avg_ms']:.1f}ms p50={s['p50_ms']:.1f}ms p95={s['p95_ms']:.1f}ms")
+
+    def close(self):
+        self.session.close()
+
+
+_default_client = None
+_default_lock = threading.Lock()
+
+
+def default_client():
+    """
+    进程内共享的默认客户端
+
+    设置环境变量 HTTP_CACHE_DIR（及可选的 HTTP_CACHE_TTL，秒）时启用磁盘响应缓存
+    """
+    global _default_client
+    with _default_lock:
+        if _default_client is None:
+            ttl = os.environ.get('HTTP_CACHE_TTL')
+            _default_client = HttpClient(cache_dir=os.environ.get('HTTP_CACHE_DIR'),
+                                         cache_ttl=float(ttl) if ttl else None)
+        return _default_client
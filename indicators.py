@@ -0,0 +1,310 @@
+import numpy as np
+
+from kline_store import KLineStore, date_to_int, int_to_date
+
+# 指标参数
+MA_WINDOWS = (5, 10, 20, 60)
+EMA_SPANS = (12, 26)
+MACD_SIGNAL = 9
+RSI_WINDOWS = (6, 12, 24)
+BOLL_WINDOW, BOLL_WIDTH = 20, 2
+ATR_WINDOW = 14
+VOL_WINDOW = 20
+TRADING_DAYS = 252
+
+# 增量计算时需要保留的历史输入列数（最长滚动窗口 + 前收盘价）
+CONTEXT = max(MA_WINDOWS + (BOLL_WINDOW, ATR_WINDOW, VOL_WINDOW)) + 1
+INPUT_COLUMNS = ('close', 'high', 'low')
+
+
+def prefix_sums(x):
+    """
+    沿时间轴（axis=1）的前缀和与有效值个数前缀和（首列补0）
+
+    同一输入的多个窗口共用一次前缀和，n 期滚动和即两列相减，整个面板一次完成；
+    缺失值按0累加，由有效个数判断窗口是否完整。
+    """
+    valid = ~np.isnan(x)
+    total = np.zeros((x.shape[0], x.shape[1] + 1))
+    count = np.zeros((x.shape[0], x.shape[1] + 1), dtype=np.int32)
+    np.cumsum(np.where(valid, x, 0.0), axis=1, out=total[:, 1:])
+    np.cumsum(valid, axis=1, out=count[:, 1:])
+    return total, count
+
+
+def rolling_mean(x, n, prefix=None):
+    """n 期简单移动平均，窗口内有缺失值时为 NaN"""
+    total, count = prefix or prefix_sums(x)
+    out = np.full(x.shape, np.nan)
+    if n <= x.shape[1]:
+        full = (count[:, n:] - count[:, :-n]) == n
+        out[:, n - 1:] = np.where(full, (total[:, n:] - total[:, :-n]) / n, np.nan)
+    return out
+
+
+def rolling_std(x, n, prefix=None):
+    """n 期滚动总体标准差（ddof=0），窗口内有缺失值时为 NaN"""
+    mean = rolling_mean(x, n, prefix)
+    mean_sq = rolling_mean(x * x, n)
+    return np.sqrt(np.maximum(mean_sq - mean * mean, 0.0))
+
+
+def ewm(x, alpha, init=None):
+    """
+    指数加权平均：y[t] = alpha * x[t] + (1 - alpha) * y[t-1]
+
+    逐个时间点推进，每一步对全部股票向量化计算；缺失值沿用上一期结果，
+    首个有效值作为初值。init 为上一批数据最后一期的结果，用于增量计算。
+    """
+    # 转置为按时间连续存放，每一步处理一整行
+    xt = np.ascontiguousarray(x.T)
+    missing = np.isnan(xt)
+    out = np.empty_like(xt)
+    prev = np.full(x.shape[0], np.nan) if init is None else np.array(init, dtype=float)
+    for t in range(xt.shape[0]):
+        cur = alpha * xt[t] + (1 - alpha) * prev
+        np.copyto(cur, xt[t], where=np.isnan(prev))
+        np.copyto(cur, prev, where=missing[t])
+        out[t] = prev = cur
+    return out.T
+
+
+def shift(x):
+    """沿时间轴后移一期，首列填充 NaN"""
+    out = np.empty_like(x)
+    out[:, 0] = np.nan
+    out[:, 1:] = x[:, :-1]
+    return out
+
+
+def compute_indicators(close, high, low, offset=0, state=None):
+    """
+    在 (股票 × 日期) 面板上计算全部技术指标
+
+    参数：
+    close/high/low - 二维数组，形状 (股票数, 日期数)，缺失为 NaN
+    offset         - 前 offset 列为上一批数据的尾部，只用作滚动窗口上下文，不输出结果
+    state          - 上一批数据最后一期的递推状态（EMA 类指标），首次计算为 None
+
+    返回：(results, state)
+    results - {指标名: 二维数组}，形状 (股票数, 日期数 - offset)
+    state   - 本批最后一期的递推状态，供下次增量计算
+    """
+    state = state or {}
+    new = slice(offset, None)
+    all_prev_close = shift(close)
+    cur_close, prev_close = close[:, new], all_prev_close[:, new]
+    results, next_state = {}, {}
+
+    close_prefix = prefix_sums(close)
+    for n in MA_WINDOWS:
+        results[f'ma{n}'] = rolling_mean(close, n, close_prefix)[:, new]
+
+    # MACD：DIF = EMA12 - EMA26，DEA = EMA(DIF, 9)，MACD柱 = 2 * (DIF - DEA)
+    for n in EMA_SPANS:
+        key = f'ema{n}'
+        results[key] = ewm(cur_close, 2 / (n + 1), state.get(key))
+        next_state[key] = results[key][:, -1]
+    dif = results[f'ema{EMA_SPANS[0]}'] - results[f'ema{EMA_SPANS[1]}']
+    dea = ewm(dif, 2 / (MACD_SIGNAL + 1), state.get('dea'))
+    next_state['dea'] = dea[:, -1]
+    results.update(dif=dif, dea=dea, macd=2 * (dif - dea))
+
+    # RSI（通达信口径）：SMA(MAX(C-LC,0),N,1) / SMA(ABS(C-LC),N,1) * 100
+    change = cur_close - prev_close
+    gain, move = np.maximum(change, 0.0), np.abs(change)
+    for n in RSI_WINDOWS:
+        up = ewm(gain, 1 / n, state.get(f'rsi{n}_up'))
+        total = ewm(move, 1 / n, state.get(f'rsi{n}_move'))
+        next_state[f'rsi{n}_up'], next_state[f'rsi{n}_move'] = up[:, -1], total[:, -1]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            results[f'rsi{n}'] = np.where(total > 0, up / total * 100, 50.0)
+        results[f'rsi{n}'][np.isnan(total)] = np.nan
+
+    # 布林带：中轨为 MA20，上下轨为中轨 ± 2 倍标准差
+    mid = results[f'ma{BOLL_WINDOW}'] if BOLL_WINDOW in MA_WINDOWS else rolling_mean(close, BOLL_WINDOW)[:, new]
+    width = BOLL_WIDTH * rolling_std(close, BOLL_WINDOW, close_prefix)[:, new]
+    results.update(boll_mid=mid, boll_upper=mid + width, boll_lower=mid - width)
+
+    # ATR：真实波幅的 N 日简单平均
+    true_range = np.fmax(high - low, np.fmax(np.abs(high - all_prev_close), np.abs(low - all_prev_close)))
+    results['atr'] = rolling_mean(true_range, ATR_WINDOW)[:, new]
+
+    # 滚动波动率：对数收益率的 N 日标准差年化
+    with np.errstate(invalid='ignore', divide='ignore'):
+        log_ret = np.log(close / all_prev_close)
+    results['volatility'] = rolling_std(log_ret, VOL_WINDOW)[:, new] * np.sqrt(TRADING_DAYS)
+
+    return results, next_state
+
+
+def build_panel(store, codes, start=None, end=None, dates=None):
+    """
+    从K线存储读取多只股票，按日期并集对齐为 (股票 × 日期) 面板
+
+    参数：
+    dates - 指定面板的日期轴，不在其中的K线被丢弃；默认为各股票日期的并集
+
+    返回：(dates, {列名: 二维数组})，无数据的位置为 NaN
+    """
+    data = {code: store.read(code, start, end, columns=['date'] + list(INPUT_COLUMNS)) for code in codes}
+    if dates is None:
+        all_dates = [d['date'] for d in data.values() if len(d['date'])]
+        dates = np.unique(np.concatenate(all_dates)) if all_dates else np.empty(0, dtype=np.int32)
+    panel = {col: np.full((len(codes), len(dates)), np.nan) for col in INPUT_COLUMNS}
+    for i, code in enumerate(codes):
+        pos = np.searchsorted(dates, data[code]['date'])
+        keep = pos < len(dates)
+        keep[keep] = dates[pos[keep]] == data[code]['date'][keep]
+        for col in INPUT_COLUMNS:
+            panel[col][i, pos[keep]] = data[code][col][keep]
+    return dates, panel
+
+
+def merge_rows(old, new, rows):
+    """把 new 的各行写入 old 的第 rows 行，rows 为 -1 的行追加到末尾，返回新数组"""
+    merged = np.concatenate([old, new[rows < 0]], axis=0)
+    merged[rows[rows >= 0]] = new[rows >= 0]
+    return merged
+
+
+class IndicatorEngine:
+    """
+    全市场技术指标引擎
+
+    首次 compute 时把全部股票读入一个面板一次性计算；之后 refresh 只读取
+    每只股票最后计算日期之后新追加的K线，结合保存的窗口上下文和EMA递推状态
+    增量计算新增日期的指标。历史K线被改写的股票（store.replace 全量重建，或窗口上下文内的
+    K线与上次计算时不同）以及存储中新出现的股票，在 refresh 时于现有日期轴上整体重算。
+    状态可通过 save/load 持久化，供每日任务复用。
+    """
+
+    def __init__(self, store=None):
+        self.store = store or KLineStore()
+        self.codes = []
+        self.dates = np.empty(0, dtype=np.int32)
+        self.results = {}
+        self.context = {}
+        self.state = {}
+        self.generations = {}    # 股票 -> 计算时存储的替换次数
+        self.all_symbols = True  # 是否覆盖存储中的全部股票（refresh 时加入新股票）
+
+    def compute(self, codes=None, start=None, end=None):
+        """全量计算"""
+        self.all_symbols = codes is None
+        self.codes = list(codes or self.store.symbols())
+        self.dates, panel = build_panel(self.store, self.codes, start, end)
+        self.results, self.state = compute_indicators(panel['close'], panel['high'], panel['low'])
+        self.context = {col: panel[col][:, -CONTEXT:] for col in INPUT_COLUMNS}
+        self.generations = {code: self.store.generation(code) for code in self.codes}
+        return self
+
+    def stale_codes(self):
+        """历史K线在上次计算后被改写的股票：替换次数变化，或窗口上下文内的K线不一致"""
+        tail_dates = self.dates[-self.context['close'].shape[1]:]
+        _, tail = build_panel(self.store, self.codes, int(tail_dates[0]), int(tail_dates[-1]), dates=tail_dates)
+        changed = np.zeros(len(self.codes), dtype=bool)
+        for col in INPUT_COLUMNS:
+            stored, saved = tail[col], self.context[col]
+            changed |= ~((stored == saved) | (np.isnan(stored) & np.isnan(saved))).all(axis=1)
+        return [code for code, differ in zip(self.codes, changed)
+                if differ or self.store.generation(code) != self.generations.get(code, 0)]
+
+    def recompute(self, codes):
+        """在现有日期轴上整体重算部分股票，不在 self.codes 中的股票追加到末尾"""
+        _, panel = build_panel(self.store, codes, end=int(self.dates[-1]), dates=self.dates)
+        results, state = compute_indicators(panel['close'], panel['high'], panel['low'])
+        width = self.context['close'].shape[1]
+        positions = {code: i for i, code in enumerate(self.codes)}
+        rows = np.array([positions.get(code, -1) for code in codes])
+        self.results = {key: merge_rows(self.results[key], results[key], rows) for key in results}
+        self.state = {key: merge_rows(self.state[key], state[key], rows) for key in state}
+        self.context = {col: merge_rows(self.context[col], panel[col][:, -width:], rows) for col in INPUT_COLUMNS}
+        self.codes += [code for code, row in zip(codes, rows) if row < 0]
+        self.generations.update({code: self.store.generation(code) for code in codes})
+
+    def refresh(self):
+        """
+        增量计算：先整体重算历史K线被改写的股票并加入新股票，再只处理最后计算日期之后
+        新增的K线，返回新增日期数
+        """
+        if not len(self.dates):
+            self.compute()
+            return len(self.dates)
+        known = set(self.codes)
+        added = [code for code in self.store.symbols() if code not in known] if self.all_symbols else []
+        stale = self.stale_codes()
+        if stale or added:
+            self.recompute(stale + added)
+        last = int(self.dates[-1])
+        new_dates, panel = build_panel(self.store, self.codes, last + 1)
+        if not len(new_dates):
+            return 0
+        offset = self.context['close'].shape[1]
+        inputs = {col: np.concatenate([self.context[col], panel[col]], axis=1) for col in INPUT_COLUMNS}
+        results, self.state = compute_indicators(inputs['close'], inputs['high'], inputs['low'],
+                                                 offset=offset, state=self.state)
+        self.results = {key: np.concatenate([self.results[key], results[key]], axis=1) for key in results}
+        self.dates = np.concatenate([self.dates, new_dates])
+        self.context = {col: inputs[col][:, -CONTEXT:] for col in INPUT_COLUMNS}
+        return len(new_dates)
+
+    def frame(self, code, start=None, end=None):
+        """返回单只股票的指标 DataFrame"""
+        import pandas as pd
+
+        i = self.codes.index(code)
+        lo = 0 if start is None else int(np.searchsorted(self.dates, date_to_int(start), side='left'))
+        hi = len(self.dates) if end is None else int(np.searchsorted(self.dates, date_to_int(end), side='right'))
+        frame = pd.DataFrame({key: values[i, lo:hi] for key, values in self.results.items()})
+        frame.insert(0, '日期', [int_to_date(d) for d in self.dates[lo:hi]])
+        return frame
+
+    def save(self, path):
+        """保存计算结果和增量状态"""
+        arrays = {'codes': np.array(self.codes), 'dates': self.dates,
+                  'generations': np.array([self.generations.get(code, 0) for code in self.codes]),
+                  'all_symbols': np.array(self.all_symbols)}
+        arrays.update({f'result_{k}': v for k, v in self.results.items()})
+        arrays.update({f'context_{k}': v for k, v in self.context.items()})
+        arrays.update({f'state_{k}': v for k, v in self.state.items()})
+        np.savez(path, **arrays)
+
+    def load(self, path):
+        """读取 save 保存的结果和增量状态"""
+        with np.load(path) as data:
+            self.codes = data['codes'].tolist()
+            self.dates = data['dates']
+            # 旧版本的状态文件没有替换次数，按 0 处理（替换过的股票在下次 refresh 时重算）
+            generations = data['generations'].tolist() if 'generations' in data.files else [0] * len(self.codes)
+            self.generations = dict(zip(self.codes, generations))
+            self.all_symbols = bool(data['all_symbols']) if 'all_symbols' in data.files else True
+            for prefix, target in (('result_', self.results), ('context_', self.context), ('state_', self.state)):
+                target.clear()
+                target.update({k[len(prefix):]: data[k] for k in data.files if k.startswith(prefix)})
+        return self
+
+
+def main(argv=None):
+    import os
+    import time
+    import argparse
+
+    # 全市场指标计算，已有状态文件时只增量计算新增K线
+    parser = argparse.ArgumentParser(description='全市场技术指标计算')
+    parser.add_argument('--state', default='data/indicators.npz', help='指标状态文件')
+    path = parser.parse_args(argv).state
+    engine = IndicatorEngine()
+    start = time.perf_counter()
+    if os.path.exists(path):
+        added = engine.load(path).refresh()
+        print(f"增量计算 {added} 个新交易日")
+    else:
+        engine.compute()
+        print(f"全量计算 {len(engine.codes)} 只股票 × {len(engine.dates)} 个交易日")
+    engine.save(path)
+    print(f"耗时 {time.perf_counter() - start:.2f} 秒")
+
+
+if __name__ == '__main__':
+    main()
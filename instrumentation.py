@@ -0,0 +1,362 @@
+"""
+采集、解析、存储和服务各阶段共用的轻量埋点
+
+  timer(name) / observe(name, seconds)   阶段耗时：次数、总耗时、最大值、p50/p95
+  incr(name, n)                          计数
+  event(name, message)                   重复出现的告警日志：每个汇总周期内只记录第一次，其余计数后在汇总中合并输出
+  alert(key, message)                    异常告警：按 key 去重，同一 key 在 ALERT_INTERVAL 秒内只发送一次，
+                                         另有全局每小时上限；被合并的次数附在下一次告警中
+  configure()                            启动周期汇总线程；环境变量 INSTRUMENT_PROFILE=1 时同时启动采样分析器
+
+埋点只在内存中累加（一次 perf_counter 和一次加锁），汇总按 INSTRUMENT_SUMMARY_INTERVAL 秒
+（默认60）输出到日志，可在生产环境常开。
+
+环境变量：
+  INSTRUMENT_SUMMARY_INTERVAL   汇总周期（秒），0 表示不启动汇总线程
+  INSTRUMENT_PROFILE            为 1 时启动采样分析器
+  INSTRUMENT_PROFILE_INTERVAL   采样间隔（秒），默认 0.01
+  INSTRUMENT_PROFILE_OUTPUT     采样结果文件前缀（折叠栈格式，可直接生成火焰图），实际文件为 {前缀}.{pid}，
+                                默认 profile_{pid}.txt
+  ALERT_SMTP_HOST/ALERT_SMTP_PORT/ALERT_SMTP_USER/ALERT_SMTP_PASSWORD/ALERT_FROM/ALERT_TO
+                                告警邮件配置，未设置 ALERT_SMTP_HOST 时告警只写入日志
+"""
+import os
+import sys
+import time
+import atexit
+import random
+import logging
+import threading
+from collections import Counter, deque
+from contextlib import contextmanager
+from functools import wraps
+
+logger = logging.getLogger('metrics')
+
+# 每个计时项保留的耗时样本数（蓄水池抽样），用于估计分位数
+TIMER_SAMPLES = 512
+SUMMARY_INTERVAL = 60
+# 同一告警的最短间隔（秒）与每小时告警上限
+ALERT_INTERVAL = 900
+ALERTS_PER_HOUR = 10
+
+
+class TimerStats:
+    """单个计时项在当前汇总周期内的统计"""
+
+    __slots__ = ('count', 'total', 'max', 'samples')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.samples = []
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+        if len(self.samples) < TIMER_SAMPLES:
+            self.samples.append(seconds)
+        else:
+            slot = random.randrange(self.count)
+            if slot < TIMER_SAMPLES:
+                self.samples[slot] = seconds
+
+    def summary(self):
+        ordered = sorted(self.samples)
+
+        def quantile(q):
+            return ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000 if ordered else 0.0
+
+        return {
+            'count': self.count,
+            'total_s': self.total,
+            'avg_ms': self.total / self.count * 1000 if self.count else 0.0,
+            'p50_ms': quantile(0.5),
+            'p95_ms': quantile(0.95),
+            'max_ms': self.max * 1000,
+        }
+
+
+class Metrics:
+    """计时、计数和重复事件的进程内注册表，summary() 返回并清空当前周期的数据"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._timers = {}
+        self._counters = Counter()
+        self._events = {}   # name -> [本周期次数, 最近一条消息, 日志级别]
+        self._started = time.time()
+
+    def observe(self, name, seconds):
+        with self._lock:
+            stats = self._timers.get(name)
+            if stats is None:
+                stats = self._timers[name] = TimerStats()
+            stats.add(seconds)
+
+    def incr(self, name, n=1):
+        with self._lock:
+            self._counters[name] += n
+
+    @contextmanager
+    def timer(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def event(self, name, message, level=logging.WARNING):
+        """记录一次事件；本周期内第一次出现时立即写日志，之后只计数"""
+        with self._lock:
+            entry = self._events.get(name)
+            first = entry is None
+            if first:
+                self._events[name] = [1, message, level]
+            else:
+                entry[0] += 1
+                entry[1] = message
+        if first:
+            logger.log(level, f"{name}: {message}")
+
+    def summary(self, reset=True):
+        """{'seconds': 周期时长, 'timers': {...}, 'counters': {...}, 'events': {name: (次数, 最近消息)}}"""
+        with self._lock:
+            now = time.time()
+            result = {
+                'seconds': now - self._started,
+                'timers': {name: stats.summary() for name, stats in self._timers.items()},
+                'counters': dict(self._counters),
+                'events': {name: (count, message, level) for name, (count, message, level) in self._events.items()},
+            }
+            if reset:
+                self._timers, self._counters, self._events = {}, Counter(), {}
+                self._started = now
+        return result
+
+    def log_summary(self):
+        """输出并清空本周期的汇总；没有任何数据时不输出"""
+        data = self.summary()
+        seconds = data['seconds']
+        for name, s in sorted(data['timers'].items()):
+            logger.info(f"{name} count={s['count']} rate={s['count'] / seconds:.2f}/s avg={s['avg_ms']:.1f}ms "
+                        f"p50={s['p50_ms']:.1f}ms p95={s['p95_ms']:.1f}ms max={s['max_ms']:.1f}ms")
+        if data['counters']:
+            logger.info(' '.join(f"{name}={value}" for name, value in sorted(data['counters'].items())))
+        for name, (count, message, level) in sorted(data['events'].items()):
+            if count > 1:
+                logger.log(level, f"{name}: 过去 {seconds:.0f} 秒内共 {count} 次，最近一次: {message}")
+        return data
+
+
+class SamplingProfiler:
+    """
+    采样分析器：后台线程每 interval 秒采集一次其余线程的调用栈
+
+    结果为折叠栈格式（'模块:函数;模块:函数 次数'），可直接用 flamegraph.pl / speedscope 查看。
+    开销与采样频率成正比，与被测代码无关。
+    """
+
+    def __init__(self, interval=0.01, output=None, max_depth=64):
+        self.interval = interval
+        self.output = output or f'profile_{os.getpid()}.txt'
+        self.max_depth = max_depth
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _collapse(self, frame):
+        parts = []
+        while frame is not None and len(parts) < self.max_depth:
+            code = frame.f_code
+            parts.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+            frame = frame.f_back
+        return ';'.join(reversed(parts))
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for ident, frame in sys._current_frames().items():
+                if ident != own:
+                    self.stacks[self._collapse(frame)] += 1
+            self.samples += 1
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.dump()
+
+    def dump(self):
+        """把目前为止的采样写入 output，返回路径"""
+        stacks = list(self.stacks.items())
+        with open(self.output + '.tmp', 'w', encoding='utf-8') as f:
+            for stack, count in sorted(stacks, key=lambda item: -item[1]):
+                f.write(f"{stack} {count}\n")
+        os.replace(self.output + '.tmp', self.output)
+        return self.output
+
+
+def log_sender(subject, body):
+    logger.error(f"[告警] {subject}: {body}")
+
+
+def email_sender(host, port=587, user=None, password=None, sender='crawler@example.com', to='admin@example.com'):
+    """返回通过 SMTP 发送告警邮件的函数"""
+    def send(subject, body):
+        import smtplib
+        from email.mime.text import MIMEText
+
+        msg = MIMEText(body)
+        msg['Subject'] = subject
+        msg['From'] = sender
+        msg['To'] = to
+        with smtplib.SMTP(host, port, timeout=10) as server:
+            server.starttls()
+            if user:
+                server.login(user, password)
+            server.send_message(msg)
+        logger.info(f"告警邮件已发送: {subject}")
+    return send
+
+
+def sender_from_env():
+    host = os.environ.get('ALERT_SMTP_HOST')
+    if not host:
+        return log_sender
+    return email_sender(host, int(os.environ.get('ALERT_SMTP_PORT', 587)), os.environ.get('ALERT_SMTP_USER'),
+                        os.environ.get('ALERT_SMTP_PASSWORD'), os.environ.get('ALERT_FROM', 'crawler@example.com'),
+                        os.environ.get('ALERT_TO', 'admin@example.com'))
+
+
+class AlertManager:
+    """
+    去重限频的告警
+
+    同一 key 在 min_interval 秒内只发送一次，全局每小时最多 per_hour 次；被合并的告警计数，
+    在该 key 下一次发送时附上。发送在后台线程中进行，不阻塞调用方。
+
+    参数：
+    send - send(subject, body)，默认按环境变量发送邮件，未配置时写入日志
+    """
+
+    def __init__(self, send=None, min_interval=ALERT_INTERVAL, per_hour=ALERTS_PER_HOUR):
+        self.send = send
+        self.min_interval = min_interval
+        self.per_hour = per_hour
+        self._last = {}          # key -> 上次发送时间
+        self._suppressed = Counter()
+        self._sent = deque()
+        self._lock = threading.Lock()
+
+    def alert(self, key, message, subject=None):
+        """返回是否实际发送"""
+        now = time.monotonic()
+        with self._lock:
+            while self._sent and now - self._sent[0] > 3600:
+                self._sent.popleft()
+            last = self._last.get(key)
+            if (last is not None and now - last < self.min_interval) or len(self._sent) >= self.per_hour:
+                self._suppressed[key] += 1
+                METRICS.incr('alerts.suppressed')
+                return False
+            self._last[key] = now
+            self._sent.append(now)
+            suppressed = self._suppressed.pop(key, 0)
+        body = message + (f"\n\n（此前 {suppressed} 次相同告警已合并）" if suppressed else '')
+        send = self.send or sender_from_env()
+        METRICS.incr('alerts.sent')
+
+        def run():
+            try:
+                send(subject or f'告警: {key}', body)
+            except Exception as e:
+                logger.error(f"告警发送失败: {str(e)}")
+
+        threading.Thread(target=run, name='alert-sender', daemon=True).start()
+        return True
+
+
+METRICS = Metrics()
+ALERTS = AlertManager()
+
+observe = METRICS.observe
+incr = METRICS.incr
+timer = METRICS.timer
+event = METRICS.event
+alert = ALERTS.alert
+
+
+def timed(name):
+    """函数计时装饰器"""
+    def decorate(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                METRICS.observe(name, time.perf_counter() - start)
+        return wrapper
+    return decorate
+
+
+_reporter = None
+_reporter_pid = None
+_profiler = None
+_configure_lock = threading.Lock()
+
+
+def _report_loop(interval, stop):
+    while not stop.wait(interval):
+        try:
+            METRICS.log_summary()
+            if _profiler is not None:
+                _profiler.dump()
+        except Exception as e:
+            logger.error(f"汇总输出失败: {str(e)}")
+
+
+def _shutdown():
+    if _profiler is not None:
+        _profiler.stop()
+        logger.info(f"采样结果已写入 {_profiler.output}（{_profiler.samples} 次采样）")
+    METRICS.log_summary()
+
+
+def configure(summary_interval=None):
+    """
+    启动周期汇总线程（进程内只启动一次），按环境变量启动采样分析器；进程退出时输出最后一次汇总
+
+    参数：
+    summary_interval - 汇总周期（秒），默认取 INSTRUMENT_SUMMARY_INTERVAL 或 60
+    """
+    global _reporter, _reporter_pid, _profiler
+    with _configure_lock:
+        # fork 出的子进程继承了父进程的状态但没有继承线程，需要重新启动
+        if _reporter is not None and _reporter_pid == os.getpid():
+            return
+        _reporter_pid = os.getpid()
+        interval = summary_interval if summary_interval is not None else \
+            float(os.environ.get('INSTRUMENT_SUMMARY_INTERVAL', SUMMARY_INTERVAL))
+        if os.environ.get('INSTRUMENT_PROFILE') == '1':
+            output = os.environ.get('INSTRUMENT_PROFILE_OUTPUT')
+            _profiler = SamplingProfiler(float(os.environ.get('INSTRUMENT_PROFILE_INTERVAL', 0.01)),
+                                         output and f'{output}.{os.getpid()}').start()
+            logger.info(f"采样分析器已启动，间隔 {_profiler.interval}s，输出 {_profiler.output}")
+        _reporter = threading.Event()
+        if interval > 0:
+            threading.Thread(target=_report_loop, args=(interval, _reporter), name='metrics-reporter',
+                             daemon=True).start()
+        atexit.register(_shutdown)
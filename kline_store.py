@@ -0,0 +1,245 @@
+import os
+import numpy as np
+
+from instrumentation import timed
+
+# K线字段定义：(中文列名, 存储文件名, dtype)
+# 与 stock_history_crawler.parse_kline_item 的输出一一对应
+KLINE_FIELDS = [
+    ('日期', 'date', np.int32),          # YYYYMMDD 整数
+    ('开盘价', 'open', np.float64),
+    ('收盘价', 'close', np.float64),
+    ('最高价', 'high', np.float64),
+    ('最低价', 'low', np.float64),
+    ('成交量(手)', 'volume', np.int64),
+    ('成交额(元)', 'amount', np.float64),
+    ('振幅(%)', 'amplitude', np.float64),
+    ('涨跌幅(%)', 'pct_chg', np.float64),
+    ('涨跌额', 'chg', np.float64),
+    ('换手率(%)', 'turnover', np.float64),
+]
+
+COLUMN_NAMES = [name for _, name, _ in KLINE_FIELDS]
+COLUMN_DTYPES = {name: np.dtype(dtype) for _, name, dtype in KLINE_FIELDS}
+CHINESE_NAMES = {name: cn for cn, name, _ in KLINE_FIELDS}
+
+
+def date_to_int(value):
+    """将 'YYYY-MM-DD' / 'YYYYMMDD' 字符串或整数转换为 YYYYMMDD 整数"""
+    if value is None:
+        return None
+    if isinstance(value, (int, np.integer)):
+        return int(value)
+    return int(str(value).replace('-', ''))
+
+
+def int_to_date(value):
+    """将 YYYYMMDD 整数转换为 'YYYY-MM-DD' 字符串"""
+    value = int(value)
+    return f"{value // 10000:04d}-{value // 100 % 100:02d}-{value % 100:02d}"
+
+
+def columns_to_frame(columns):
+    """将 {英文列名: 数组} 转换为与CSV文件相同中文表头的 DataFrame"""
+    import pandas as pd
+
+    frame = pd.DataFrame({CHINESE_NAMES[col]: np.asarray(arr) for col, arr in columns.items()})
+    if '日期' in frame:
+        frame['日期'] = [int_to_date(d) for d in columns['date']]
+    return frame
+
+
+class KLineStore:
+    """
+    按股票代码分目录的列式K线存储
+
+    目录结构：{root}/{stock_code}/{column}.bin，每列一个定长二进制文件
+    （日期为 int32，成交量为 int64，其余为 float64），行按日期升序排列。
+    读取通过 numpy.memmap 只读映射，不产生逐行 Python 对象；
+    写入为追加写，按日期去重（新数据覆盖同日期的旧数据）。
+    {root}/{stock_code}/generation 记录整体替换的次数，供增量计算判断历史数据是否被改写。
+    """
+
+    def __init__(self, root='data/kline'):
+        self.root = root
+
+    def _symbol_dir(self, stock_code):
+        return os.path.join(self.root, stock_code)
+
+    def _column_path(self, stock_code, column):
+        return os.path.join(self._symbol_dir(stock_code), f'{column}.bin')
+
+    def symbols(self):
+        """返回已存储的全部股票代码"""
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(
+            code for code in os.listdir(self.root)
+            if os.path.isfile(self._column_path(code, 'date'))
+        )
+
+    def __contains__(self, stock_code):
+        return os.path.isfile(self._column_path(stock_code, 'date'))
+
+    def row_count(self, stock_code):
+        """返回某只股票已存储的K线条数"""
+        path = self._column_path(stock_code, 'date')
+        if not os.path.isfile(path):
+            return 0
+        return os.path.getsize(path) // COLUMN_DTYPES['date'].itemsize
+
+    def _map_column(self, stock_code, column, rows):
+        if rows == 0:
+            return np.empty(0, dtype=COLUMN_DTYPES[column])
+        return np.memmap(self._column_path(stock_code, column),
+                         dtype=COLUMN_DTYPES[column], mode='r', shape=(rows,))
+
+    def generation(self, stock_code):
+        """返回某只股票被 replace 整体替换的次数，从未替换过时为 0"""
+        path = os.path.join(self._symbol_dir(stock_code), 'generation')
+        if not os.path.isfile(path):
+            return 0
+        with open(path, encoding='utf-8') as f:
+            return int(f.read().strip() or 0)
+
+    def dates(self, stock_code):
+        """返回日期列的只读映射（int32 YYYYMMDD）"""
+        return self._map_column(stock_code, 'date', self.row_count(stock_code))
+
+    def last_date(self, stock_code):
+        """返回最后一条K线的日期（YYYYMMDD 整数），无数据时返回 None"""
+        dates = self.dates(stock_code)
+        return int(dates[-1]) if len(dates) else None
+
+    def read(self, stock_code, start=None, end=None, columns=None):
+        """
+        读取日期区间内的K线数据
+
+        参数：
+        stock_code - 6位股票代码
+        start/end  - 起止日期（含），支持 'YYYY-MM-DD'、'YYYYMMDD' 或整数
+        columns    - 需要读取的列（英文列名），默认全部
+
+        返回：{列名: numpy 数组}，数组为内存映射上的只读切片
+        """
+        columns = columns or COLUMN_NAMES
+        unknown = set(columns) - set(COLUMN_NAMES)
+        if unknown:
+            raise KeyError(f"未知的K线字段: {sorted(unknown)}")
+
+        rows = self.row_count(stock_code)
+        dates = self._map_column(stock_code, 'date', rows)
+        lo = 0 if start is None else int(np.searchsorted(dates, date_to_int(start), side='left'))
+        hi = rows if end is None else int(np.searchsorted(dates, date_to_int(end), side='right'))
+        return {
+            col: (dates if col == 'date' else self._map_column(stock_code, col, rows))[lo:hi]
+            for col in columns
+        }
+
+    def read_frame(self, stock_code, start=None, end=None):
+        """读取为与CSV文件相同表头的 DataFrame"""
+        return columns_to_frame(self.read(stock_code, start, end))
+
+    @timed('save.kline')
+    def append(self, stock_code, columns):
+        """
+        追加K线数据（按日期去重）
+
+        参数：
+        stock_code - 6位股票代码
+        columns    - {英文列名: 数组}，必须包含全部字段，长度一致
+
+        返回：写入后的总行数
+        """
+        missing = set(COLUMN_NAMES) - set(columns)
+        if missing:
+            raise KeyError(f"缺少K线字段: {sorted(missing)}")
+
+        new = {col: np.asarray(columns[col], dtype=COLUMN_DTYPES[col]) for col in COLUMN_NAMES}
+        if len(new['date']) == 0:
+            return self.row_count(stock_code)
+
+        # 新数据自身按日期排序去重，同日期保留最后一条
+        order = np.argsort(new['date'], kind='stable')
+        new = {col: arr[order] for col, arr in new.items()}
+        keep = np.append(new['date'][1:] != new['date'][:-1], True)
+        new = {col: arr[keep] for col, arr in new.items()}
+
+        os.makedirs(self._symbol_dir(stock_code), exist_ok=True)
+        rows = self.row_count(stock_code)
+        last = self.last_date(stock_code)
+
+        if last is None or new['date'][0] > last:
+            # 常见情况：全部为新日期，直接追加到文件末尾；日期列最后写入，保证行数以日期列为准
+            for col in COLUMN_NAMES[1:] + COLUMN_NAMES[:1]:
+                with open(self._column_path(stock_code, col), 'ab') as f:
+                    # 截掉上次中断留下的多余数据（含日期列末尾不完整的一条），使各列与日期列对齐
+                    f.truncate(rows * COLUMN_DTYPES[col].itemsize)
+                    f.seek(0, os.SEEK_END)
+                    f.write(new[col].tobytes())
+            return rows + len(new['date'])
+
+        # 与已有日期重叠：合并后整体重写
+        old = {col: np.array(self._map_column(stock_code, col, rows)) for col in COLUMN_NAMES}
+        stale = np.isin(old['date'], new['date'])
+        merged = {col: np.concatenate([old[col][~stale], new[col]]) for col in COLUMN_NAMES}
+        order = np.argsort(merged['date'], kind='stable')
+        self._write_all(stock_code, {col: arr[order] for col, arr in merged.items()})
+        return len(order)
+
+    @timed('save.kline')
+    def replace(self, stock_code, columns):
+        """用给定数据整体替换某只股票的存储（用于复权变化后的全量重建），替换次数加一"""
+        generation = self.generation(stock_code) + 1
+        self.delete(stock_code)
+        rows = self.append(stock_code, columns)
+        os.makedirs(self._symbol_dir(stock_code), exist_ok=True)
+        path = os.path.join(self._symbol_dir(stock_code), 'generation')
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            f.write(str(generation))
+        os.replace(path + '.tmp', path)
+        return rows
+
+    def delete(self, stock_code):
+        """删除某只股票的全部K线列文件（保留替换次数）"""
+        for col in COLUMN_NAMES:
+            path = self._column_path(stock_code, col)
+            if os.path.exists(path):
+                os.remove(path)
+
+    def _write_all(self, stock_code, columns):
+        # 先写临时文件再原子替换；日期列最后替换，保证行数以日期列为准
+        for col in COLUMN_NAMES[1:] + COLUMN_NAMES[:1]:
+            path = self._column_path(stock_code, col)
+            tmp_path = path + '.tmp'
+            with open(tmp_path, 'wb') as f:
+                f.write(np.ascontiguousarray(columns[col]).tobytes())
+            os.replace(tmp_path, path)
+
+    def import_csv(self, stock_code, csv_path):
+        """
+        导入已有的 data/stock_{code}_*.csv 文件
+
+        按列位置读取，兼容 '开盘'/'开盘价' 等不同版本的中文表头。
+        """
+        import pandas as pd
+
+        frame = pd.read_csv(csv_path, encoding='utf_8_sig')
+        if frame.shape[1] != len(KLINE_FIELDS):
+            raise ValueError(f"{csv_path} 列数为 {frame.shape[1]}，应为 {len(KLINE_FIELDS)}")
+        columns = {col: frame.iloc[:, i].to_numpy() for i, col in enumerate(COLUMN_NAMES)}
+        columns['date'] = frame.iloc[:, 0].astype(str).str.replace('-', '', regex=False).astype(np.int32).to_numpy()
+        return self.append(stock_code, columns)
+
+
+if __name__ == '__main__':
+    # 示例：将 data 目录下已有的CSV文件导入列式存储
+    import glob
+    import re
+
+    store = KLineStore()
+    for path in sorted(glob.glob('data/stock_*_*_*.csv')):
+        match = re.match(r'stock_(\d{6})_', os.path.basename(path))
+        if match:
+            rows = store.import_csv(match.group(1), path)
+            print(f"已导入 {path}，{match.group(1)} 共 {rows} 条K线")
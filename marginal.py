@@ -1,5 +1,10 @@
 import numpy as np
-from scipy.stats import gaussian_kde
+
+# 样本数超过该值时使用分箱+FFT卷积近似，否则直接精确求和
+BINNED_THRESHOLD = 20000
+# 分箱核密度估计的最少/最多分箱数，实际分箱数保证箱宽不超过带宽的1/8
+BINS = 4096
+MAX_BINS = 1 << 20
 
 def marginal_distribution(data, variable_index, grid_points=100):
     """
@@ -17,7 +22,8 @@ def marginal_distribution(data, variable_index, grid_points=100):
     # 提取指定变量的数据
     variable_data = data[:, variable_index]
     
-    # 使用核密度估计计算边缘分布
+    # 使用核密度估计计算边缘分布（scipy 导入较慢，只在此处按需导入）
+    from scipy.stats import gaussian_kde
     kde = gaussian_kde(variable_data)
     
     # 创建网格点
@@ -28,6 +34,127 @@ def marginal_distribution(data, variable_index, grid_points=100):
     
     return grid, marginal_pdf
 
+
+def kde_bandwidth(values, bw_method=None):
+    """
+    计算高斯核的标准差，口径与 scipy.stats.gaussian_kde 一致
+
+    bw_method 为 None/'scott'、'silverman' 或数值因子；核标准差 = 因子 × 样本标准差(ddof=1)
+    """
+    n = len(values)
+    if bw_method is None or bw_method == 'scott':
+        factor = n ** (-1 / 5)
+    elif bw_method == 'silverman':
+        factor = (n * 3 / 4) ** (-1 / 5)
+    elif np.isscalar(bw_method):
+        factor = float(bw_method)
+    else:
+        raise ValueError("bw_method 应为 'scott'、'silverman' 或数值")
+    h = factor * np.std(values, ddof=1)
+    if not h > 0:
+        raise ValueError("样本方差为0，无法估计核密度")
+    return h
+
+
+def exact_kde(values, grid, h, chunk=2048):
+    """直接求和的高斯核密度，按样本分块控制内存"""
+    pdf = np.zeros(len(grid))
+    for start in range(0, len(values), chunk):
+        diff = (grid[None, :] - values[start:start + chunk, None]) / h
+        pdf += np.exp(-0.5 * diff * diff).sum(axis=0)
+    return pdf / (len(values) * h * np.sqrt(2 * np.pi))
+
+
+def binned_kde(values, grid, h, bins=BINS):
+    """
+    分箱+FFT卷积的高斯核密度近似，复杂度 O(n + bins·log bins)
+
+    样本按线性分箱分配到等距网格上，与截断在 ±5h 的高斯核做FFT卷积，
+    再线性插值到目标网格。长尾数据会自动增加分箱数，保证箱宽相对带宽足够小。
+    """
+    lo = min(values.min(), grid.min())
+    hi = max(values.max(), grid.max())
+    bins = int(min(MAX_BINS, max(bins, np.ceil(8 * (hi - lo) / h) + 1)))
+    delta = (hi - lo) / (bins - 1)
+    pos = (values - lo) / delta
+    idx = np.minimum(pos.astype(np.int64), bins - 2)
+    frac = pos - idx
+    counts = np.bincount(idx, weights=1 - frac, minlength=bins) + np.bincount(idx + 1, weights=frac, minlength=bins)
+
+    half = min(bins - 1, int(np.ceil(5 * h / delta)))
+    offsets = np.arange(-half, half + 1) * delta
+    kernel = np.exp(-0.5 * (offsets / h) ** 2) / (h * np.sqrt(2 * np.pi))
+
+    size = 1 << int(np.ceil(np.log2(bins + 2 * half + 1)))
+    conv = np.fft.irfft(np.fft.rfft(counts, size) * np.fft.rfft(kernel, size), size)
+    density = conv[half:half + bins] / len(values)
+    return np.interp(grid, lo + delta * np.arange(bins), density)
+
+
+def marginal_distributions(data, grid_points=100, bw_method=None, grids=None, method='auto'):
+    """
+    批量计算所有变量的边缘分布函数。
+
+    参数:
+        data (numpy.ndarray): 数据集，形状为 (n_samples, n_features)。
+        grid_points (int): 每个变量的网格点数量（未指定 grids 时使用）。
+        bw_method: 带宽，同 gaussian_kde 的 bw_method（'scott'、'silverman' 或数值因子）。
+        grids (numpy.ndarray): 复用的网格，形状为 (grid_points,) 时所有变量共用，
+            形状为 (n_features, grid_points) 时逐变量指定；默认取各变量的 [min, max]。
+        method (str): 'exact' 精确求和，'binned' 分箱FFT近似，'auto' 按样本数自动选择。
+
+    返回:
+        grids (numpy.ndarray): 网格点，形状为 (n_features, grid_points)。
+        marginal_pdfs (numpy.ndarray): 边缘分布的概率密度值，形状同 grids。
+    """
+    data = np.asarray(data, dtype=float)
+    if data.ndim == 1:
+        data = data[:, None]
+    n_samples, n_features = data.shape
+    if method == 'auto':
+        method = 'binned' if n_samples > BINNED_THRESHOLD else 'exact'
+    if method not in ('exact', 'binned'):
+        raise ValueError("method 应为 'auto'、'exact' 或 'binned'")
+
+    if grids is None:
+        grids = np.linspace(data.min(axis=0), data.max(axis=0), grid_points).T
+    else:
+        grids = np.broadcast_to(np.asarray(grids, dtype=float), (n_features, np.shape(grids)[-1]))
+
+    estimate = binned_kde if method == 'binned' else exact_kde
+    pdfs = np.empty(grids.shape)
+    for j in range(n_features):
+        values = data[:, j]
+        pdfs[j] = estimate(values, grids[j], kde_bandwidth(values, bw_method))
+    return np.array(grids), pdfs
+
+
+def _symbol_marginals(args):
+    data, kwargs = args
+    return marginal_distributions(data, **kwargs)
+
+
+def marginal_distributions_by_symbol(datasets, workers=None, **kwargs):
+    """
+    对多只股票分别计算边缘分布，可多进程并行。
+
+    参数:
+        datasets (dict): {股票代码: 数据集}，数据集形状为 (n_samples, n_features)。
+        workers (int): 进程数，None 或 1 时在当前进程顺序计算。
+        **kwargs: 传给 marginal_distributions 的参数（grid_points、bw_method、grids、method）。
+
+    返回:
+        dict: {股票代码: (grids, marginal_pdfs)}
+    """
+    codes = list(datasets)
+    tasks = [(datasets[code], kwargs) for code in codes]
+    if not workers or workers == 1:
+        return {code: _symbol_marginals(task) for code, task in zip(codes, tasks)}
+    from concurrent.futures import ProcessPoolExecutor
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return dict(zip(codes, executor.map(_symbol_marginals, tasks)))
+
 # 示例数据
 if __name__ == "__main__":
     # 生成二维正态分布数据
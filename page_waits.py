@@ -0,0 +1,120 @@
+import time
+import logging
+from contextlib import contextmanager
+
+import instrumentation
+
+
+def page_signature(driver, selector):
+    """
+    记录当前页面内容的特征：首个匹配元素、匹配数量和首个元素文本
+
+    通过一次 JavaScript 调用获取，减少 WebDriver 往返；无匹配元素时返回 (None, 0, '')。
+    """
+    first, count, text = driver.execute_script(
+        "var items = document.querySelectorAll(arguments[0]);"
+        "return items.length ? [items[0], items.length, items[0].textContent] : [null, 0, ''];",
+        selector)
+    return first, count, text
+
+
+class content_changed:
+    """
+    等待条件：匹配元素被替换（旧元素失效）或数量、首行文本发生变化
+
+    用于翻页或查询后判断表格/列表已经重新渲染，替代固定时长的 sleep。
+    """
+
+    def __init__(self, selector, previous):
+        self.selector = selector
+        self.previous = previous
+
+    def __call__(self, driver):
+        from selenium.common.exceptions import StaleElementReferenceException
+
+        old_first, old_count, old_text = self.previous
+        if old_first is not None:
+            try:
+                old_first.is_enabled()
+            except StaleElementReferenceException:
+                return page_signature(driver, self.selector)[0] is not None
+        first, count, text = page_signature(driver, self.selector)
+        if first is None:
+            return False
+        return count != old_count or text != old_text
+
+
+def wait_for_change(driver, selector, previous, timeout=15, poll=0.1):
+    """等待 CSS 选择器匹配的内容变化，返回等待耗时（秒）；超时抛出 TimeoutException"""
+    from selenium.webdriver.support.ui import WebDriverWait
+
+    start = time.perf_counter()
+    WebDriverWait(driver, timeout, poll_frequency=poll).until(content_changed(selector, previous))
+    return time.perf_counter() - start
+
+
+class Politeness:
+    """
+    礼貌间隔：保证相邻两次请求之间至少间隔 min_interval 秒
+
+    只补足剩余时间，等待页面渲染本身花费的时间计入间隔，不再额外叠加固定 sleep。
+    """
+
+    def __init__(self, min_interval=1.0):
+        self.min_interval = min_interval
+        self.last = None
+
+    def wait(self):
+        if self.last is not None:
+            remaining = self.min_interval - (time.monotonic() - self.last)
+            if remaining > 0:
+                time.sleep(remaining)
+        self.last = time.monotonic()
+
+
+class PageTimer:
+    """
+    逐页耗时记录：导航（点击/打开页面）、渲染（等待内容出现）、解析（读取数据）
+
+    用法：
+        timer.start(page)
+        with timer.stage('navigation'): ...
+        timer.finish()
+    """
+
+    STAGES = ('navigation', 'render', 'parse', 'politeness')
+
+    def __init__(self, name=''):
+        self.name = name
+        self.pages = []
+        self.current = None
+
+    def start(self, page):
+        self.current = {'page': page}
+        return self
+
+    @contextmanager
+    def stage(self, stage):
+        begin = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.current[stage] = self.current.get(stage, 0.0) + time.perf_counter() - begin
+
+    def finish(self):
+        record = self.current
+        record['total'] = sum(record.get(stage, 0.0) for stage in self.STAGES)
+        self.pages.append(record)
+        self.current = None
+        # 各阶段耗时计入全局汇总，逐页明细只在调试级别输出
+        for stage in self.STAGES:
+            if stage in record:
+                instrumentation.observe(f'browser.{stage}', record[stage])
+        logging.debug(f"{self.name}第{record['page']}页耗时 " + ', '.join(
+            f"{stage}={record[stage]:.2f}s" for stage in self.STAGES + ('total',) if stage in record))
+        return record
+
+    def summary(self):
+        """各阶段累计耗时"""
+        return {stage: round(sum(p.get(stage, 0.0) for p in self.pages), 3)
+                for stage in self.STAGES + ('total',)}
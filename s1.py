@@ -1,106 +1,225 @@
 import requests
-from bs4 import BeautifulSoup
 import csv
 import time
+import json
+import logging
 import argparse
 import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+from http_client import default_client
+from instrumentation import configure, event, incr, observe, timed
 
 # 设置请求头模拟浏览器访问
 headers = {
     'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.3'
 }
 
-def get_stock_data(start_date: str = '20250301', end_date: str = '20250326'):
-    url = 'http://quote.eastmoney.com/center/gridlist.html#hs_a_board'
-    
-    # 请求头变量重命名避免冲突
-    request_headers = {
-        'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-        'Referer': 'http://quote.eastmoney.com/',
-        'Accept-Language': 'zh-CN,zh;q=0.9',
-        'Cookie': 'qgqp_b_id=3b4816d9f7b3a3a1a3a3a3a3a3a3a3a; em_hq_fls=js'
+# 行情列表接口
+CLIST_URL = 'http://push2.eastmoney.com/api/qt/clist/get'
+CLIST_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+    'Referer': 'http://quote.eastmoney.com/',
+    'Accept-Language': 'zh-CN,zh;q=0.9',
+    'Cookie': 'qgqp_b_id=3b4816d9f7b3a3a1a3a3a3a3a3a3a3a; em_hq_fls=js'
+}
+# 接口单页最多返回的条数（超出部分被服务端截断）
+CLIST_PAGE_SIZE = 100
+CLIST_WORKERS = 8
+
+# 行情列表字段定义：(接口字段, 中文列名, 快照存储列名)
+# 快照列的类型见 snapshot_store.SNAPSHOT_FIELDS；名称不进入快照列
+CLIST_SCHEMA = [
+    ('f12', '代码', 'code'),
+    ('f14', '名称', None),
+    ('f2', '最新价', 'price'),
+    ('f3', '涨跌幅', 'pct_chg'),
+    ('f4', '涨跌额', 'chg'),
+    ('f5', '成交量(手)', 'volume'),
+    ('f6', '成交额', 'amount'),
+    ('f7', '振幅', 'amplitude'),
+    ('f15', '最高', 'high'),
+    ('f16', '最低', 'low'),
+    ('f17', '今开', 'open'),
+    ('f18', '昨收', 'prev_close'),
+    ('f124', '更新时间', 'updated'),
+]
+QUOTE_FIELDS = [(key, col) for key, _, col in CLIST_SCHEMA if col is not None]
+CLIST_FIELDS = ','.join(key for key, _, _ in CLIST_SCHEMA)
+# CSV 导出中以百分号字符串表示的列
+PERCENT_COLUMNS = {'涨跌幅', '振幅'}
+
+logger = logging.getLogger('s1')
+
+def fetch_clist_page(page, page_size=CLIST_PAGE_SIZE, start_date='20250301', end_date='20250326',
+                     client=None, url=CLIST_URL, timeout=10):
+    """
+    请求行情列表的一页
+
+    返回：(diff 列表, 总条数)
+    """
+    params = {
+        'pn': page,
+        'pz': page_size,
+        'po': 0,
+        'np': 1,
+        'fltt': 2,
+        'invt': 2,
+        'fid': 'f12',  # 按代码排序：分页期间涨跌幅变化不会导致行在页间移动
+        'fs': 'm:0 t:6,m:0 t:13,m:0 t:80,m:1 t:2,m:1 t:23',  # 包含所有市场
+        'fields': CLIST_FIELDS,
+        'beg': start_date.replace('-', ''),  # 格式化日期
+        'end': end_date.replace('-', ''),
+        '_': int(time.time() * 1000)
     }
-    
+    response = (client or default_client()).get(url, params=params, endpoint='clist', timeout=timeout,
+                                                 headers=CLIST_HEADERS)
+    data = (json.loads(response.content) or {}).get('data') or {}
+    return data.get('diff') or [], int(data.get('total') or 0)
+
+def fetch_stock_list(start_date: str = '20250301', end_date: str = '20250326', page_size=CLIST_PAGE_SIZE,
+                     workers=CLIST_WORKERS, client=None, url=CLIST_URL):
+    """
+    分页并发请求全市场行情列表，返回接口原始的 diff 列表（按代码去重）
+
+    先请求第一页得到总条数，其余页通过共享客户端的连接池并发请求（失败重试由客户端处理）；去重后的条数少于总条数时
+    记录警告（数据可能被截断）。请求失败时抛出异常。
+    """
+    started = time.perf_counter()
+    client = client or default_client()
+    first, total = fetch_clist_page(1, page_size, start_date, end_date, client, url)
+    pages = max(1, -(-total // page_size))
+    results = [first]
+    if pages > 1:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(fetch_clist_page, page, page_size, start_date, end_date, client, url)
+                       for page in range(2, pages + 1)]
+            results += [future.result()[0] for future in futures]
+
+    stock_list, seen = [], set()
+    for items in results:
+        for item in items:
+            code = item.get('f12')
+            if code not in seen:
+                seen.add(code)
+                stock_list.append(item)
+    elapsed = time.perf_counter() - started
+    if len(stock_list) < total:
+        event('clist.incomplete', f"rows={len(stock_list)} total={total} pages={pages}")
+    observe('fetch.clist_all', elapsed)
+    logger.debug(f"行情列表获取完成 rows={len(stock_list)} total={total} pages={pages} "
+                f"page_size={page_size} elapsed={elapsed:.3f}s")
+    return stock_list
+
+def get_stock_data(start_date: str = '20250301', end_date: str = '20250326'):
     try:
-        # 使用东方财富API接口直接获取JSON数据
-        api_url = 'http://push2.eastmoney.com/api/qt/clist/get'
-        params = {
-            'pn': 1,
-            'pz': 10000,  # 最大允许值
-            'po': 1,
-            'np': 1,
-            'fltt': 2,
-            'invt': 2,
-            'fid': 'f3',
-            'fs': 'm:0 t:6,m:0 t:13,m:0 t:80,m:1 t:2,m:1 t:23',  # 包含所有市场
-            'fields': 'f12,f14,f2,f3,f4,f5,f6,f7,f15,f16,f17,f18,f124',
-            'beg': start_date.replace('-', ''),  # 格式化日期
-            'end': end_date.replace('-', ''),
-            '_': int(time.time() * 1000)
-        }
-        
-        # 添加重试机制
-        for attempt in range(3):
-            try:
-                response = requests.get(api_url, headers=request_headers, params=params, timeout=10)
-                response.encoding = 'utf-8'
-                data = response.json()
-                
-                # 解析JSON数据
-                stock_list = data.get('data', {}).get('diff', [])
-                if not stock_list:
-                    print("未获取到有效数据，响应内容：", data)
-                    return [], []
-                print(f"获取到 {len(stock_list)} 条数据,stock_list:{stock_list}")
-                # 定义字段映射（中文表头）
-                columns = [
-                    '代码', '名称', '最新价', '涨跌幅', '涨跌额', '成交量(手)',
-                    '成交额', '振幅', '最高', '最低', '今开', '昨收'
-                ]
-                
-                # 提取数据行
-                rows = []
-                for stock in stock_list:
-                    row = [
-                        stock.get('f12', ''),  # 代码
-                        stock.get('f14', ''),  # 名称
-                        stock.get('f2', ''),   # 最新价
-                        f"{stock.get('f3', '')}%",  # 涨跌幅
-                        stock.get('f4', ''),   # 涨跌额
-                        stock.get('f5', ''),   # 成交量(手)
-                        stock.get('f6', ''),   # 成交额
-                        f"{stock.get('f7', '')}%",  # 振幅
-                        stock.get('f15', ''),  # 最高
-                        stock.get('f16', ''),  # 最低
-                        stock.get('f17', ''),  # 今开
-                        stock.get('f18', '')   # 昨收
-                    ]
-                    rows.append(row)
-                    
-                return columns, rows
-                
-            except requests.exceptions.RequestException as e:
-                print(f"请求失败，尝试 {attempt+1}/3: {str(e)}")
-                time.sleep(2)
+        # 重试由共享 HTTP 客户端按指数退避处理
+        stock_list = fetch_stock_list(start_date, end_date)
+        if not stock_list:
+            logger.warning("未获取到有效数据")
+            return [], []
         
-        print("多次尝试后仍失败")
-        return [], []
+        # 按字段定义生成中文表头和数据行
+        columns = [name for key, name, _ in CLIST_SCHEMA if key != 'f124']
+        keys = [key for key, _, _ in CLIST_SCHEMA if key != 'f124']
+        rows = [
+            [f"{stock.get(key, '')}%" if name in PERCENT_COLUMNS else stock.get(key, '')
+             for key, name in zip(keys, columns)]
+            for stock in stock_list
+        ]
+        return columns, rows
         
     except Exception as e:
-        print(f"数据获取失败: {str(e)}")
+        logger.error(f"数据获取失败: {str(e)}")
         return [], []
 
+@timed('parse.clist')
+def parse_quotes(stock_list, ts=None):
+    """
+    将行情列表解析为快照存储的类型化列
+
+    参数：
+    stock_list - 接口返回的 diff 列表
+    ts         - 采集时间（毫秒时间戳），默认为当前时间
+
+    返回：(columns, names)
+    columns - {列名: numpy 数组}，按代码升序；停牌等无值的字段（'-'）为 NaN
+    names   - {6位代码: 名称}
+    """
+    # numpy/pandas 只在快照解析时导入，单次导出CSV时不加载
+    import numpy as np
+    import pandas as pd
+    from snapshot_store import COLUMN_DTYPES
+
+    ts = int(time.time() * 1000) if ts is None else ts
+    frame = pd.DataFrame.from_records(stock_list, columns=[key for key, _ in QUOTE_FIELDS] + ['f14'])
+    frame['f12'] = pd.to_numeric(frame['f12'], errors='coerce')
+    frame = frame[frame['f12'].notna()].sort_values('f12', kind='stable')
+    columns = {'ts': np.full(len(frame), ts, dtype=COLUMN_DTYPES['ts'])}
+    for key, col in QUOTE_FIELDS:
+        values = pd.to_numeric(frame[key], errors='coerce')
+        if COLUMN_DTYPES[col].kind in 'iu':
+            values = values.fillna(0)
+        columns[col] = values.to_numpy(dtype=COLUMN_DTYPES[col])
+    names = {f'{code:06d}': name for code, name in zip(columns['code'], frame['f14'])}
+    return columns, names
+
+def capture_snapshots(interval=5.0, store=None, count=None, fetch=fetch_stock_list):
+    """
+    高频采集全市场行情快照
+
+    每 interval 秒请求一次行情列表，解析为类型化列，只把相对上一次快照新增或变化的行
+    追加到快照存储；重启后从存储中重建当日最新行情继续比较。
+
+    参数：
+    interval - 采集间隔（秒）
+    store    - SnapshotStore，默认 data/snapshots
+    count    - 采集次数，None 表示持续运行
+    fetch    - 返回 diff 列表的函数
+
+    返回：最后一次快照的 {列名: 数组}
+    """
+    from snapshot_store import SnapshotStore, changed_rows, day_of
+
+    store = store or SnapshotStore()
+    previous, previous_day = None, None
+    n = 0
+    while count is None or n < count:
+        started = time.monotonic()
+        try:
+            columns, names = parse_quotes(fetch())
+        except (requests.exceptions.RequestException, ValueError) as e:
+            event('snapshot.fetch_failed', str(e))
+            columns = None
+        if columns is not None and len(columns['code']):
+            day = day_of(int(columns['ts'][0]))
+            if day != previous_day:
+                # 新交易日或刚启动：以存储中当日最新行情为比较基准
+                previous, previous_day = store.snapshot_at(day), day
+            changed = changed_rows(previous, columns)
+            store.append({col: values[changed] for col, values in columns.items()},
+                         {code: names[code] for code in map('{:06d}'.format, columns['code'][changed])})
+            incr('snapshot.captures')
+            incr('snapshot.changed_rows', int(changed.sum()))
+            logger.debug(f"快照写入 day={day} rows={len(changed)} changed={int(changed.sum())}")
+            previous = columns
+        n += 1
+        if count is None or n < count:
+            time.sleep(max(0.0, interval - (time.monotonic() - started)))
+    return previous
+
+@timed('save.csv')
 def save_to_csv(filename, headers, data):
     try:
         with open(filename, 'w', newline='', encoding='utf-8-sig') as f:
             writer = csv.writer(f)
             writer.writerow(headers)
             writer.writerows(data)
-        print(f"数据已保存到 {filename}")
+        logger.info(f"数据已保存到 {filename}")
     except Exception as e:
-        print(f"文件保存失败: {str(e)}")
+        logger.error(f"文件保存失败: {str(e)}")
 
-if __name__ == "__main__":
+def main(argv=None):
     # 添加命令行参数解析
     parser = argparse.ArgumentParser(description='东方财富股票数据下载工具')
     parser.add_argument('-s', '--start', type=str, default='2025-03-01',
@@ -109,8 +228,25 @@ if __name__ == "__main__":
                        help='结束日期（格式：YYYY-MM-DD）')
     parser.add_argument('-o', '--output', type=str,
                        help='输出文件名，默认格式：stock_data_起止日期.csv')
+    parser.add_argument('--capture', action='store_true',
+                       help='高频快照模式：按间隔持续采集，变化的行追加到快照存储')
+    parser.add_argument('--interval', type=float, default=5.0,
+                       help='快照采集间隔（秒）')
+    parser.add_argument('--store', type=str, default='data/snapshots',
+                       help='快照存储目录')
     
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    configure()
+    
+    if args.capture:
+        from snapshot_store import SnapshotStore
+
+        try:
+            capture_snapshots(args.interval, SnapshotStore(args.store))
+        except KeyboardInterrupt:
+            print("快照采集已停止")
+        return
     
     # 验证日期格式
     try:
@@ -130,4 +266,7 @@ if __name__ == "__main__":
         save_to_csv(args.output, headers, data)
         print(f"成功保存 {len(data)} 条记录到 {args.output}")
     else:
-        print("没有获取到有效数据")
\ No newline at end of file
+        print("没有获取到有效数据")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,507 @@
+import os
+import re
+import ast
+import glob
+import threading
+from datetime import datetime
+from functools import lru_cache
+
+import numpy as np
+
+from snapshot_store import CHINESE_NAMES, COLUMN_DTYPES, COLUMN_NAMES, SnapshotStore
+
+# 表达式中可用的列名：快照存储的英文列名、中文列名（'涨跌幅(%)'）及去掉括号后缀的写法（'涨跌幅'，
+# 与 s1 导出的CSV表头一致）；含括号等符号的列名需用反引号括起，如 `成交量(手)` > 1e6
+COLUMN_ALIASES = {}
+for _name in COLUMN_NAMES:
+    for _alias in (_name, CHINESE_NAMES[_name], re.sub(r'\(.*\)$', '', CHINESE_NAMES[_name])):
+        COLUMN_ALIASES[_alias] = _name
+COLUMN_ALIASES.update({'名称': 'name', 'name': 'name'})
+
+FUNCTIONS = {'abs': np.abs, 'log': np.log, 'sqrt': np.sqrt}
+BACKTICK = re.compile(r'`([^`]+)`')
+PLAN_CACHE_SIZE = 256
+
+# s1 导出的行情列表CSV stock_data_*.csv
+QUOTE_CSV = 'stock_data_*.csv'
+
+
+class Plan:
+    """
+    编译后的表达式
+
+    func(columns) 返回布尔掩码（筛选条件）或数值数组（排序键）；columns 为表达式引用的存储列名。
+    运算时的类型错误（如名称与数字比较）转为 ValueError，与编译错误一样按无效表达式处理。
+    """
+
+    def __init__(self, text, func, columns):
+        self.text = text
+        self.func = func
+        self.columns = columns
+
+    def __call__(self, columns):
+        try:
+            return self.func(columns)
+        except TypeError as e:
+            raise ValueError(f"表达式类型不匹配: {self.text}（{e}）") from None
+
+    def __repr__(self):
+        return f'Plan({self.text!r})'
+
+
+def _compare(op):
+    return {
+        ast.Gt: np.greater, ast.GtE: np.greater_equal, ast.Lt: np.less,
+        ast.LtE: np.less_equal, ast.Eq: np.equal, ast.NotEq: np.not_equal,
+    }[type(op)]
+
+
+def _arith(op):
+    return {
+        ast.Add: np.add, ast.Sub: np.subtract, ast.Mult: np.multiply,
+        ast.Div: np.divide, ast.Pow: np.power, ast.BitAnd: np.logical_and, ast.BitOr: np.logical_or,
+    }[type(op)]
+
+
+def _constant_for(column, value):
+    """字符串常量按所比较的列转换类型：代码转为整数，名称保持字符串"""
+    if isinstance(value, str) and column == 'code':
+        return int(value)
+    return value
+
+
+class _Compiler:
+    """把受限的 Python 表达式 AST 编译为对列数组的函数闭包，不使用 eval"""
+
+    def __init__(self, quoted):
+        self.quoted = quoted
+        self.columns = set()
+
+    def compile(self, node):
+        method = getattr(self, 'visit_' + type(node).__name__, None)
+        if method is None:
+            raise ValueError(f"不支持的表达式: {ast.dump(node)[:60]}")
+        return method(node)
+
+    def visit_Expression(self, node):
+        return self.compile(node.body)
+
+    def visit_Name(self, node):
+        name = self.quoted.get(node.id, node.id)
+        column = COLUMN_ALIASES.get(name)
+        if column is None:
+            raise ValueError(f"未知的列: {name}")
+        self.columns.add(column)
+        return lambda cols: cols[column]
+
+    def visit_Constant(self, node):
+        if not isinstance(node.value, (int, float, str)) or isinstance(node.value, bool):
+            raise ValueError(f"不支持的常量: {node.value!r}")
+        value = node.value
+        return lambda cols: value
+
+    def _operand(self, node, other):
+        """比较的一侧；字符串常量按另一侧的列转换"""
+        if isinstance(node, ast.Constant) and isinstance(other, ast.Name):
+            column = COLUMN_ALIASES.get(self.quoted.get(other.id, other.id))
+            value = _constant_for(column, node.value)
+            return lambda cols: value
+        return self.compile(node)
+
+    def visit_Compare(self, node):
+        operands = [node.left] + node.comparators
+        parts = []
+        for op, left, right in zip(node.ops, operands, operands[1:]):
+            lhs, rhs, func = self._operand(left, right), self._operand(right, left), _compare(op)
+            parts.append(lambda cols, lhs=lhs, rhs=rhs, func=func: func(lhs(cols), rhs(cols)))
+        if len(parts) == 1:
+            return parts[0]
+        return lambda cols: np.logical_and.reduce([part(cols) for part in parts])
+
+    def visit_BoolOp(self, node):
+        parts = [self.compile(value) for value in node.values]
+        reduce = np.logical_and.reduce if isinstance(node.op, ast.And) else np.logical_or.reduce
+        return lambda cols: reduce([part(cols) for part in parts])
+
+    def visit_UnaryOp(self, node):
+        operand = self.compile(node.operand)
+        if isinstance(node.op, (ast.Not, ast.Invert)):
+            return lambda cols: np.logical_not(operand(cols))
+        if isinstance(node.op, ast.USub):
+            return lambda cols: np.negative(operand(cols))
+        if isinstance(node.op, ast.UAdd):
+            return operand
+        raise ValueError("不支持的一元运算")
+
+    def visit_BinOp(self, node):
+        try:
+            func = _arith(node.op)
+        except KeyError:
+            raise ValueError("不支持的运算符") from None
+        left, right = self.compile(node.left), self.compile(node.right)
+
+        def evaluate(cols):
+            with np.errstate(divide='ignore', invalid='ignore'):
+                return func(left(cols), right(cols))
+        return evaluate
+
+    def visit_Call(self, node):
+        if not isinstance(node.func, ast.Name) or node.func.id not in FUNCTIONS or len(node.args) != 1 or node.keywords:
+            raise ValueError(f"只支持函数: {', '.join(FUNCTIONS)}")
+        func, arg = FUNCTIONS[node.func.id], self.compile(node.args[0])
+
+        def evaluate(cols):
+            with np.errstate(divide='ignore', invalid='ignore'):
+                return func(arg(cols))
+        return evaluate
+
+
+@lru_cache(maxsize=PLAN_CACHE_SIZE)
+def compile_expression(text):
+    """
+    编译筛选条件或排序表达式，按表达式文本缓存编译结果
+
+    支持：比较（可连写，如 0 < 涨跌幅 < 5）、and/or/not（及 & | ~）、+ - * / **、
+    abs/log/sqrt；列名见 COLUMN_ALIASES，含括号的列名用反引号括起。表达式不合法时抛出 ValueError。
+    """
+    quoted = {}
+
+    def quote(match):
+        placeholder = f'_col{len(quoted)}'
+        quoted[placeholder] = match.group(1)
+        return placeholder
+
+    source = BACKTICK.sub(quote, text.strip())
+    try:
+        tree = ast.parse(source, mode='eval')
+    except SyntaxError as e:
+        raise ValueError(f"表达式语法错误: {e.msg}") from None
+    compiler = _Compiler(quoted)
+    func = compiler.compile(tree)
+    return Plan(text, func, frozenset(compiler.columns))
+
+
+class Universe:
+    """
+    某一时刻的全市场截面：{存储列名: 数组}，按代码升序；name 列为股票名称
+
+    参数：
+    columns - 至少包含 code 列
+    ts      - 截面对应的毫秒时间戳（CSV 来源为 None）
+    """
+
+    def __init__(self, columns, ts=None):
+        self.columns = columns
+        self.ts = ts
+
+    def __len__(self):
+        return len(self.columns['code'])
+
+    def evaluate(self, plan):
+        """对每只股票求表达式的值，标量结果广播为整列"""
+        missing = plan.columns - set(self.columns)
+        if missing:
+            raise ValueError(f"数据源缺少列: {', '.join(sorted(missing))}")
+        values = plan(self.columns)
+        return np.broadcast_to(np.asarray(values), (len(self),))
+
+    def screen(self, where=None, sort=None, limit=50, ascending=False):
+        """
+        按条件筛选并按排序表达式取前 limit 名
+
+        参数：
+        where     - 筛选条件表达式，None 表示全部股票
+        sort      - 排序表达式，None 时按代码升序；值为 NaN 的股票排在最后
+        limit     - 返回条数，None 表示不限
+        ascending - 排序方向，默认从大到小
+
+        返回：(行号数组, 满足条件的股票数)
+        """
+        mask = np.ones(len(self), dtype=bool) if not where else self.evaluate(compile_expression(where))
+        if mask.dtype != bool:
+            raise ValueError("筛选条件必须是比较或逻辑表达式")
+        index = np.flatnonzero(mask)
+        total = len(index)
+        if sort:
+            keys = np.asarray(self.evaluate(compile_expression(sort))[index], dtype=float)
+            keys = keys if ascending else -keys
+            keys = np.where(np.isnan(keys), np.inf, keys)
+            if limit is not None and limit < len(index):
+                # 只对前 limit 名部分排序
+                part = np.argpartition(keys, limit)[:limit]
+                index = index[part[np.argsort(keys[part], kind='stable')]]
+            else:
+                index = index[np.argsort(keys, kind='stable')]
+        elif limit is not None:
+            index = index[:limit]
+        return index, total
+
+    def frame(self, index, columns=None):
+        """行号对应的股票转为 DataFrame（中文表头，代码为6位字符串，缺失值为 None）"""
+        import pandas as pd
+
+        names = [COLUMN_ALIASES[c] if c in COLUMN_ALIASES else c for c in columns] if columns else \
+            ['code', 'name'] + [c for c in COLUMN_NAMES if c not in ('ts', 'code') and c in self.columns]
+        unknown = [c for c in names if c not in self.columns]
+        if unknown:
+            raise ValueError(f"数据源缺少列: {', '.join(unknown)}")
+        frame = pd.DataFrame({CHINESE_NAMES.get(c, '名称'): self.columns[c][index] for c in names})
+        if 'code' in names:
+            frame[CHINESE_NAMES['code']] = [f'{code:06d}' for code in self.columns['code'][index]]
+        return frame.astype(object).where(frame.notna(), None)
+
+
+def _names_for(codes, names):
+    """按代码数组查名称，每个不同代码只查一次"""
+    if not len(codes):
+        return np.empty(0, dtype=object)
+    unique, inverse = np.unique(codes, return_inverse=True)
+    return np.array([names.get(f'{code:06d}', '') for code in unique], dtype=object)[inverse]
+
+
+def _last_per_code(columns):
+    """按时间顺序排列的记录中每只股票的最后一行，按代码升序"""
+    reversed_codes = columns['code'][::-1]
+    codes, first = np.unique(reversed_codes, return_index=True)
+    last = len(reversed_codes) - 1 - first
+    return {col: values[last] for col, values in columns.items()}
+
+
+class DayIndex:
+    """
+    单个交易日变化记录的按代码分组索引，用于在任意时刻快速重建截面
+
+    记录按代码稳定排序后，每只股票的行保持采集时间顺序；某一时刻的截面为每组中原始行号
+    小于该时刻行数的最后一行，用 maximum.reduceat 一次求出，不必每次重新排序。
+    建立索引后新追加的行作为尾部单独保存，查询时覆盖在索引结果之上；尾部超过
+    索引行数的 1/4（且不少于 REBUILD_ROWS 行）时需要重建索引。
+    """
+
+    REBUILD_ROWS = 50000
+
+    def __init__(self, store, day):
+        self.store = store
+        self.day = day
+        data = self.store.read_rows(self.day)
+        self.base_rows = len(data['ts'])
+        self.ts = data['ts']
+        order = np.argsort(data['code'], kind='stable')
+        codes = data['code'][order]
+        self.order = order
+        self.starts = np.flatnonzero(np.append(True, codes[1:] != codes[:-1])) if len(codes) else np.empty(0, int)
+        self.data = {col: values[order] for col, values in data.items()}
+        self.names = self.store.names(self.day)
+        self.data['name'] = _names_for(self.data['code'], self.names)
+        self.tail = None
+
+    @property
+    def rows(self):
+        return self.base_rows + (len(self.tail['ts']) if self.tail is not None else 0)
+
+    def refresh(self):
+        """
+        读入索引建立后新追加的行
+
+        返回：False 表示尾部过长，应重建索引（查询中的线程仍可安全使用当前索引）
+        """
+        rows = self.store.row_count(self.day)
+        if rows == self.rows:
+            return True
+        if rows - self.base_rows > max(self.base_rows // 4, self.REBUILD_ROWS):
+            return False
+        tail = self.store.read_rows(self.day, self.base_rows, rows)
+        self.names = self.store.names(self.day)
+        tail['name'] = _names_for(tail['code'], self.names)
+        self.tail = tail
+        return True
+
+    def universe(self, ts=None):
+        """截至毫秒时间戳 ts（含）的全市场截面，ts 为 None 时为当日最新"""
+        hi = self.base_rows if ts is None else int(np.searchsorted(self.ts, ts, side='right'))
+        if len(self.starts):
+            position = np.where(self.order < hi, np.arange(len(self.order)), -1)
+            last = np.maximum.reduceat(position, self.starts)
+            last = last[last >= 0]
+            columns = {col: values[last] for col, values in self.data.items()}
+        else:
+            columns = {col: np.empty(0, dtype=values.dtype) for col, values in self.data.items()}
+        if self.tail is not None:
+            end = len(self.tail['ts']) if ts is None else int(np.searchsorted(self.tail['ts'], ts, side='right'))
+            if end:
+                # 尾部的最新记录覆盖索引中的同一股票
+                recent = _last_per_code({col: values[:end] for col, values in self.tail.items()})
+                columns = _last_per_code({col: np.concatenate([columns[col], recent[col]]) for col in columns})
+        return Universe(columns, ts)
+
+    def first_matches(self, where):
+        """
+        当日每只股票第一次满足条件的时刻
+
+        返回：(代码数组, 毫秒时间戳数组)，按代码升序
+        """
+        plan = compile_expression(where)
+        codes, times = [], []
+        for data in (self.data, self.tail):
+            if data is None or not len(data['ts']):
+                continue
+            mask = np.broadcast_to(np.asarray(plan(data)), (len(data['ts']),))
+            codes.append(data['code'][mask])
+            times.append(data['ts'][mask])
+        if not codes:
+            return np.empty(0, dtype=COLUMN_DTYPES['code']), np.empty(0, dtype=COLUMN_DTYPES['ts'])
+        codes, times = np.concatenate(codes), np.concatenate(times)
+        order = np.lexsort((times, codes))
+        codes, first = np.unique(codes[order], return_index=True)
+        return codes, times[order][first]
+
+
+def load_quote_csv(path):
+    """读取 s1 导出的行情列表CSV为截面（百分号字符串转为数值）"""
+    import pandas as pd
+
+    df = pd.read_csv(path, dtype={'代码': str}, encoding='utf-8-sig')
+    columns = {}
+    for header in df.columns:
+        column = COLUMN_ALIASES.get(header)
+        if column is None:
+            continue
+        if column == 'name':
+            columns[column] = df[header].astype(str).to_numpy(dtype=object)
+            continue
+        values = pd.to_numeric(df[header].astype(str).str.rstrip('%'), errors='coerce')
+        if COLUMN_DTYPES[column].kind in 'iu':
+            values = values.fillna(0)
+        columns[column] = values.to_numpy(dtype=COLUMN_DTYPES[column])
+    order = np.argsort(columns['code'], kind='stable')
+    return Universe({col: values[order] for col, values in columns.items()})
+
+
+class ScreenSource:
+    """
+    筛选数据源
+
+    优先使用快照存储（支持按时刻截面和当日首次满足条件的查询），没有快照时使用
+    目录中最新的 stock_data_*.csv。每个交易日的分组索引和CSV截面按数据版本缓存。
+    """
+
+    def __init__(self, store=None, csv_dirs=()):
+        self.store = store
+        self.csv_dirs = csv_dirs
+        self._indexes = {}
+        self._csv = None
+        self._lock = threading.Lock()
+
+    def days(self):
+        return self.store.days() if self.store is not None else []
+
+    def day_index(self, day=None):
+        """交易日的分组索引，day 为 None 时取最新交易日"""
+        days = self.days()
+        if not days:
+            if day:
+                raise KeyError(day)
+            return None
+        day = day or days[-1]
+        if day not in days:
+            raise KeyError(day)
+        with self._lock:
+            index = self._indexes.get(day)
+            if index is None or not index.refresh():
+                index = self._indexes[day] = DayIndex(self.store, day)
+            return index
+
+    def latest_csv(self):
+        paths = [p for d in self.csv_dirs for p in glob.glob(os.path.join(d, QUOTE_CSV))]
+        return max(paths, key=os.path.getmtime) if paths else None
+
+    def csv_universe(self):
+        path = self.latest_csv()
+        if path is None:
+            raise KeyError('没有可用的行情数据')
+        version = (path, os.path.getmtime(path))
+        with self._lock:
+            if self._csv is None or self._csv[0] != version:
+                self._csv = (version, load_quote_csv(path))
+            return self._csv
+
+    def resolve(self, day=None, ts=None):
+        """
+        返回 (数据版本, 交易日索引或 None, 截面构造函数)
+
+        数据版本可作为结果缓存的键；截面在调用构造函数时才计算，缓存命中时不必重建
+        """
+        index = self.day_index(day)
+        if index is None:
+            version, universe = self.csv_universe()
+            return version, None, lambda: universe
+        return ('snapshot', index.day, index.rows, ts), index, lambda: index.universe(ts)
+
+    def universe(self, day=None, ts=None):
+        return self.resolve(day, ts)[2]()
+
+
+def parse_time(day, text):
+    """时刻参数转为毫秒时间戳：毫秒时间戳原样返回，'HH:MM' 或 'HH:MM:SS' 按交易日 YYYYMMDD 的本地时间换算"""
+    if text is None or text == '':
+        return None
+    if text.isdigit():
+        return int(text)
+    value = text if text.count(':') == 2 else text + ':00'
+    try:
+        moment = datetime.strptime(f'{day} {value}', '%Y%m%d %H:%M:%S')
+    except ValueError:
+        raise ValueError(f"时刻格式应为 HH:MM[:SS] 或毫秒时间戳: {text}") from None
+    return int(moment.timestamp() * 1000)
+
+
+def open_source(data_dir='data', csv_dirs=None):
+    """data/snapshots 快照存储 + data 目录和当前目录下的行情列表CSV"""
+    return ScreenSource(SnapshotStore(os.path.join(data_dir, 'snapshots')), csv_dirs or (data_dir, '.'))
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description='全市场截面筛选')
+    parser.add_argument('where', nargs='?', help="筛选条件，如 '涨跌幅 > 5 and 成交额 > 1e8'")
+    parser.add_argument('--sort', help='排序表达式，默认按代码')
+    parser.add_argument('--asc', action='store_true', help='从小到大排序')
+    parser.add_argument('--limit', type=int, default=20)
+    parser.add_argument('--day', help='快照交易日 YYYYMMDD，默认最新')
+    parser.add_argument('--at', help='快照时刻 HH:MM[:SS]，默认最新')
+    parser.add_argument('--first', action='store_true', help='列出当日每只股票首次满足条件的时刻')
+    parser.add_argument('--data-dir', default='data')
+    args = parser.parse_args(argv)
+    # 表达式不合法时给出用法提示退出，而不是打印异常堆栈
+    try:
+        for text in (args.where, args.sort):
+            if text:
+                compile_expression(text)
+    except ValueError as e:
+        parser.error(f'表达式无效: {e}')
+
+    source = open_source(args.data_dir)
+    if args.first:
+        index = source.day_index(args.day)
+        if index is None or not args.where:
+            parser.error('--first 需要快照数据和筛选条件')
+        try:
+            codes, times = index.first_matches(args.where)
+        except ValueError as e:
+            parser.error(str(e))
+        for code, ts in sorted(zip(codes, times), key=lambda item: item[1])[:args.limit]:
+            moment = datetime.fromtimestamp(ts / 1000).strftime('%H:%M:%S')
+            print(f"{code:06d} {index.names.get(f'{code:06d}', ''):<8} {moment}")
+        return
+    index = source.day_index(args.day)
+    universe = source.universe(args.day, parse_time(index.day if index else args.day, args.at))
+    try:
+        rows, total = universe.screen(args.where, args.sort, args.limit, args.asc)
+    except ValueError as e:
+        parser.error(str(e))
+    print(universe.frame(rows).to_string(index=False))
+    print(f"满足条件 {total} 只，显示 {len(rows)} 只")
+
+
+if __name__ == '__main__':
+    main()
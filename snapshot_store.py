@@ -0,0 +1,200 @@
+import os
+import json
+from datetime import datetime
+
+import numpy as np
+
+from instrumentation import timed
+
+# 行情快照字段定义：(中文列名, 存储文件名, dtype)
+# ts 为采集时间（毫秒时间戳），code 为数字形式的股票代码，其余与 s1 的行情列表一一对应
+SNAPSHOT_FIELDS = [
+    ('采集时间', 'ts', np.int64),
+    ('代码', 'code', np.int32),
+    ('最新价', 'price', np.float64),
+    ('涨跌幅(%)', 'pct_chg', np.float64),
+    ('涨跌额', 'chg', np.float64),
+    ('成交量(手)', 'volume', np.float64),
+    ('成交额', 'amount', np.float64),
+    ('振幅(%)', 'amplitude', np.float64),
+    ('最高', 'high', np.float64),
+    ('最低', 'low', np.float64),
+    ('今开', 'open', np.float64),
+    ('昨收', 'prev_close', np.float64),
+    ('更新时间', 'updated', np.int64),     # 行情源的更新时间（秒级时间戳）
+]
+
+COLUMN_NAMES = [name for _, name, _ in SNAPSHOT_FIELDS]
+COLUMN_DTYPES = {name: np.dtype(dtype) for _, name, dtype in SNAPSHOT_FIELDS}
+CHINESE_NAMES = {name: cn for cn, name, _ in SNAPSHOT_FIELDS}
+# 判断行情是否变化时比较的列（不含采集时间）
+VALUE_COLUMNS = [name for name in COLUMN_NAMES if name not in ('ts', 'code')]
+
+
+def day_of(ts):
+    """毫秒时间戳所在的交易日 YYYYMMDD 字符串"""
+    return datetime.fromtimestamp(ts / 1000).strftime('%Y%m%d')
+
+
+def changed_rows(previous, current):
+    """
+    返回 current 中相对 previous 新出现或任一行情字段变化的行掩码
+
+    参数：
+    previous/current - {列名: 数组}，按 code 升序排列；previous 可为 None
+    """
+    n = len(current['code'])
+    if previous is None or not len(previous['code']):
+        return np.ones(n, dtype=bool)
+    pos = np.searchsorted(previous['code'], current['code'])
+    pos_clipped = np.minimum(pos, len(previous['code']) - 1)
+    changed = previous['code'][pos_clipped] != current['code']
+    for col in VALUE_COLUMNS:
+        old, new = previous[col][pos_clipped], current[col]
+        differ = old != new
+        if new.dtype.kind == 'f':
+            # NaN 与 NaN 视为相同
+            differ &= ~(np.isnan(old) & np.isnan(new))
+        changed |= differ
+    return changed
+
+
+class SnapshotStore:
+    """
+    全市场行情快照的按日列式存储
+
+    目录结构：{root}/{YYYYMMDD}/{column}.bin，每列一个定长二进制文件，行按采集时间追加；
+    {root}/{YYYYMMDD}/names.json 保存当日出现过的代码与名称。只写入相对上一次快照
+    发生变化的行（整行写入），某一时刻的全市场行情为截至该时刻每只股票的最后一行。
+    """
+
+    def __init__(self, root='data/snapshots'):
+        self.root = root
+
+    def _day_dir(self, day):
+        return os.path.join(self.root, str(day))
+
+    def _column_path(self, day, column):
+        return os.path.join(self._day_dir(day), f'{column}.bin')
+
+    def days(self):
+        """返回已存储的全部交易日"""
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(day for day in os.listdir(self.root) if os.path.isfile(self._column_path(day, 'ts')))
+
+    def row_count(self, day):
+        path = self._column_path(day, 'ts')
+        if not os.path.isfile(path):
+            return 0
+        return os.path.getsize(path) // COLUMN_DTYPES['ts'].itemsize
+
+    def _map_column(self, day, column, rows):
+        if rows == 0:
+            return np.empty(0, dtype=COLUMN_DTYPES[column])
+        return np.memmap(self._column_path(day, column), dtype=COLUMN_DTYPES[column], mode='r', shape=(rows,))
+
+    def names(self, day):
+        """当日 {代码: 名称}"""
+        path = os.path.join(self._day_dir(day), 'names.json')
+        if not os.path.isfile(path):
+            return {}
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+
+    def _update_names(self, day, names):
+        known = self.names(day)
+        if all(known.get(code) == name for code, name in names.items()):
+            return
+        known.update(names)
+        path = os.path.join(self._day_dir(day), 'names.json')
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(known, f, ensure_ascii=False)
+        os.replace(path + '.tmp', path)
+
+    @timed('save.snapshot')
+    def append(self, columns, names=None):
+        """
+        追加一批行（通常为一次快照中变化的行）
+
+        参数：
+        columns - {列名: 数组}，必须包含全部字段，ts 须属于同一交易日且不早于已有数据
+        names   - {6位代码字符串: 名称}，可选
+
+        返回：写入后的当日总行数
+        """
+        missing = set(COLUMN_NAMES) - set(columns)
+        if missing:
+            raise KeyError(f"缺少快照字段: {sorted(missing)}")
+        n = len(columns['ts'])
+        if not n:
+            return 0
+        day = day_of(int(columns['ts'][0]))
+        os.makedirs(self._day_dir(day), exist_ok=True)
+        if names:
+            self._update_names(day, names)
+        # 采集时间列最后写入：中途失败时以 ts 的长度为准，其余列多出的部分被忽略
+        rows = self.row_count(day)
+        for col in COLUMN_NAMES[1:] + COLUMN_NAMES[:1]:
+            values = np.ascontiguousarray(columns[col], dtype=COLUMN_DTYPES[col])
+            with open(self._column_path(day, col), 'ab') as f:
+                # 截掉上次中断留下的多余数据（含 ts 列末尾不完整的一条），使各列与 ts 列对齐
+                f.truncate(rows * COLUMN_DTYPES[col].itemsize)
+                f.seek(0, os.SEEK_END)
+                values.tofile(f)
+        return rows + n
+
+    def read(self, day, code=None, start=None, end=None, columns=None):
+        """
+        读取当日的变化记录
+
+        参数：
+        day        - 交易日 YYYYMMDD
+        code       - 股票代码（字符串或整数），None 表示全部股票
+        start/end  - 毫秒时间戳范围（含），None 表示不限
+        columns    - 需要读取的列，默认全部
+
+        返回：{列名: 数组}，按采集时间升序
+        """
+        columns = columns or COLUMN_NAMES
+        rows = self.row_count(day)
+        ts = self._map_column(day, 'ts', rows)
+        lo = 0 if start is None else int(np.searchsorted(ts, start, side='left'))
+        hi = rows if end is None else int(np.searchsorted(ts, end, side='right'))
+        if code is None:
+            return {col: np.array(self._map_column(day, col, rows)[lo:hi]) for col in columns}
+        index = lo + np.flatnonzero(self._map_column(day, 'code', rows)[lo:hi] == int(code))
+        return {col: self._map_column(day, col, rows)[index] for col in columns}
+
+    def read_rows(self, day, lo=0, hi=None, columns=None):
+        """按行号区间 [lo, hi) 读取当日记录（hi 为 None 时读到末尾），用于增量处理新追加的行"""
+        columns = columns or COLUMN_NAMES
+        rows = self.row_count(day)
+        hi = rows if hi is None else min(hi, rows)
+        return {col: np.array(self._map_column(day, col, rows)[lo:hi]) for col in columns}
+
+    def snapshot_at(self, day, ts=None):
+        """
+        重建某一时刻的全市场行情：每只股票截至 ts 的最后一条记录，按代码升序
+
+        ts 为 None 时返回当日最新行情
+        """
+        data = self.read(day, end=ts)
+        if not len(data['code']):
+            return data
+        # 稳定排序后每个代码的最后一行即最新记录
+        order = np.argsort(data['code'], kind='stable')
+        codes = data['code'][order]
+        last = np.flatnonzero(np.append(codes[1:] != codes[:-1], True))
+        return {col: values[order][last] for col, values in data.items()}
+
+    def history_frame(self, day, code, start=None, end=None):
+        """读取单只股票当日的行情变化为 DataFrame（中文表头，采集时间为时间类型）"""
+        import pandas as pd
+
+        data = self.read(day, code, start, end)
+        frame = pd.DataFrame({CHINESE_NAMES[col]: values for col, values in data.items() if col != 'code'})
+        # 毫秒时间戳转为本地时间
+        local = datetime.now().astimezone().tzinfo
+        frame['采集时间'] = pd.to_datetime(frame['采集时间'], unit='ms', utc=True).dt.tz_convert(local).dt.tz_localize(None)
+        return frame
@@ -1,10 +1,53 @@
 import os
+import io
 import requests
+import numpy as np
 import pandas as pd
 import time
 from datetime import datetime
+from itertools import repeat
+from http_client import default_client
+from instrumentation import event, incr, timed
+from kline_store import KLineStore, COLUMN_NAMES, COLUMN_DTYPES, columns_to_frame
 
-def get_eastmoney_stock_data(stock_code='600519', start_date='20200101', end_date=None):
+KLINE_URL = "http://push2his.eastmoney.com/api/qt/stock/kline/get"
+
+def build_kline_params(stock_code, start_date, end_date):
+    """构造K线接口请求参数"""
+    # 验证股票代码
+    if len(stock_code) != 6 or not stock_code.isdigit():
+        raise ValueError("股票代码必须为6位数字")
+    
+    return {
+        'secid': f"{'1' if stock_code.startswith('6') else '0'}.{stock_code}",
+        'ut': '7eea3edcaed734bea9cbfc24409ed989',
+        'fields1': 'f1,f2,f3,f4,f5,f6',
+        'fields2': 'f51,f52,f53,f54,f55,f56,f57,f58,f59,f60,f61',
+        'klt': '101',  # 日k线
+        'fqt': '1',     # 前复权
+        'beg': start_date,
+        'end': end_date,
+        'lmt': '100000',
+        '_': int(time.time() * 1000)
+    }
+
+def fetch_klines(stock_code, start_date, end_date, client=None, url=KLINE_URL, timeout=None):
+    """
+    请求K线接口，返回原始 klines 字符串列表
+    
+    股票代码不存在时返回 None；重试耗尽后抛出 requests 异常
+    client 为共享 HTTP 客户端（默认 http_client.default_client()），url 可指向本地测试服务
+    """
+    params = build_kline_params(stock_code, start_date, end_date)
+    response = (client or default_client()).get(url, params=params, endpoint='kline', timeout=timeout)
+    
+    data = response.json()
+    if data['data'] is None:
+        return None
+    return data['data']['klines'] or []
+
+def get_eastmoney_stock_data(stock_code='600519', start_date='20200101', end_date=None,
+                             store=None, save_csv=False):
     """
     从东方财富API获取股票历史行情数据并保存到data目录
     
@@ -12,6 +55,8 @@ def get_eastmoney_stock_data(stock_code='600519', start_date='20200101', end_dat
     stock_code - 6位股票代码(例如：'600519'茅台)
     start_date - 起始日期(格式：YYYYMMDD)
     end_date   - 结束日期(默认当前日期)
+    store      - K线列式存储(默认 data/kline)，数据按日期去重追加
+    save_csv   - 是否额外导出 data/stock_{code}_{start}_{end}.csv
     """
     # 创建data目录
     os.makedirs('data', exist_ok=True)
@@ -23,45 +68,33 @@ def get_eastmoney_stock_data(stock_code='600519', start_date='20200101', end_dat
     if len(stock_code) != 6 or not stock_code.isdigit():
         raise ValueError("股票代码必须为6位数字")
     
-    # 构造请求参数
-    url = "http://push2his.eastmoney.com/api/qt/stock/kline/get"
-    params = {
-        'secid': f"{'1' if stock_code.startswith('6') else '0'}.{stock_code}",
-        'ut': '7eea3edcaed734bea9cbfc24409ed989',
-        'fields1': 'f1,f2,f3,f4,f5,f6',
-        'fields2': 'f51,f52,f53,f54,f55,f56,f57,f58,f59,f60,f61',
-        'klt': '101',  # 日k线
-        'fqt': '1',     # 前复权
-        'beg': start_date,
-        'end': end_date,
-        'lmt': '100000',
-        '_': int(time.time() * 1000)
-    }
-    
     try:
         print(f"正在获取 {stock_code} [{start_date}-{end_date}] 历史数据...")
-        response = requests.get(url, params=params)
-        response.raise_for_status()
-        
-        data = response.json()
+        klines = fetch_klines(stock_code, start_date, end_date)
         
-        if data['data'] is None:
+        if klines is None:
             print(f"未获取到数据，请检查股票代码 {stock_code} 是否存在")
             return False
             
-        # 解析数据
-        klines = data['data']['klines']
         if not klines:
             print("该时间范围内无可用数据")
             return False
             
-        # 转换为DataFrame
-        df = pd.DataFrame([parse_kline_item(item) for item in klines])
+        # 批量解析为列数组
+        columns, errors = parse_klines(klines)
+        if errors:
+            print(f"{stock_code} 有 {len(errors)} 条K线格式错误已跳过，例如: {errors[0]}")
         
-        # 保存文件
-        filename = f"data/stock_{stock_code}_{start_date}_{end_date}.csv"
-        df.to_csv(filename, index=False, encoding='utf_8_sig')
-        print(f"数据已保存至 {filename}")
+        # 追加到列式存储（按日期去重）
+        store = store or KLineStore()
+        rows = store.append(stock_code, columns)
+        print(f"数据已写入 {store.root}/{stock_code}，共 {rows} 条K线")
+        
+        # 按需导出CSV
+        if save_csv:
+            filename = f"data/stock_{stock_code}_{start_date}_{end_date}.csv"
+            columns_to_frame(columns).to_csv(filename, index=False, encoding='utf_8_sig')
+            print(f"数据已保存至 {filename}")
         return True
         
     except requests.exceptions.RequestException as e:
@@ -70,6 +103,114 @@ def get_eastmoney_stock_data(stock_code='600519', start_date='20200101', end_dat
         print(f"数据处理出错: {str(e)}")
     return False
 
+def sync_symbol(stock_code, store, start_date='20200101', end_date=None,
+                fetch=None, tolerance=1e-6):
+    """
+    增量同步单只股票的K线（出错时抛出异常，供批量下载器复用）
+    
+    请求从倒数第二条已存K线开始，与存储重叠两根K线：
+    - 倒数第二根为已收盘数据，若价格与存储不一致，说明前复权(fqt=1)因除权除息
+      发生了变化，此时全量重新获取并整体替换该股票的存储
+    - 最后一根可能是盘中未收盘数据，按日期去重直接覆盖
+    
+    参数：
+    stock_code - 6位股票代码
+    store      - K线列式存储
+    start_date - 无存储数据或需要全量重建时的起始日期(格式：YYYYMMDD)
+    end_date   - 结束日期(默认当前日期)
+    fetch      - 获取函数 fetch(stock_code, start_date, end_date)，默认 fetch_klines
+    tolerance  - 判断重叠K线价格是否一致的绝对误差
+    
+    返回：新增的K线条数；股票代码不存在时返回 None
+    """
+    fetch = fetch or fetch_klines
+    end_date = end_date or datetime.now().strftime("%Y%m%d")
+    
+    stored_dates = store.dates(stock_code)
+    if len(stored_dates) == 0:
+        # 首次同步：全量获取
+        klines = fetch(stock_code, start_date, end_date)
+        if klines is None:
+            return None
+        if not klines:
+            return 0
+        columns = _parse_checked(stock_code, klines)
+        return store.append(stock_code, columns)
+    
+    check_date = int(stored_dates[-2] if len(stored_dates) > 1 else stored_dates[-1])
+    last_date = int(stored_dates[-1])
+    
+    klines = fetch(stock_code, str(check_date), end_date)
+    if klines is None:
+        return None
+    if not klines:
+        return 0
+    
+    columns = _parse_checked(stock_code, klines)
+    
+    # 检查重叠K线的价格是否与存储一致
+    if _adjustment_changed(store, stock_code, check_date, columns, tolerance):
+        print(f"{stock_code} 前复权价格发生变化，重新获取全部历史数据")
+        full = fetch(stock_code, start_date, end_date)
+        if not full:
+            return None
+        columns = _parse_checked(stock_code, full)
+        store.replace(stock_code, columns)
+    else:
+        store.append(stock_code, columns)
+    
+    return int((store.dates(stock_code) > last_date).sum())
+
+def _parse_checked(stock_code, klines):
+    """解析K线，坏行计数并按汇总周期合并告警，返回列数组"""
+    columns, errors = parse_klines(klines)
+    if errors:
+        incr('parse.kline.bad_rows', len(errors))
+        event('kline.bad_rows', f"{stock_code} 有 {len(errors)} 条K线格式错误已跳过，例如: {errors[0]}")
+    return columns
+
+def sync_stock_data(stock_code='600519', store=None, start_date='20200101', end_date=None,
+                    tolerance=1e-6):
+    """
+    增量同步K线：只请求存储中最后日期之后的数据（规则见 sync_symbol）
+    
+    参数：
+    stock_code - 6位股票代码
+    store      - K线列式存储(默认 data/kline)
+    start_date - 无存储数据或需要全量重建时的起始日期(格式：YYYYMMDD)
+    end_date   - 结束日期(默认当前日期)
+    tolerance  - 判断重叠K线价格是否一致的绝对误差
+    
+    返回：新增的K线条数；失败时返回 None
+    """
+    store = store or KLineStore()
+    try:
+        added = sync_symbol(stock_code, store, start_date, end_date, tolerance=tolerance)
+        if added is None:
+            print(f"未获取到数据，请检查股票代码 {stock_code} 是否存在")
+            return None
+        print(f"{stock_code} 同步完成，新增 {added} 条K线")
+        return added
+        
+    except requests.exceptions.RequestException as e:
+        print(f"网络请求失败: {str(e)}")
+    except Exception as e:
+        print(f"数据处理出错: {str(e)}")
+    return None
+
+def _adjustment_changed(store, stock_code, check_date, columns, tolerance):
+    """比较重叠日期的开高低收，判断前复权价格是否变化"""
+    price_columns = ['open', 'close', 'high', 'low']
+    stored = store.read(stock_code, check_date, check_date, columns=price_columns)
+    fetched = columns['date'] == check_date
+    if len(stored['close']) == 0 or not fetched.any():
+        # 重叠日期缺失（例如停牌数据被修订），无法确认一致性，按变化处理
+        return True
+    return any(
+        abs(float(stored[col][0]) - float(columns[col][fetched][0])) > tolerance
+        for col in price_columns
+    )
+
 def parse_kline_item(item):
     """解析单条K线数据"""
     fields = item.split(',')
@@ -87,7 +228,80 @@ def parse_kline_item(item):
         '换手率(%)': float(fields[10]),
     }
 
+@timed('parse.kline')
+def parse_klines(klines):
+    """
+    批量解析K线字符串列表为定类型的列数组
+    
+    日期由定长字节视图直接换算，数值列拼接为一个字节缓冲区后由 pandas 的
+    C解析器一次性按列解析，不再为每根K线构造字典。字段数不为11、日期格式错误或数值无法解析的行
+    会被跳过并报告，不影响其余数据。
+    
+    返回：(columns, errors)
+    columns - {英文列名: numpy 数组}，日期为 int32 YYYYMMDD
+    errors  - [(行号, 原始字符串, 错误原因)]
+    """
+    errors = []
+    if not klines:
+        return {col: np.empty(0, dtype=COLUMN_DTYPES[col]) for col in COLUMN_NAMES}, errors
+    
+    # 字段数校验：每行应有10个逗号
+    commas = np.fromiter(map(str.count, klines, repeat(',')), dtype=np.int32, count=len(klines))
+    field_ok = commas == len(COLUMN_NAMES) - 1
+    if field_ok.all():
+        index = np.arange(len(klines))
+        lines = klines
+    else:
+        for i in np.flatnonzero(~field_ok):
+            errors.append((int(i), klines[i], '字段数错误'))
+        index = np.flatnonzero(field_ok)
+        lines = [klines[i] for i in index]
+    
+    # 日期校验并向量化转换：取每行前10个字节 'YYYY-MM-DD'，按字节计算为 YYYYMMDD
+    try:
+        chars = np.array(lines, dtype='S10')
+    except UnicodeEncodeError:
+        # 含非ASCII字符的行（如 '停牌'）：非ASCII字符替换为 '?'，在下面的日期校验中报告为坏行
+        chars = np.array([line[:10].encode('ascii', 'replace') for line in lines], dtype='S10')
+    chars = chars.view(np.uint8).reshape(-1, 10)
+    digits = chars[:, [0, 1, 2, 3, 5, 6, 8, 9]].astype(np.int32) - ord('0')
+    valid = ((digits >= 0) & (digits <= 9)).all(axis=1) & (chars[:, 4] == ord('-')) & (chars[:, 7] == ord('-'))
+    dates = (digits * 10 ** np.arange(7, -1, -1, dtype=np.int32)).sum(axis=1).astype(np.int32)
+    for i in np.flatnonzero(~valid):
+        errors.append((int(index[i]), klines[index[i]], '日期格式错误'))
+    
+    # 数值列由C解析器一次性解析，跳过已单独处理的日期列
+    frame = pd.read_csv(
+        io.BytesIO('\n'.join(lines).encode()),
+        header=None,
+        names=COLUMN_NAMES,
+        usecols=COLUMN_NAMES[1:],
+        na_filter=False,
+        engine='c',
+    ) if len(lines) else pd.DataFrame(columns=COLUMN_NAMES[1:])
+    
+    # 数值列：C解析器无法识别的值会留成字符串列，此时逐列强制转换并标记坏行
+    numeric = {}
+    for col in COLUMN_NAMES[1:]:
+        values = frame[col]
+        if values.dtype == object or values.dtype.kind not in 'iuf':
+            values = pd.to_numeric(values, errors='coerce')
+            bad = values.isna().to_numpy() & valid
+            for i in np.flatnonzero(bad):
+                errors.append((int(index[i]), klines[index[i]], f'{col} 数值错误'))
+            valid &= ~values.isna().to_numpy()
+        numeric[col] = values.to_numpy()
+    
+    columns = {'date': dates[valid]}
+    for col in COLUMN_NAMES[1:]:
+        columns[col] = numeric[col][valid].astype(COLUMN_DTYPES[col])
+    errors.sort(key=lambda e: e[0])
+    return columns, errors
+
 if __name__ == '__main__':
     # 示例用法
     get_eastmoney_stock_data('600519', '20200101')  # 茅台
-    get_eastmoney_stock_data('300750', '20230101')  # 宁德时代
\ No newline at end of file
+    get_eastmoney_stock_data('300750', '20230101')  # 宁德时代
+    
+    # 增量同步：只获取存储中最后日期之后的K线
+    sync_stock_data('600519')
\ No newline at end of file
@@ -0,0 +1,11 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+
+def fixture_html(name):
+    with open(os.path.join(FIXTURES, name), encoding='utf-8') as f:
+        return f.read()
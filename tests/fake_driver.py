@@ -0,0 +1,129 @@
+"""
+用静态 HTML 页面模拟 WebDriver，供页面等待和翻页逻辑的测试使用
+
+只实现被测代码用到的接口：get、find_element(s)、execute_script（page_signature 的查询、
+点击和滚动）、page_source。每次页面切换（打开、点击下一页、重新查询）都会生成新的文档，
+之前取得的元素随之失效（StaleElementReferenceException），与真实浏览器重新渲染后的行为一致。
+"""
+import re
+
+from lxml import html as lxml_html
+from selenium.common.exceptions import NoSuchElementException, StaleElementReferenceException
+from selenium.webdriver.common.by import By
+
+SIMPLE_SELECTOR = re.compile(r'^([\w-]*)((?:\.[\w-]+)*)(?::not\(\.([\w-]+)\))?$')
+
+
+def has_class(name):
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+
+def css_to_xpath(selector):
+    """支持 'tag.class'、'.a .b tr'、':not(.class)' 这类简单的后代选择器"""
+    steps = []
+    for token in selector.split():
+        tag, classes, negated = SIMPLE_SELECTOR.match(token).groups()
+        conditions = [has_class(name) for name in classes.split('.')[1:]]
+        if negated:
+            conditions.append(f'not({has_class(negated)})')
+        steps.append((tag or '*') + ''.join(f'[{c}]' for c in conditions))
+    return '//' + '//'.join(steps)
+
+
+class FakeElement:
+    def __init__(self, driver, node):
+        self.driver = driver
+        self.node = node
+        self.generation = driver.generation
+
+    def _check(self):
+        if self.generation != self.driver.generation:
+            raise StaleElementReferenceException('element is not attached to the page document')
+
+    def is_enabled(self):
+        self._check()
+        return True
+
+    def is_displayed(self):
+        self._check()
+        return True
+
+    def get_attribute(self, name):
+        self._check()
+        if name == 'outerHTML':
+            return lxml_html.tostring(self.node, encoding='unicode')
+        return self.node.get(name)
+
+    def click(self):
+        self._check()
+        self.driver.clicks += 1
+        self.driver.navigate(self.driver.index + 1)
+
+
+class FakeDriver:
+    """
+    参数：
+    pages        - 各页 HTML，点击“下一页”切换到下一个
+    render_polls - 点击后经过多少次页面查询才完成渲染，模拟异步刷新
+    """
+
+    def __init__(self, pages, render_polls=0):
+        self.pages = list(pages)
+        self.render_polls = render_polls
+        self.generation = 0
+        self.clicks = 0
+        self.scripts = []
+        self._pending = None
+        self._load(0)
+
+    def _load(self, index):
+        self.index = index
+        self.generation += 1
+        self.doc = lxml_html.fromstring(self.pages[index])
+
+    def navigate(self, index):
+        if self.render_polls:
+            self._pending = [index, self.render_polls]
+        else:
+            self._load(index)
+
+    def _tick(self):
+        if self._pending is not None:
+            self._pending[1] -= 1
+            if self._pending[1] <= 0:
+                index, self._pending = self._pending[0], None
+                self._load(index)
+
+    def get(self, url):
+        self.url = url
+        self._load(0)
+
+    def implicitly_wait(self, seconds):
+        pass
+
+    @property
+    def page_source(self):
+        return lxml_html.tostring(self.doc, encoding='unicode')
+
+    def find_elements(self, by, value):
+        self._tick()
+        selector = '.' + value if by == By.CLASS_NAME else value
+        return [FakeElement(self, node) for node in self.doc.xpath(css_to_xpath(selector))]
+
+    def find_element(self, by, value):
+        found = self.find_elements(by, value)
+        if not found:
+            raise NoSuchElementException(value)
+        return found[0]
+
+    def execute_script(self, script, *args):
+        self.scripts.append(script)
+        if 'querySelectorAll' in script:
+            items = self.find_elements(By.CSS_SELECTOR, args[0])
+            return [items[0], len(items), items[0].node.text_content()] if items else [None, 0, '']
+        if 'arguments[0].click()' in script:
+            args[0].click()
+        elif '.click()' in script:
+            # 查询按钮：按新条件重新渲染当前页
+            self.navigate(self.index)
+        return None
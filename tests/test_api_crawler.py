@@ -0,0 +1,37 @@
+import eastmoney_api_crawler
+from eastmoney_api_crawler import EastmoneyGubaCrawler
+from http_client import EmptyResponse
+
+
+def test_api_is_reprobed_after_cooldown(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(eastmoney_api_crawler.time, 'monotonic', lambda: now[0])
+    crawler = EastmoneyGubaCrawler(api_retry_interval=60)
+    calls = []
+
+    def fetch_api_page(stock_code, page, *args):
+        calls.append(('api', page))
+        if page == 1:
+            raise EmptyResponse('响应体为空')
+        return [{'帖子ID': str(page)}]
+
+    monkeypatch.setattr(crawler, 'fetch_api_page', fetch_api_page)
+    monkeypatch.setattr(crawler, 'fetch_html_page', lambda stock_code, page: calls.append(('html', page)) or [])
+
+    crawler.fetch_page('600519', 1)
+    assert not crawler.api_available
+    now[0] += 59
+    crawler.fetch_page('600519', 2)
+    now[0] += 1
+    assert crawler.fetch_page('600519', 3) == [{'帖子ID': '3'}]
+    assert calls == [('api', 1), ('html', 1), ('html', 2), ('api', 3)]
+    assert crawler.api_available
+
+
+def test_null_post_id_becomes_empty(monkeypatch):
+    crawler = EastmoneyGubaCrawler()
+    body = ('cb({"re": [{"post_id": null, "post_title": "甲", "user_nickname": "a"},'
+            ' {"post_title": "乙", "user_nickname": "b"}]})')
+    monkeypatch.setattr(crawler, '_get_text', lambda *args, **kwargs: body)
+    posts = crawler.fetch_api_page('600519', 1)
+    assert [post['帖子ID'] for post in posts] == ['', '']
@@ -0,0 +1,98 @@
+import pytest
+from selenium.common.exceptions import (InvalidSessionIdException, NoSuchElementException,
+                                        TimeoutException, WebDriverException)
+
+from browser_pool import BrowserPool
+
+
+class StubDriver:
+    def __init__(self):
+        self.window_handles = ['main']
+        self.switch_to = self
+        self.quit_called = False
+        self.crashed = False
+
+    @property
+    def title(self):
+        if self.crashed:
+            raise WebDriverException('chrome not reachable')
+        return ''
+
+    def window(self, handle):
+        pass
+
+    def set_page_load_timeout(self, seconds):
+        pass
+
+    def execute_cdp_cmd(self, cmd, params):
+        pass
+
+    def delete_all_cookies(self):
+        pass
+
+    def execute_script(self, script):
+        pass
+
+    def get(self, url):
+        pass
+
+    def quit(self):
+        self.quit_called = True
+
+
+def make_pool(size=1, **kwargs):
+    drivers = []
+
+    def factory(options):
+        drivers.append(StubDriver())
+        return drivers[-1]
+
+    return BrowserPool(size=size, driver_factory=factory, **kwargs), drivers
+
+
+@pytest.mark.parametrize('error', [NoSuchElementException('.pagenext'), TimeoutException('slow')])
+def test_page_errors_keep_the_warm_browser(error):
+    pool, drivers = make_pool()
+    with pytest.raises(type(error)):
+        with pool.lease():
+            raise error
+    with pool.lease() as driver:
+        assert driver is drivers[0]
+    assert len(drivers) == 1 and not drivers[0].quit_called
+
+
+def test_dead_session_is_replaced():
+    pool, drivers = make_pool()
+    with pytest.raises(InvalidSessionIdException):
+        with pool.lease():
+            raise InvalidSessionIdException('invalid session id')
+    with pytest.raises(WebDriverException):
+        with pool.lease() as driver:
+            driver.crashed = True
+            raise WebDriverException('disconnected')
+    with pool.lease() as driver:
+        assert driver is drivers[2]
+    assert drivers[0].quit_called and drivers[1].quit_called
+
+
+def test_browser_recycled_after_max_leases():
+    pool, drivers = make_pool(max_leases=2)
+    for _ in range(3):
+        with pool.lease():
+            pass
+    assert len(drivers) == 2 and drivers[0].quit_called
+
+
+def test_warm_quits_started_browsers_when_one_fails():
+    drivers = []
+
+    def factory(options):
+        if drivers:
+            raise WebDriverException('chromedriver missing')
+        drivers.append(StubDriver())
+        return drivers[-1]
+
+    pool = BrowserPool(size=2, driver_factory=factory)
+    with pytest.raises(WebDriverException):
+        pool.warm()
+    assert drivers[0].quit_called and pool._created == 0
@@ -0,0 +1,16 @@
+import sys
+
+import pytest
+
+import cli
+
+
+# 最后一个能编译，但在求值时类型不匹配
+@pytest.mark.parametrize('expression', ['涨跌幅 >', '未知列 > 1', '涨跌幅 + 1', '名称 > 5'])
+def test_screen_rejects_invalid_expression_with_usage(expression, capsys, monkeypatch):
+    monkeypatch.setattr(sys, 'argv', ['cli.py'])
+    with pytest.raises(SystemExit) as exc:
+        cli.main(['analyze', 'screen', expression])
+    assert exc.value.code == 2
+    err = capsys.readouterr().err
+    assert err.startswith('usage: cli.py analyze screen') and 'Traceback' not in err
@@ -0,0 +1,118 @@
+from contextlib import contextmanager
+
+import pytest
+from selenium.common.exceptions import TimeoutException
+
+import eastmoney_guba_crawler
+from conftest import fixture_html
+from eastmoney_api_crawler import parse_post_list
+from eastmoney_guba_crawler import BrowserCrawler
+from fake_driver import FakeDriver
+from guba_dedup import IncrementalCollector, SQLiteSeenStore, post_key
+from guba_sink import GubaSink
+from page_waits import Politeness
+
+
+@pytest.fixture
+def seen(tmp_path):
+    store = SQLiteSeenStore(str(tmp_path / 'seen.db'))
+    yield store
+    store.close()
+
+
+@pytest.fixture
+def list_pages():
+    return [parse_post_list(fixture_html('guba_list_page1.html')),
+            parse_post_list(fixture_html('guba_list_page2.html'))]
+
+
+class FakePool:
+    def __init__(self, driver):
+        self.driver = driver
+
+    @contextmanager
+    def lease(self):
+        yield self.driver
+
+    def close(self):
+        pass
+
+
+def test_post_key_ignores_nan_after_dataframe_round_trip():
+    post = {'帖子ID': '', '标题': '标题', '作者': '', '发布时间': '03-28 10:00'}
+    assert post_key(dict(post, 帖子ID=float('nan'), 作者=None)) == post_key(post)
+
+
+def test_collect_does_not_record_until_commit(seen, list_pages):
+    collector = IncrementalCollector(lambda code, page: list_pages[page - 1], seen, max_pages=2)
+    df = collector.collect('600519')
+    assert len(df) == 20 and collector.last_error is None
+    # 未提交前再次采集仍会取回同样的帖子
+    assert seen.cursor('600519') is None and len(collector.collect('600519')) == 20
+
+    collector.commit('600519', df)
+    assert seen.cursor('600519') == 1533853200
+    assert collector.collect('600519').empty
+
+
+def test_collect_keeps_earlier_pages_when_a_page_fails(seen, list_pages):
+    def fetch_page(code, page):
+        if page == 2:
+            raise ConnectionError('连接被重置')
+        return list_pages[0]
+
+    collector = IncrementalCollector(fetch_page, seen, max_pages=3)
+    df = collector.collect('600519')
+    assert len(df) == 10 and '第2页' in collector.last_error
+    assert seen.cursor('600519') is None and seen.new_keys('600519', list(df['帖子ID'])) == list(df['帖子ID'])
+
+
+def test_filter_page_skips_posts_already_collected_in_this_run(seen, list_pages):
+    collector = IncrementalCollector(None, seen)
+    collected = set()
+    first, _ = collector.filter_page('600519', list_pages[0], collected=collected)
+    # 翻页期间有新帖子，上一页末尾的帖子下移到下一页
+    shifted, stop = collector.filter_page('600519', list_pages[0][-3:] + list_pages[1], collected=collected)
+    assert len(first) == 10 and len(shifted) == 10 and not stop
+
+
+def crawler_for(tmp_path, seen, pages):
+    return BrowserCrawler(pool=FakePool(FakeDriver(pages)), min_interval=0, seen=seen,
+                          sink=GubaSink(str(tmp_path / 'guba')))
+
+
+def test_browser_crawl_commits_only_after_flush(tmp_path, seen, monkeypatch):
+    monkeypatch.setattr(Politeness, 'wait', lambda self: None)
+    pages = [fixture_html('guba_list_page1.html'), fixture_html('guba_list_page2.html')]
+    crawler = crawler_for(tmp_path, seen, pages)
+    df = crawler.get_comments('600519', max_pages=2)
+    assert len(df) == 20 and crawler.last_error is None
+    assert seen.cursor('600519') is None
+
+    assert crawler.save_data(df)
+    # 仍在缓冲区中，写盘后才记入
+    assert seen.cursor('600519') is None
+    crawler.sink.flush()
+    assert seen.cursor('600519') == 1533853200
+    assert len(crawler.sink.query('600519')) == 20
+    assert crawler_for(tmp_path, seen, pages).get_comments('600519', max_pages=2).empty
+
+
+def test_browser_crawl_failure_returns_partial_and_keeps_cursor(tmp_path, seen, monkeypatch):
+    monkeypatch.setattr(Politeness, 'wait', lambda self: None)
+
+    def never_renders(*args, **kwargs):
+        raise TimeoutException('列表未刷新')
+
+    monkeypatch.setattr(eastmoney_guba_crawler, 'wait_for_change', never_renders)
+    pages = [fixture_html('guba_list_page1.html'), fixture_html('guba_list_page2.html')]
+    crawler = crawler_for(tmp_path, seen, pages)
+    df = crawler.get_comments('600519', max_pages=2)
+    assert len(df) == 10 and '列表未刷新' in crawler.last_error
+    assert seen.cursor('600519') is None
+
+
+def test_post_key_falls_back_to_content_for_missing_ids():
+    first = {'帖子ID': 'None', '标题': '甲', '作者': 'a', '发布时间': '03-28 10:00'}
+    second = dict(first, 标题='乙')
+    assert post_key(first) != post_key(second) and post_key(first).startswith('h:')
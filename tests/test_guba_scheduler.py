@@ -0,0 +1,136 @@
+import queue
+import socket
+import threading
+import time
+
+import pytest
+
+from conftest import fixture_html
+from eastmoney_api_crawler import EastmoneyGubaCrawler, parse_post_list
+from guba_dedup import SQLiteSeenStore
+from guba_scheduler import GubaScheduler, _worker
+from guba_sink import GubaSink
+
+
+class NoLimit:
+    def acquire(self, url):
+        pass
+
+
+@pytest.fixture
+def sqlite_path(tmp_path):
+    return str(tmp_path / 'seen.db')
+
+
+def test_worker_returns_partial_records_with_error(sqlite_path, monkeypatch):
+    posts = parse_post_list(fixture_html('guba_list_page1.html'))
+
+    def fetch_page(self, stock_code, page, *args):
+        if page == 2:
+            raise ValueError('接口返回结构异常')
+        return [dict(post, 股票代码=stock_code) for post in posts]
+
+    monkeypatch.setattr(EastmoneyGubaCrawler, 'fetch_page', fetch_page)
+    tasks, results = queue.Queue(), queue.Queue()
+    tasks.put(('600519', 0.0))
+    tasks.put(None)
+    _worker(0, tasks, results, NoLimit(), 'http', 3, sqlite_path, {})
+    result = results.get_nowait()
+    assert len(result['records']) == 10 and '第2页' in result['error']
+    # 工作进程不记录去重集合
+    assert SQLiteSeenStore(sqlite_path).cursor('600519') is None
+
+
+def make_result(error=None):
+    records = [dict(post, 股票代码='600519') for post in parse_post_list(fixture_html('guba_list_page1.html'))]
+    return {'code': '600519', 'shard': 0, 'enqueued_at': 0.0, 'started': 0.0, 'finished': 1.0,
+            'records': records, 'error': error}
+
+
+def test_handle_commits_partial_records_after_flush(sqlite_path, tmp_path):
+    sink = GubaSink(str(tmp_path / 'guba'))
+    scheduler = GubaScheduler(['600519'], workers=1, turnover={}, sqlite_path=sqlite_path, on_posts=sink.append)
+    scheduler.shard_depth[0] = 1
+    assert scheduler._handle(make_result('第2页请求失败')) == 10
+    assert '600519' not in scheduler.last_success
+    # 缓冲中的帖子不记入去重集合
+    assert SQLiteSeenStore(sqlite_path).cursor('600519') is None
+    assert sink.flush() == 10
+    assert SQLiteSeenStore(sqlite_path).cursor('600519') == 1533853200
+
+
+def test_handle_does_not_commit_when_on_posts_fails(sqlite_path):
+    def on_posts(code, df, on_persisted):
+        raise OSError('磁盘已满')
+
+    scheduler = GubaScheduler(['600519'], workers=1, turnover={}, sqlite_path=sqlite_path, on_posts=on_posts)
+    scheduler.shard_depth[0] = 1
+    assert scheduler._handle(make_result()) == 0
+    assert scheduler.last_success['600519'] == 1.0
+    assert SQLiteSeenStore(sqlite_path).cursor('600519') is None
+
+
+def test_dead_worker_is_restarted_and_its_stocks_requeued(sqlite_path):
+    # 连接被拒绝的本地端口：每只股票很快以错误结束
+    unreachable = 'http://127.0.0.1:9'
+    scheduler = GubaScheduler(['600519'], workers=1, turnover={}, sqlite_path=sqlite_path, cycle_seconds=60,
+                              crawler_options={'max_retries': 0, 'timeout': 2, 'api_url': unreachable + '/api',
+                                               'list_url': unreachable + '/list,{stock_code}_{page}.html'})
+    try:
+        scheduler.start()
+        worker = scheduler._processes[0]
+        # 进程在采集途中被杀：股票留在 pending 中
+        scheduler.pending['600519'] = 0.0
+        scheduler.shard_depth[0] = 1
+        worker.kill()
+        worker.join(10)
+
+        stats = scheduler.run_cycle()
+        assert scheduler._processes[0] is not worker and scheduler._processes[0].is_alive()
+        assert stats['queued'] == 1 and stats['done'] == 1 and stats['failed'] == 1
+        assert not scheduler.pending and scheduler.shard_depth == [0]
+    finally:
+        scheduler.stop()
+
+
+def test_worker_killed_mid_cycle_is_replaced_within_the_cycle(sqlite_path):
+    # 第一个连接只接受不应答（工作进程卡在请求中），之后的连接立即关闭
+    listener = socket.socket()
+    listener.bind(('127.0.0.1', 0))
+    listener.listen()
+    held = []
+
+    def serve():
+        while True:
+            try:
+                conn, _ = listener.accept()
+            except OSError:
+                return
+            if held:
+                conn.close()
+            else:
+                held.append(conn)
+
+    threading.Thread(target=serve, daemon=True).start()
+    url = f'http://127.0.0.1:{listener.getsockname()[1]}'
+    scheduler = GubaScheduler(['600519'], workers=1, turnover={}, sqlite_path=sqlite_path, cycle_seconds=60,
+                              crawler_options={'max_retries': 0, 'timeout': 30, 'api_url': url + '/api',
+                                               'list_url': url + '/list,{stock_code}_{page}.html'})
+    scheduler.start()
+    worker = scheduler._processes[0]
+
+    def kill_when_stuck():
+        while not held:
+            time.sleep(0.05)
+        worker.kill()
+
+    threading.Thread(target=kill_when_stuck, daemon=True).start()
+    try:
+        stats = scheduler.run_cycle()
+        assert stats['done'] == 1 and stats['elapsed'] < 30
+        assert scheduler._processes[0] is not worker and not scheduler.pending
+    finally:
+        scheduler.stop()
+        listener.close()
+        for conn in held:
+            conn.close()
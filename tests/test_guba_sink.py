@@ -0,0 +1,50 @@
+import pandas as pd
+import pytest
+
+from conftest import fixture_html
+from eastmoney_api_crawler import parse_post_list
+from guba_sink import GubaSink
+
+
+@pytest.fixture
+def posts():
+    return pd.DataFrame(parse_post_list(fixture_html('guba_list_page1.html')))
+
+
+def test_on_flushed_runs_only_after_rows_are_written(tmp_path, posts):
+    sink = GubaSink(str(tmp_path / 'guba'))
+    flushed = []
+    sink.append('600519', posts, on_flushed=lambda: flushed.append(len(sink.query('600519'))))
+    assert flushed == []
+    assert sink.flush() == 10
+    assert flushed == [10]
+
+
+def test_failed_write_keeps_buffer_and_skips_callbacks(tmp_path, posts, monkeypatch):
+    sink = GubaSink(str(tmp_path / 'guba'))
+    flushed = []
+    sink.append('600519', posts, on_flushed=lambda: flushed.append(True))
+    original = pd.DataFrame.to_csv
+
+    def disk_full(self, *args, **kwargs):
+        raise OSError('磁盘已满')
+
+    monkeypatch.setattr(pd.DataFrame, 'to_csv', disk_full)
+    with pytest.raises(OSError):
+        sink.flush()
+    assert flushed == []
+
+    monkeypatch.setattr(pd.DataFrame, 'to_csv', original)
+    assert sink.flush() == 10 and flushed == [True]
+
+
+def test_posts_without_id_are_not_merged(tmp_path):
+    sink = GubaSink(str(tmp_path / 'guba'))
+    rows = [{'帖子ID': '', '标题': '甲', '作者': 'a', '发布时间': '2025-03-28 10:00:00', '阅读量': '1'},
+            {'帖子ID': None, '标题': '乙', '作者': 'b', '发布时间': '2025-03-28 10:00:00', '阅读量': '1'},
+            {'帖子ID': '', '标题': '甲', '作者': 'a', '发布时间': '2025-03-28 10:00:00', '阅读量': '5'}]
+    sink.append('600519', pd.DataFrame(rows))
+    frame = sink.query('600519', columns=['标题', '阅读量'])
+    assert sorted(zip(frame['标题'], frame['阅读量'])) == [('乙', 1), ('甲', 5)]
+    assert sink.compact(before='2099-01') == 1
+    assert len(sink.query('600519')) == 2
@@ -0,0 +1,63 @@
+import os
+
+import numpy as np
+import pytest
+
+from kline_store import COLUMN_DTYPES, COLUMN_NAMES, KLineStore
+
+
+def make_columns(dates, close=10.0):
+    n = len(dates)
+    columns = {col: np.full(n, close, dtype=COLUMN_DTYPES[col]) for col in COLUMN_NAMES}
+    columns['date'] = np.asarray(dates, dtype=np.int32)
+    columns['volume'] = np.arange(n, dtype=np.int64)
+    return columns
+
+
+@pytest.fixture
+def store(tmp_path):
+    return KLineStore(str(tmp_path / 'kline'))
+
+
+def test_append_reads_back_memmapped_columns(store):
+    assert store.append('600519', make_columns([20250103, 20250102])) == 2
+    assert store.append('600519', make_columns([20250106])) == 3
+    data = store.read('600519', start='2025-01-03', end='20250106')
+    assert list(data['date']) == [20250103, 20250106]
+    assert isinstance(store.read('600519')['close'], np.memmap)
+    assert store.symbols() == ['600519'] and store.last_date('600519') == 20250106
+
+
+def test_append_overlap_replaces_same_dates(store):
+    store.append('600519', make_columns([20250102, 20250103], close=10.0))
+    store.append('600519', make_columns([20250103, 20250106], close=11.0))
+    data = store.read('600519')
+    assert list(data['date']) == [20250102, 20250103, 20250106]
+    assert list(data['close']) == [10.0, 11.0, 11.0]
+
+
+def test_append_truncates_leftovers_of_an_interrupted_write(store):
+    store.append('600519', make_columns([20250102, 20250103]))
+    # 上次追加写了部分数值列和半条日期后中断
+    with open(store._column_path('600519', 'close'), 'ab') as f:
+        f.write(np.float64(99.0).tobytes())
+    with open(store._column_path('600519', 'date'), 'ab') as f:
+        f.write(b'\x01\x02')
+    assert store.row_count('600519') == 2
+
+    store.append('600519', make_columns([20250106], close=12.0))
+    data = store.read('600519')
+    assert list(data['date']) == [20250102, 20250103, 20250106]
+    assert list(data['close']) == [10.0, 10.0, 12.0]
+    for col in COLUMN_NAMES:
+        size = os.path.getsize(store._column_path('600519', col))
+        assert size == 3 * COLUMN_DTYPES[col].itemsize, col
+
+
+def test_replace_bumps_generation_and_delete_keeps_it(store):
+    store.append('600519', make_columns([20250102, 20250103]))
+    assert store.generation('600519') == 0
+    assert store.replace('600519', make_columns([20250106], close=5.0)) == 1
+    assert store.generation('600519') == 1 and list(store.read('600519')['close']) == [5.0]
+    store.delete('600519')
+    assert '600519' not in store and store.generation('600519') == 1
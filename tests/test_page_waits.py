@@ -0,0 +1,137 @@
+import pytest
+from selenium.common.exceptions import TimeoutException
+
+import eastmoney_crawler
+import instrumentation
+import page_waits
+from conftest import fixture_html
+from eastmoney_crawler import TABLE_ROWS, get_eastmoney_stock_history
+from fake_driver import FakeDriver
+from page_waits import PageTimer, Politeness, content_changed, page_signature, wait_for_change
+
+
+@pytest.fixture
+def history_pages():
+    return [fixture_html('history_page1.html'), fixture_html('history_page2.html')]
+
+
+def test_page_signature_reads_first_row_and_count(history_pages):
+    driver = FakeDriver(history_pages)
+    first, count, text = page_signature(driver, TABLE_ROWS)
+    assert count == 3 and text.startswith('2025-03-26')
+    assert page_signature(driver, '.no-such-rows') == (None, 0, '')
+
+
+def test_content_changed_waits_for_rerender(history_pages):
+    driver = FakeDriver(history_pages)
+    before = page_signature(driver, TABLE_ROWS)
+    condition = content_changed(TABLE_ROWS, before)
+    assert not condition(driver)
+    driver.find_element('css selector', '.next-btn').click()
+    assert condition(driver)
+
+
+def test_content_changed_detects_same_nodes_with_new_text(history_pages):
+    driver = FakeDriver(history_pages)
+    before = page_signature(driver, TABLE_ROWS)
+    # 节点未被替换，只是首行内容被就地更新
+    driver.doc.xpath('//tbody/tr/td')[0].text = '2025-03-27'
+    assert content_changed(TABLE_ROWS, before)(driver)
+
+
+def test_wait_for_change_returns_after_async_render(history_pages):
+    driver = FakeDriver(history_pages, render_polls=3)
+    before = page_signature(driver, TABLE_ROWS)
+    driver.find_element('css selector', '.next-btn').click()
+    assert driver.index == 0
+    wait_for_change(driver, TABLE_ROWS, before, timeout=5, poll=0.01)
+    assert driver.index == 1 and page_signature(driver, TABLE_ROWS)[1] == 2
+
+
+def test_wait_for_change_times_out_when_nothing_changes(history_pages):
+    driver = FakeDriver(history_pages)
+    before = page_signature(driver, TABLE_ROWS)
+    with pytest.raises(TimeoutException):
+        wait_for_change(driver, TABLE_ROWS, before, timeout=0.05, poll=0.01)
+
+
+def test_page_timer_records_stages_and_summary(monkeypatch):
+    clock = iter([0.0, 1.0, 1.0, 1.5, 2.0, 2.25, 10.0, 10.5])
+    monkeypatch.setattr(page_waits.time, 'perf_counter', lambda: next(clock))
+    instrumentation.METRICS.summary()
+    timer = PageTimer('600519 ')
+    timer.start(1)
+    with timer.stage('navigation'):
+        pass
+    with timer.stage('render'):
+        pass
+    with timer.stage('render'):
+        pass
+    record = timer.finish()
+    timer.start(2)
+    with timer.stage('parse'):
+        pass
+    timer.finish()
+
+    assert record == {'page': 1, 'navigation': 1.0, 'render': 0.75, 'total': 1.75}
+    assert timer.summary() == {'navigation': 1.0, 'render': 0.75, 'parse': 0.5, 'politeness': 0.0, 'total': 2.25}
+    timers = instrumentation.METRICS.summary()['timers']
+    assert timers['browser.render']['count'] == 1 and timers['browser.parse']['count'] == 1
+    assert 'browser.politeness' not in timers
+
+
+def test_politeness_only_sleeps_for_the_remaining_interval(monkeypatch):
+    now = [100.0]
+    sleeps = []
+    monkeypatch.setattr(page_waits.time, 'monotonic', lambda: now[0])
+    monkeypatch.setattr(page_waits.time, 'sleep', lambda seconds: sleeps.append(seconds))
+    politeness = Politeness(2.0)
+    politeness.wait()
+    now[0] += 0.5
+    politeness.wait()
+    now[0] += 5.0
+    politeness.wait()
+    assert sleeps == [1.5]
+
+
+def test_history_crawl_pages_without_waiting_on_last_page(history_pages, tmp_path, monkeypatch):
+    waits = []
+    monkeypatch.setattr(Politeness, 'wait', lambda self: waits.append(self.min_interval))
+    driver = FakeDriver(history_pages)
+    frame = get_eastmoney_stock_history(driver=driver, output=str(tmp_path / 'history.csv'))
+    assert len(frame) == 5 and driver.clicks == 1
+    # 两页只翻页一次，最后一页发现没有下一页后直接结束，不做礼貌等待
+    assert len(waits) == 1
+    assert (tmp_path / 'history.csv').exists()
+
+
+class QueryKeepsViewDriver(FakeDriver):
+    """查询结果与当前视图相同：点击查询后表格不重新渲染"""
+
+    def execute_script(self, script, *args):
+        if 'toolbar-search-button' in script:
+            self.scripts.append(script)
+            return None
+        return super().execute_script(script, *args)
+
+
+def never_changes(*args, **kwargs):
+    raise TimeoutException('表格未变化')
+
+
+def test_unchanged_query_falls_back_to_rows_present(history_pages, tmp_path, monkeypatch):
+    monkeypatch.setattr(Politeness, 'wait', lambda self: None)
+    monkeypatch.setattr(eastmoney_crawler, 'wait_for_change', never_changes)
+    driver = QueryKeepsViewDriver(history_pages)
+    frame = get_eastmoney_stock_history(driver=driver, output=str(tmp_path / 'history.csv'))
+    # 查询与翻页后的等待都超时，数据行已在，继续采集两页
+    assert len(frame) == 5 and driver.clicks == 1
+
+
+def test_pager_that_does_not_change_stops_paging(history_pages, tmp_path, monkeypatch):
+    monkeypatch.setattr(Politeness, 'wait', lambda self: None)
+    monkeypatch.setattr(eastmoney_crawler, 'wait_for_change', never_changes)
+    driver = QueryKeepsViewDriver(history_pages)
+    monkeypatch.setattr(driver, 'navigate', lambda index: None)
+    frame = get_eastmoney_stock_history(driver=driver, output=str(tmp_path / 'history.csv'))
+    assert len(frame) == 3 and driver.clicks == 1
@@ -0,0 +1,43 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+from screener import Universe
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+
+@pytest.fixture
+def universe():
+    return Universe({'code': np.array([1, 600519], dtype=np.int32),
+                     'name': np.array(['平安银行', '贵州茅台'], dtype=object),
+                     'pct_chg': np.array([1.0, 6.0])})
+
+
+def test_type_mismatch_is_a_value_error(universe):
+    with pytest.raises(ValueError, match='类型不匹配'):
+        universe.screen('名称 > 5')
+    rows, total = universe.screen("涨跌幅 > 5 and 名称 == '贵州茅台'")
+    assert total == 1 and list(rows) == [1]
+
+
+def test_screen_api_returns_400_for_type_mismatch():
+    import app
+
+    response = app.app.test_client().get('/api/screen', query_string={'q': '名称>5'})
+    assert response.status_code == 400 and 'Invalid query' in response.get_json()['error']
+
+
+def test_serve_configures_info_logging(monkeypatch):
+    import logging
+
+    import app
+
+    calls = []
+    monkeypatch.setattr(logging, 'basicConfig', lambda **kwargs: calls.append(kwargs))
+    monkeypatch.setattr(app.instrumentation, 'configure', lambda *args, **kwargs: None)
+    monkeypatch.setattr(app.app, 'run', lambda **kwargs: None)
+    app.main(['--no-debug'])
+    assert calls and calls[0]['level'] == logging.INFO
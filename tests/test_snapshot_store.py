@@ -0,0 +1,34 @@
+import os
+
+import numpy as np
+
+from snapshot_store import COLUMN_DTYPES, COLUMN_NAMES, SnapshotStore, day_of
+
+TS = 1743125400000
+
+
+def make_rows(ts_values, price=10.0):
+    n = len(ts_values)
+    columns = {col: np.full(n, price, dtype=COLUMN_DTYPES[col]) for col in COLUMN_NAMES}
+    columns['ts'] = np.asarray(ts_values, dtype=np.int64)
+    columns['code'] = np.arange(600000, 600000 + n, dtype=np.int32)
+    return columns
+
+
+def test_append_truncates_partial_ts_write(tmp_path):
+    store = SnapshotStore(str(tmp_path / 'snapshots'))
+    day = day_of(TS)
+    assert store.append(make_rows([TS, TS])) == 2
+    # 上次追加写完数值列，ts 列只写了半条就中断
+    with open(store._column_path(day, 'price'), 'ab') as f:
+        f.write(np.float64(99.0).tobytes())
+    with open(store._column_path(day, 'ts'), 'ab') as f:
+        f.write(np.int64(TS + 1000).tobytes()[:5])
+    assert store.row_count(day) == 2
+
+    assert store.append(make_rows([TS + 3000], price=11.0)) == 3
+    data = store.read(day)
+    assert list(data['ts']) == [TS, TS, TS + 3000]
+    assert list(data['price']) == [10.0, 10.0, 11.0]
+    for col in COLUMN_NAMES:
+        assert os.path.getsize(store._column_path(day, col)) == 3 * COLUMN_DTYPES[col].itemsize, col
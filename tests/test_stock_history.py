@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+
+import instrumentation
+from kline_store import KLineStore
+from stock_history_crawler import parse_klines, sync_symbol
+
+
+def kline(date, close=10.0):
+    return f"{date},{close},{close},{close + 1},{close - 1},100,1000.0,1.0,0.5,0.1,0.2"
+
+
+def test_parse_klines_reports_bad_rows():
+    klines = [kline('2025-01-02'), '2025-01-03,1,2', '停牌,1,1,1,1,1,1,1,1,1,1',
+              kline('2025-01-06').replace(',100,', ',x,'), kline('2025-01-07', 11.5)]
+    columns, errors = parse_klines(klines)
+    assert list(columns['date']) == [20250102, 20250107]
+    assert list(columns['close']) == [10.0, 11.5] and columns['volume'].dtype == np.int64
+    assert [(i, reason) for i, _, reason in errors] == [(1, '字段数错误'), (2, '日期格式错误'), (3, 'volume 数值错误')]
+
+
+class FakeFetch:
+    def __init__(self, klines):
+        self.klines = klines
+        self.calls = []
+
+    def __call__(self, stock_code, start_date, end_date):
+        self.calls.append(start_date)
+        start = int(start_date.replace('-', ''))
+        return [line for line in self.klines if int(line[:10].replace('-', '')) >= start]
+
+
+@pytest.fixture
+def store(tmp_path):
+    return KLineStore(str(tmp_path / 'kline'))
+
+
+def test_sync_symbol_fetches_from_the_overlap(store):
+    fetch = FakeFetch([kline('2025-01-02'), kline('2025-01-03'), kline('2025-01-06')])
+    assert sync_symbol('600519', store, '20250101', '20250110', fetch=fetch) == 3
+    fetch.klines.append(kline('2025-01-07'))
+    assert sync_symbol('600519', store, '20250101', '20250110', fetch=fetch) == 1
+    assert fetch.calls == ['20250101', '20250103'] and store.generation('600519') == 0
+
+
+def test_sync_symbol_rebuilds_after_adjustment_change(store):
+    fetch = FakeFetch([kline('2025-01-02'), kline('2025-01-03')])
+    sync_symbol('600519', store, '20250101', '20250110', fetch=fetch)
+    # 除权后前复权价格整体变化
+    fetch.klines = [kline('2025-01-02', 9.0), kline('2025-01-03', 9.0), kline('2025-01-06', 9.5)]
+    assert sync_symbol('600519', store, '20250101', '20250110', fetch=fetch) == 1
+    assert list(store.read('600519')['close']) == [9.0, 9.0, 9.5] and store.generation('600519') == 1
+
+
+def test_sync_symbol_counts_bad_rows(store):
+    instrumentation.METRICS.summary()
+    fetch = FakeFetch([kline('2025-01-02'), kline('2025-01-03').replace('10.0,', 'x,', 1)])
+    assert sync_symbol('600519', store, '20250101', '20250110', fetch=fetch) == 1
+    summary = instrumentation.METRICS.summary()
+    assert summary['counters']['parse.kline.bad_rows'] == 1 and 'kline.bad_rows' in summary['events']
+
+
+def test_sync_symbol_unknown_code(store):
+    assert sync_symbol('999998', store, '20250101', '20250110', fetch=lambda *args: None) is None